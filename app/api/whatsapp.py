@@ -1,14 +1,22 @@
 import os
 import json
-from fastapi import APIRouter, Request, Response, HTTPException, status, BackgroundTasks
+import asyncio
+from functools import partial
+from typing import Dict, List, Literal, Optional
+from fastapi import APIRouter, Request, Response, HTTPException, status, Depends
+from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from datetime import datetime
 
-from app.services.whatsapp_service import WhatsAppService
-from app.services.chatgpt_service import ChatGPTService
-from app.services.calendar_service import CalendarService
+from app.models.webhook import WebhookMessage, WebhookPayload
+from app.services.admission_control import Decision, Priority, classify_message_priority
+from app.services.broadcast_service import BroadcastService
 from app.services.conversation_state import ConversationState
+from app.services.conversation_scheduler import LaneLimitError
+from app.services.delivery_tracker import is_status_only_payload
+from app.services.outbound_scheduler import MessagePriority
+from app.services.service_container import ServiceContainer
 
 load_dotenv()
 
@@ -17,6 +25,10 @@ router = APIRouter()
 # Load the Verify Token from environment variables
 VERIFY_TOKEN = os.getenv("VERIFY_TOKEN")
 
+def get_services(request: Request) -> ServiceContainer:
+    """ Dependency que fornece o contêiner de serviços criado no lifespan da aplicação. """
+    return request.app.state.services
+
 # --- Webhook Verification (GET) ---
 
 @router.get("/webhook")
@@ -53,57 +65,215 @@ async def verify_webhook(request: Request):
 
 # --- Handle Incoming Messages (POST) ---
 
-async def process_whatsapp_message(payload: dict):
+def extract_text_messages(payload: WebhookPayload) -> List[WebhookMessage]:
     """
-    Processa mensagens recebidas do WhatsApp e orquestra a resposta com ChatGPT e Google Calendar.
+    Extrai todas as mensagens de texto de um payload do webhook.
+    A Meta agrupa várias entradas, mudanças e mensagens em um único POST sob carga,
+    então percorremos todos os níveis em vez de ler apenas o primeiro item.
+    
+    Returns:
+        List[WebhookMessage]: Mensagens de texto válidas, na ordem em que chegaram
     """
-    print(f"Processing payload: {json.dumps(payload, indent=2)}")
+    # Verificar se é uma mensagem do WhatsApp
+    if payload.object != 'whatsapp_business_account':
+        # Não é uma notificação do WhatsApp
+        print("Ignoring non-whatsapp notification.")
+        return []
+    
+    messages = []
+    for message in payload.iter_messages():
+        if message.type != 'text':
+            # Ignorar outros tipos de mensagem por enquanto
+            print(f"Ignoring non-text message type: {message.type}")
+            continue
+        
+        if not message.from_ or not message.text or not message.text.body:
+            print("Could not extract phone number or message text from payload.")
+            continue
+        
+        messages.append(message)
     
-    # Inicializar serviços
-    whatsapp_service = WhatsAppService()
-    chatgpt_service = ChatGPTService()
-    calendar_service = CalendarService()
+    return messages
 
-    # --- 1. Extrair informações relevantes da mensagem --- 
-    try:
-        # Verificar se é uma mensagem do WhatsApp
-        if payload.get('object') == 'whatsapp_business_account':
-            entry = payload.get('entry', [{}])[0]
-            changes = entry.get('changes', [{}])[0]
-            value = changes.get('value', {})
-            message_data = value.get('messages', [{}])[0]
-            
-            if message_data:
-                phone_number = message_data.get('from')
-                message_type = message_data.get('type')
-                
-                if message_type == 'text':
-                    message_text = message_data.get('text', {}).get('body')
-                else:
-                    # Ignorar outros tipos de mensagem por enquanto
-                    print(f"Ignoring non-text message type: {message_type}")
-                    return
-                
-                if not phone_number or not message_text:
-                    print("Could not extract phone number or message text from payload.")
-                    return
-                    
+def extract_media_messages(payload: WebhookPayload) -> List[WebhookMessage]:
+    """
+    Extrai as mensagens com imagem ou documento (carteirinha, RG, CNH) de um payload do webhook.
+    
+    Returns:
+        List[WebhookMessage]: Mensagens com mídia válidas, na ordem em que chegaram
+    """
+    if payload.object != 'whatsapp_business_account':
+        return []
+    
+    return [
+        message for message in payload.iter_messages()
+        if message.from_ and message.media is not None and message.media.id
+    ]
+
+async def process_whatsapp_message(payload: WebhookPayload, services: ServiceContainer):
+    """
+    Processa mensagens recebidas do WhatsApp e orquestra a resposta com ChatGPT e Google Calendar.
+    Os serviços vêm do contêiner compartilhado, sem custo de inicialização por mensagem.
+    
+    Rajadas de mensagens curtas do mesmo paciente são agrupadas em um único turno,
+    que é agendado na lane do telefone de origem: mensagens de telefones diferentes
+    são processadas concorrentemente, e as do mesmo telefone em sequência,
+    inclusive entre webhooks diferentes.
+    
+    Sob carga, o controle de admissão adia ou descarta conversa casual, enquanto
+    confirmações e agendamentos em andamento continuam sendo atendidos. Uma nova
+    mensagem admitida retoma antes o que estava adiado do mesmo paciente, para
+    manter a ordem da conversa.
+    
+    Imagens e documentos enviados na etapa de documentos do convênio são baixados
+    em paralelo e vinculados à conversa na ordem da lane do paciente.
+    
+    Returns:
+        Optional[asyncio.Future]: Se houve trabalho adiado, future que resolve quando
+            ele rodar (cancelada se for descartado no encerramento); a fila de
+            ingestão mantém o payload no spool até lá
+    """
+    # --- 1. Extrair as mensagens do payload ---
+    messages = extract_text_messages(payload)
+    media_messages = extract_media_messages(payload)
+    if not messages and not media_messages:
+        print("No message data found in payload.")
+        return
+    print(f"Processing {len(messages) + len(media_messages)} message(s) from webhook payload.")
+    
+    # --- 2. Descartar reentregas da Meta antes de qualquer trabalho caro ---
+    deduplicator = services.message_deduplicator
+    new_messages = [message for message in messages if deduplicator.claim(message.id)]
+    if len(new_messages) < len(messages):
+        print(f"Skipping {len(messages) - len(new_messages)} redelivered message(s).")
+    
+    # --- 3. Agrupar rajadas do mesmo paciente e agendar na lane do telefone ---
+    admission = services.admission_controller
+    
+    def dispatch_to_lane(phone_number: str):
+        return lambda merged_text: services.conversation_scheduler.submit(
+            phone_number,
+            partial(admission.run, partial(handle_text_message, phone_number, merged_text, services))
+        )
+    
+    def resume_deferred(message: WebhookMessage):
+        return lambda: services.message_coalescer.submit(
+            message.from_, message.text.body, dispatch_to_lane(message.from_)
+        )
+    
+    conversation_manager = services.whatsapp_service.conversation_manager
+    scheduled = []
+    deferred = []
+    for message in new_messages:
+        # --- 4. Controle de admissão: conversa casual cede lugar sob carga ---
+        priority = classify_message_priority(message.text.body, conversation_manager.get_state(message.from_))
+        decision = admission.decide(priority)
+        if decision is Decision.SHED:
+            # Sem a reivindicação, a reentrega da Meta volta a ser processada
+            print(f"Shedding {priority.name.lower()} priority message from {message.from_} under load.")
+            deduplicator.release(message.id)
+            continue
+        if decision is Decision.DEFER:
+            deferred.append((message, admission.defer(message.from_, resume_deferred(message))))
+            continue
+        
+        # O que estava adiado deste paciente entra na lane antes da nova mensagem
+        admission.flush(message.from_)
+        try:
+            scheduled.append((message, services.message_coalescer.submit(
+                message.from_, message.text.body, dispatch_to_lane(message.from_)
+            )))
+        except LaneLimitError as e:
+            print(f"Dropping message from {message.from_}: {e}")
+            deduplicator.release(message.id)
+    
+    # --- 5. Documentos do convênio: o download começa já, o vínculo segue a ordem da lane ---
+    def dispatch_media(message: WebhookMessage) -> asyncio.Future:
+        media = message.media
+        download = asyncio.ensure_future(services.media_service.fetch(media.id, media.sha256, media.mime_type))
+        try:
+            return services.conversation_scheduler.submit(
+                message.from_,
+                partial(admission.run, partial(handle_media_message, message.from_, media.caption, download, services))
+            )
+        except LaneLimitError:
+            download.cancel()
+            raise
+    
+    def resume_deferred_media(message: WebhookMessage):
+        return lambda: dispatch_media(message)
+    
+    for message in media_messages:
+        state = conversation_manager.get_state(message.from_)
+        if state != ConversationState.WAITING_FOR_INSURANCE_DOCS:
+            # Ignorar mídias fora da etapa de documentos do convênio
+            print(f"Ignoring {message.type} message from {message.from_} in state {state.value}.")
+            continue
+        if not deduplicator.claim(message.id):
+            print(f"Skipping redelivered {message.type} message {message.id}.")
+            continue
+        
+        decision = admission.decide(classify_message_priority(message.media.caption or "", state))
+        if decision is Decision.SHED:
+            deduplicator.release(message.id)
+            continue
+        if decision is Decision.DEFER:
+            deferred.append((message, admission.defer(message.from_, resume_deferred_media(message))))
+            continue
+        
+        admission.flush(message.from_)
+        try:
+            scheduled.append((message, dispatch_media(message)))
+        except LaneLimitError as e:
+            print(f"Dropping message from {message.from_}: {e}")
+            deduplicator.release(message.id)
+    
+    results = await asyncio.gather(*(future for _, future in scheduled), return_exceptions=True)
+    
+    # Mensagens que falharam podem ser processadas novamente se a Meta as reenviar;
+    # só as tratadas com sucesso ficam registradas de forma persistente
+    for (message, _), result in zip(scheduled, results):
+        if isinstance(result, BaseException):
+            print(f"Message {message.id} from {message.from_} failed: {result!r}")
+            deduplicator.release(message.id)
+        else:
+            deduplicator.confirm(message.id)
+    
+    if not deferred:
+        return None
+    
+    # O trabalho adiado só existe em memória: o payload fica no spool até ele rodar
+    completion = asyncio.get_running_loop().create_future()
+    
+    def settle_deferred(gathered: asyncio.Future):
+        discarded = False
+        for (message, _), result in zip(deferred, gathered.result()):
+            if isinstance(result, asyncio.CancelledError):
+                discarded = True
+            elif isinstance(result, BaseException):
+                print(f"Deferred message {message.id} from {message.from_} failed: {result!r}")
+                deduplicator.release(message.id)
             else:
-                print("No message data found in payload.")
-                return
+                deduplicator.confirm(message.id)
+        if discarded:
+            completion.cancel()
         else:
-            # Não é uma notificação do WhatsApp
-            print("Ignoring non-whatsapp notification.")
-            return
-            
-    except (IndexError, KeyError, TypeError) as e:
-        print(f"Error parsing incoming payload: {e}. Payload: {payload}")
-        return
+            completion.set_result(None)
+    
+    asyncio.gather(*(future for _, future in deferred), return_exceptions=True).add_done_callback(settle_deferred)
+    return completion
+
+async def handle_text_message(phone_number: str, message_text: str, services: ServiceContainer):
+    """
+    Processa uma única mensagem de texto de um paciente e envia a resposta.
+    """
+    whatsapp_service = services.whatsapp_service
+    calendar_service = services.calendar_service
 
     # --- 2. Processar a mensagem com o ChatGPT ---
     try:
         # Processa a mensagem e obtém o estado atual
-        result = whatsapp_service.receive_message({
+        result = await whatsapp_service.receive_message({
             "from": phone_number,
             "text": message_text
         })
@@ -151,29 +321,186 @@ async def process_whatsapp_message(payload: dict):
             reply = response
         
         # Enviar resposta via WhatsApp
-        whatsapp_service.send_message(phone_number, reply)
+        # A resposta entra na fila de saída; novas tentativas não prendem a lane da conversa
+        await whatsapp_service.send_message_async(phone_number, reply, wait=False)
         
     except Exception as e:
         print(f"Error processing message with ChatGPT: {e}")
         # Enviar mensagem de erro genérica
-        whatsapp_service.send_message(
+        await whatsapp_service.send_message_async(
             phone_number, 
-            "Desculpe, tive um problema ao processar sua mensagem. Por favor, tente novamente."
+            "Desculpe, tive um problema ao processar sua mensagem. Por favor, tente novamente.",
+            wait=False
+        )
+
+async def handle_media_message(phone_number: str, caption: Optional[str], download: asyncio.Future, services: ServiceContainer):
+    """
+    Vincula à conversa um documento do convênio enviado pelo paciente e responde.
+    
+    Args:
+        phone_number: Telefone do paciente
+        caption: Legenda enviada com a mídia
+        download: Download da mídia em andamento (MediaService.fetch)
+        services: Contêiner de serviços
+    """
+    whatsapp_service = services.whatsapp_service
+    try:
+        media = await download
+    except Exception as e:
+        print(f"Error downloading media from {phone_number}: {e}")
+        await whatsapp_service.send_message_async(
+            phone_number,
+            "Desculpe, não consegui receber o arquivo. Por favor, envie novamente.",
+            wait=False
         )
+        return
+    
+    result = whatsapp_service.receive_document(phone_number, media.path, caption)
+    await whatsapp_service.send_message_async(phone_number, result["response"], wait=False)
+
+async def process_webhook_body(body: bytes, services: ServiceContainer):
+    """
+    Decodifica o corpo bruto de um webhook retirado da fila de ingestão e o processa.
+    Retorna a future do trabalho adiado, se houver (ver process_whatsapp_message).
+    """
+    try:
+        payload = WebhookPayload.decode(body)
+    except ValidationError as e:
+        print(f"Discarding webhook with invalid body: {e}")
+        return
+
+    return await process_whatsapp_message(payload, services)
 
 @router.post("/webhook")
-async def receive_whatsapp_message(request: Request, background_tasks: BackgroundTasks):
+async def receive_whatsapp_message(
+    request: Request,
+    services: ServiceContainer = Depends(get_services)
+):
     """
     Endpoint para receber mensagens do webhook do WhatsApp.
+    O corpo bruto é gravado na fila de ingestão e processado pelos workers;
+    notificações de status são desviadas para o registro de entregas.
     """
-    payload = await request.json()
+    body = await request.body()
     
-    # Processar a mensagem em background para não bloquear a resposta
-    background_tasks.add_task(process_whatsapp_message, payload)
+    # Notificações de status (sent, delivered, read) não entram no pipeline principal
+    # e são as primeiras a serem descartadas quando o servidor está sobrecarregado
+    if is_status_only_payload(body):
+        if services.admission_controller.decide(Priority.LOW, deferrable=False) is not Decision.SHED:
+            services.delivery_tracker.record(body)
+        return {"status": "received"}
+    
+    # Enfileirar o payload para não bloquear a resposta
+    if not services.ingestion_queue.enqueue(body):
+        return {"status": "dropped"}
     
     # Responder imediatamente com 200 OK para o webhook
     return {"status": "received"}
 
+@router.get("/metrics")
+async def get_metrics(services: ServiceContainer = Depends(get_services)):
+    """
+    Retorna as métricas dos serviços (fila de ingestão, etc.).
+    """
+    return services.metrics()
+
+class DeadLetterReplayPayload(BaseModel):
+    ids: Optional[List[int]] = Field(None, description="Registros a reenviar (padrão: os mais antigos)")
+    limit: int = Field(100, ge=1, le=1000, description="Número máximo de registros quando ids não é informado")
+
+@router.get("/dead-letters")
+async def list_dead_letters(
+    limit: int = 100,
+    include_replayed: bool = False,
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    Lista os envios que falharam de vez e aguardam inspeção ou reenvio.
+    """
+    return {"dead_letters": services.dead_letter_store.list(limit=limit, include_replayed=include_replayed)}
+
+@router.post("/dead-letters/replay")
+async def replay_dead_letters(
+    payload: DeadLetterReplayPayload,
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    Reenvia em lote os registros da fila de mensagens mortas.
+    Os envios voltam para a fila de saída; uma nova falha gera um novo registro.
+    """
+    store = services.dead_letter_store
+    entries = store.get(payload.ids) if payload.ids else store.list(limit=payload.limit)
+
+    replayed = []
+    for entry in entries:
+        queued = await services.whatsapp_service.send_payload_async(
+            entry["recipient"], entry["payload"], MessagePriority(entry["priority"]), wait=False
+        )
+        if queued:
+            replayed.append(entry["id"])
+    store.mark_replayed(replayed)
+
+    return {"replayed": len(replayed), "ids": replayed}
+
+class BroadcastRecipient(BaseModel):
+    phone: str = Field(..., description="Número do telefone do paciente com código do país")
+    components: Optional[List[Dict]] = Field(None, description="Componentes (variáveis) do template para este paciente")
+
+class BroadcastPayload(BaseModel):
+    template_name: str = Field(..., description="Nome do template aprovado")
+    language_code: str = Field("pt_BR", description="Código de idioma do template")
+    priority: Literal["confirmation", "reminder", "marketing"] = Field("reminder", description="Classe de prioridade dos envios")
+    recipients: List[BroadcastRecipient] = Field(..., min_length=1)
+    broadcast_id: Optional[str] = Field(None, description="Identificador para retomar ou evitar duplicar o broadcast")
+
+def stream_broadcast(broadcast_service: BroadcastService, broadcast_id: str) -> StreamingResponse:
+    """ Transmite os resultados do broadcast em NDJSON, uma linha por destinatário e o resumo no fim. """
+    if broadcast_service.is_running(broadcast_id):
+        raise HTTPException(status_code=409, detail="Broadcast already in progress")
+
+    async def lines():
+        async for result in broadcast_service.run(broadcast_id):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Broadcast-Id": broadcast_id})
+
+@router.post("/broadcasts")
+async def create_broadcast(
+    payload: BroadcastPayload,
+    services: ServiceContainer = Depends(get_services)
+):
+    """
+    Envia um template para vários pacientes, com componentes por destinatário.
+    O progresso é gravado a cada envio; se a conexão ou o processo cair, o
+    broadcast pode ser retomado sem reenviar para quem já recebeu.
+    """
+    broadcast_id = services.broadcast_service.create(
+        payload.template_name,
+        [recipient.model_dump() for recipient in payload.recipients],
+        language_code=payload.language_code,
+        priority=MessagePriority[payload.priority.upper()],
+        broadcast_id=payload.broadcast_id,
+    )
+    return stream_broadcast(services.broadcast_service, broadcast_id)
+
+@router.post("/broadcasts/{broadcast_id}/resume")
+async def resume_broadcast(broadcast_id: str, services: ServiceContainer = Depends(get_services)):
+    """
+    Retoma um broadcast interrompido, enviando apenas aos destinatários pendentes.
+    """
+    if not services.broadcast_service.exists(broadcast_id):
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return stream_broadcast(services.broadcast_service, broadcast_id)
+
+@router.get("/broadcasts/{broadcast_id}")
+async def get_broadcast(broadcast_id: str, services: ServiceContainer = Depends(get_services)):
+    """
+    Retorna as contagens de envios do broadcast (enviados, com falha, segurados pelo limite de taxa, pendentes).
+    """
+    if not services.broadcast_service.exists(broadcast_id):
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return services.broadcast_service.summary(broadcast_id)
+
 class ConfirmationPayload(BaseModel):
     phone_number: str = Field(..., description="Número do telefone do paciente com código do país")
     patient_name: str = Field(..., description="Nome completo do paciente")
@@ -181,12 +508,15 @@ class ConfirmationPayload(BaseModel):
     appointment_time: str = Field(..., description="Horário da consulta (HH:MM)")
 
 @router.post("/send-confirmation")
-async def send_confirmation_message(payload: ConfirmationPayload):
+async def send_confirmation_message(
+    payload: ConfirmationPayload,
+    services: ServiceContainer = Depends(get_services)
+):
     """
     Envia mensagem de confirmação de agendamento via WhatsApp.
     """
     try:
-        whatsapp_service = WhatsAppService()
+        whatsapp_service = services.whatsapp_service
         
         # Formatar mensagem de confirmação
         message = (
@@ -197,7 +527,9 @@ async def send_confirmation_message(payload: ConfirmationPayload):
         )
         
         # Enviar mensagem
-        success = whatsapp_service.send_message(payload.phone_number, message)
+        success = await whatsapp_service.send_message_async(
+            payload.phone_number, message, priority=MessagePriority.CONFIRMATION
+        )
         
         if success:
             return {"status": "success", "message": "Confirmation sent successfully"}
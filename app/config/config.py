@@ -7,6 +7,26 @@ load_dotenv()
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_SMALL_MODEL = os.getenv("OPENAI_SMALL_MODEL", "gpt-4o-mini")  # structured tasks (extraction, slots)
+OPENAI_ROUTES = os.getenv("OPENAI_ROUTES")  # optional JSON per-task overrides, e.g. {"filter_slots": {"model": "gpt-4o"}}
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "20"))  # deadline per call, queueing included
+OPENAI_HEDGE_MODEL = os.getenv("OPENAI_HEDGE_MODEL")  # optional second model for hedged requests
+OPENAI_HEDGE_DELAY_SECONDS = float(os.getenv("OPENAI_HEDGE_DELAY_SECONDS", "2"))  # wait before hedging
+OPENAI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("OPENAI_BREAKER_FAILURE_THRESHOLD", "5"))  # failures in a row
+OPENAI_BREAKER_RESET_SECONDS = float(os.getenv("OPENAI_BREAKER_RESET_SECONDS", "30"))  # open time before a probe
+LLM_REPLY_BUDGET_SECONDS = float(os.getenv("LLM_REPLY_BUDGET_SECONDS", "8"))  # max LLM wait for a patient reply
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))  # account requests per minute (0 disables queueing)
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))  # account tokens per minute (0 disables queueing)
+OPENAI_RATE_BURST_SECONDS = float(os.getenv("OPENAI_RATE_BURST_SECONDS", "10"))  # limit share sent at once
+OPENAI_EXTRACTION_MAX_TOKENS = int(os.getenv("OPENAI_EXTRACTION_MAX_TOKENS", "120"))  # intent + short reply
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.8"))  # below it, ask the LLM
+
+# LLM Response Cache Configuration
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "True").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+LLM_CACHE_PERSIST_PATH = os.getenv("LLM_CACHE_PERSIST_PATH")  # optional, e.g. data/llm_cache.db
 
 # Google Calendar Configuration
 GOOGLE_CALENDAR_ID = os.getenv("GOOGLE_CALENDAR_ID")
@@ -17,6 +37,35 @@ WHATSAPP_TOKEN = os.getenv("WHATSAPP_TOKEN")
 WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
 VERIFY_TOKEN = os.getenv("VERIFY_TOKEN", "your_verify_token")
 
+# WhatsApp Cloud API HTTP Client Configuration
+WHATSAPP_HTTP_MAX_CONNECTIONS = int(os.getenv("WHATSAPP_HTTP_MAX_CONNECTIONS", "100"))
+WHATSAPP_HTTP_MAX_KEEPALIVE = int(os.getenv("WHATSAPP_HTTP_MAX_KEEPALIVE", "20"))
+WHATSAPP_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("WHATSAPP_HTTP_KEEPALIVE_EXPIRY", "60"))  # in seconds
+WHATSAPP_HTTP_TIMEOUT = float(os.getenv("WHATSAPP_HTTP_TIMEOUT", "10"))  # in seconds
+WHATSAPP_HTTP_CONNECT_TIMEOUT = float(os.getenv("WHATSAPP_HTTP_CONNECT_TIMEOUT", "5"))  # in seconds
+WHATSAPP_HTTP2 = os.getenv("WHATSAPP_HTTP2", "True").lower() == "true"  # HTTP/2 via h2 (pinned in requirements.txt)
+
+# Outbound Message Rate Limiting Configuration
+OUTBOUND_RATE_PER_SECOND = float(os.getenv("OUTBOUND_RATE_PER_SECOND", "80"))  # Meta throughput tier
+OUTBOUND_BURST = float(os.getenv("OUTBOUND_BURST", "80"))
+OUTBOUND_RECIPIENT_INTERVAL_SECONDS = float(os.getenv("OUTBOUND_RECIPIENT_INTERVAL_SECONDS", "6"))
+OUTBOUND_RECIPIENT_BURST = float(os.getenv("OUTBOUND_RECIPIENT_BURST", "10"))
+OUTBOUND_MAX_QUEUE = int(os.getenv("OUTBOUND_MAX_QUEUE", "10000"))
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "5"))
+OUTBOUND_RETRY_BASE_SECONDS = float(os.getenv("OUTBOUND_RETRY_BASE_SECONDS", "1"))
+OUTBOUND_RETRY_MAX_SECONDS = float(os.getenv("OUTBOUND_RETRY_MAX_SECONDS", "60"))
+DEAD_LETTER_PATH = os.getenv("DEAD_LETTER_PATH", "data/dead_letters.db")
+
+# Bulk Broadcast Configuration
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "50"))
+BROADCAST_PATH = os.getenv("BROADCAST_PATH", "data/broadcasts.db")
+
+# Media Download Configuration
+MEDIA_STORAGE_PATH = os.getenv("MEDIA_STORAGE_PATH", "data/media")
+MEDIA_DOWNLOAD_CONCURRENCY = int(os.getenv("MEDIA_DOWNLOAD_CONCURRENCY", "8"))
+MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", "65536"))  # in bytes
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(100 * 1024 * 1024)))  # Cloud API limit for documents
+
 # Application Configuration
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 PORT = int(os.getenv("PORT", "8000"))
@@ -28,6 +77,40 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./health_gpt.db")
 # Notification Configuration
 NOTIFICATION_ENABLED = os.getenv("NOTIFICATION_ENABLED", "True").lower() == "true"
 NOTIFICATION_INTERVAL = int(os.getenv("NOTIFICATION_INTERVAL", "60"))  # in minutes
+REMINDER_TEMPLATE_NAME = os.getenv("REMINDER_TEMPLATE_NAME", "appointment_reminder")
+REMINDER_OFFSETS_HOURS = [float(h) for h in os.getenv("REMINDER_OFFSETS_HOURS", "24,2").split(",") if h.strip()]
+REMINDER_STATE_PATH = os.getenv("REMINDER_STATE_PATH", "data/reminders.db")
+APPOINTMENTS_PATH = os.getenv("APPOINTMENTS_PATH", "data/appointments.json")
+
+# Webhook Ingestion Configuration
+# Workers wait for their messages to finish (debounce window included), so this is
+# the number of webhooks in flight; the real work is bounded by CONVERSATION_WORKERS.
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "64"))
+INGESTION_MAX_DEPTH = int(os.getenv("INGESTION_MAX_DEPTH", "1000"))
+INGESTION_SPOOL_PATH = os.getenv("INGESTION_SPOOL_PATH", "data/ingestion_spool.db")
+
+# Conversation Scheduling Configuration
+CONVERSATION_WORKERS = int(os.getenv("CONVERSATION_WORKERS", "8"))
+CONVERSATION_MAX_LANES = int(os.getenv("CONVERSATION_MAX_LANES", "10000"))
+CONVERSATION_MAX_LANE_DEPTH = int(os.getenv("CONVERSATION_MAX_LANE_DEPTH", "50"))
+CONVERSATION_LANE_IDLE_SECONDS = float(os.getenv("CONVERSATION_LANE_IDLE_SECONDS", "300"))
+
+# Admission Control Configuration
+ADMISSION_SOFT_LIMIT = int(os.getenv("ADMISSION_SOFT_LIMIT", "200"))
+ADMISSION_HARD_LIMIT = int(os.getenv("ADMISSION_HARD_LIMIT", "1000"))
+ADMISSION_MAX_DEFERRED = int(os.getenv("ADMISSION_MAX_DEFERRED", "1000"))
+
+# Inbound Message Coalescing Configuration
+COALESCE_WINDOW_SECONDS = float(os.getenv("COALESCE_WINDOW_SECONDS", "1.5"))  # 0 disables
+COALESCE_MAX_WAIT_SECONDS = float(os.getenv("COALESCE_MAX_WAIT_SECONDS", "4"))
+
+# Webhook Deduplication Configuration
+DEDUPE_TTL_SECONDS = float(os.getenv("DEDUPE_TTL_SECONDS", "86400"))
+DEDUPE_MAX_ENTRIES = int(os.getenv("DEDUPE_MAX_ENTRIES", "100000"))
+DEDUPE_PERSIST_PATH = os.getenv("DEDUPE_PERSIST_PATH")  # optional, e.g. data/message_dedupe.db
+
+# Delivery Status Configuration
+DELIVERY_TRACKING_ENABLED = os.getenv("DELIVERY_TRACKING_ENABLED", "True").lower() == "true"
 
 # Clinic Configuration
 CLINIC_NAME = os.getenv("CLINIC_NAME", "HealthGPT Nutrition Clinic")
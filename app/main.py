@@ -1,12 +1,25 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from app.api.whatsapp import router as whatsapp_router
+from app.api.whatsapp import router as whatsapp_router, process_webhook_body
+from app.services.service_container import ServiceContainer
 
-app = FastAPI(title="HealthGPT API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Cria os serviços compartilhados no startup e os libera no shutdown."""
+    services = ServiceContainer(webhook_handler=process_webhook_body)
+    await services.startup()
+    app.state.services = services
+    try:
+        yield
+    finally:
+        await services.shutdown()
+
+app = FastAPI(title="HealthGPT API", lifespan=lifespan)
 
 # Configuração CORS
 app.add_middleware(
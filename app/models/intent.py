@@ -0,0 +1,23 @@
+from enum import Enum
+from pydantic import BaseModel, Field
+from typing import Optional
+
+# Resultado estruturado da interpretação de uma mensagem do paciente,
+# produzido pelo extrator local ou pelo ChatGPT.
+
+class Intent(str, Enum):
+    PRIVATE = "private"            # Quer agendar particular
+    INSURANCE = "insurance"        # Quer agendar pelo convênio
+    DATE = "date"                  # Mencionou uma data
+    TIME = "time"                  # Mencionou um horário
+    CONFIRMATION = "confirmation"  # Confirmou o agendamento
+    OTHER = "other"                # Qualquer outra coisa
+
+class IntentExtraction(BaseModel):
+    intent: Intent = Intent.OTHER
+    date: Optional[str] = None  # Data mencionada no formato 'YYYY-MM-DD'
+    time: Optional[str] = None  # Horário mencionado no formato 'HH:MM'
+    insurance: Optional[str] = None  # Nome do convênio mencionado
+    confirmation: Optional[bool] = None  # True se o paciente confirmou
+    reply: Optional[str] = None  # Resposta ao paciente sugerida pelo ChatGPT
+    confidence: float = Field(0.0, ge=0.0, le=1.0)  # Confiança na interpretação
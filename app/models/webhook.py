@@ -0,0 +1,82 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Iterator, List, Optional
+
+# Modelos tipados do envelope de webhook da WhatsApp Cloud API (Meta).
+# Campos desconhecidos são ignorados na decodificação, sem serem materializados.
+
+class WebhookText(BaseModel):
+    body: Optional[str] = None
+
+class WebhookMedia(BaseModel):
+    id: Optional[str] = None  # Identificador da mídia no endpoint de mídia da Cloud API
+    mime_type: Optional[str] = None
+    sha256: Optional[str] = None
+    filename: Optional[str] = None  # Apenas em documentos
+    caption: Optional[str] = None
+
+class WebhookProfile(BaseModel):
+    name: Optional[str] = None
+
+class WebhookContact(BaseModel):
+    wa_id: Optional[str] = None
+    profile: Optional[WebhookProfile] = None
+
+class WebhookMessage(BaseModel):
+    id: Optional[str] = None
+    from_: Optional[str] = Field(None, alias="from")  # Telefone do paciente
+    timestamp: Optional[str] = None
+    type: Optional[str] = None
+    text: Optional[WebhookText] = None
+    image: Optional[WebhookMedia] = None
+    document: Optional[WebhookMedia] = None
+
+    @property
+    def media(self) -> Optional[WebhookMedia]:
+        """Mídia anexada à mensagem (imagem ou documento), se houver."""
+        if self.type == "image":
+            return self.image
+        if self.type == "document":
+            return self.document
+        return None
+
+class WebhookStatus(BaseModel):
+    id: Optional[str] = None
+    status: Optional[str] = None  # sent, delivered, read, failed
+    timestamp: Optional[str] = None
+    recipient_id: Optional[str] = None
+    errors: List[Dict[str, Any]] = []
+
+class WebhookValue(BaseModel):
+    messaging_product: Optional[str] = None
+    contacts: List[WebhookContact] = []
+    messages: List[WebhookMessage] = []
+    statuses: List[WebhookStatus] = []
+
+class WebhookChange(BaseModel):
+    field: Optional[str] = None
+    value: WebhookValue = WebhookValue()
+
+class WebhookEntry(BaseModel):
+    id: Optional[str] = None
+    changes: List[WebhookChange] = []
+
+class WebhookPayload(BaseModel):
+    object: Optional[str] = None
+    entry: List[WebhookEntry] = []
+
+    @classmethod
+    def decode(cls, body: bytes) -> "WebhookPayload":
+        """Decodifica o corpo bruto da requisição diretamente para o modelo tipado."""
+        return cls.model_validate_json(body)
+
+    def iter_messages(self) -> Iterator[WebhookMessage]:
+        """Percorre todas as mensagens de todas as entradas e mudanças, em ordem."""
+        for entry in self.entry:
+            for change in entry.changes:
+                yield from change.value.messages
+
+    def iter_statuses(self) -> Iterator[WebhookStatus]:
+        """Percorre todas as notificações de status de todas as entradas e mudanças."""
+        for entry in self.entry:
+            for change in entry.changes:
+                yield from change.value.statuses
@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import re
+from collections import Counter, deque
+from enum import Enum, IntEnum
+from functools import partial
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app.services.conversation_state import ConversationState
+from app.services.text_normalization import normalize
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Prioridade do trabalho recebido pelo webhook (menor valor = mais importante)."""
+    HIGH = 0     # Confirmações e agendamentos em andamento
+    NORMAL = 1   # Demais mensagens de pacientes
+    LOW = 2      # Conversa casual e notificações de status
+
+
+class Decision(Enum):
+    """Decisão do controle de admissão."""
+    ADMIT = "admit"
+    DEFER = "defer"
+    SHED = "shed"
+
+
+# Estados em que o paciente está no meio de um agendamento
+BOOKING_STATES = {
+    ConversationState.WAITING_FOR_DATE,
+    ConversationState.WAITING_FOR_TIME,
+    ConversationState.WAITING_FOR_CONFIRMATION,
+    ConversationState.WAITING_FOR_INSURANCE_DOCS,
+}
+
+BOOKING_PATTERN = re.compile(
+    r"\b(sim|confirm\w*|agend\w*|marc\w*|remarc\w*|cancel\w*|horario\w*|consulta\w*|"
+    r"convenio\w*|particular|amanha|hoje|segunda|terca|quarta|quinta|sexta|sabado)\b"
+    r"|\d{1,2}\s*(h|:|/)"
+)
+
+SMALL_TALK = {
+    "oi", "ola", "opa", "e ai", "bom dia", "boa tarde", "boa noite", "tudo bem", "tudo bem?",
+    "obrigado", "obrigada", "obg", "valeu", "ok", "okay", "blz", "beleza", "certo", "tchau",
+}
+
+
+def classify_message_priority(text: str, state: ConversationState) -> Priority:
+    """
+    Classifica a prioridade de uma mensagem de paciente.
+
+    Args:
+        text: Texto da mensagem
+        state: Estado atual da conversa do paciente
+
+    Returns:
+        Priority: HIGH para agendamentos e confirmações, LOW para conversa casual
+    """
+    normalized = normalize(text).strip(" !.?,")
+    if state in BOOKING_STATES or BOOKING_PATTERN.search(normalized):
+        return Priority.HIGH
+    if normalized in SMALL_TALK or not any(char.isalnum() for char in normalized):
+        return Priority.LOW
+    return Priority.NORMAL
+
+
+class AdmissionController:
+    """
+    Controle de admissão e descarte de carga do webhook.
+
+    Acompanha o trabalho em andamento e a profundidade das filas. Acima do limite
+    suave, trabalho de baixa prioridade é adiado; acima do limite rígido, só
+    confirmações e agendamentos seguem, o resto é adiado ou descartado. O trabalho
+    adiado é retomado quando a carga volta para baixo do limite suave.
+
+    O trabalho adiado é guardado por conversa: antes de admitir uma nova mensagem
+    de um paciente, `flush` retoma o que estava adiado dele, na ordem, para que
+    nada passe à frente. Cada item adiado tem uma future que resolve quando ele
+    roda; quem o adiou pode segurar o payload original (no spool da ingestão)
+    até lá, já que o item em si vive só em memória.
+    """
+
+    def __init__(self,
+                 soft_limit: int = 200,
+                 hard_limit: int = 1000,
+                 max_deferred: int = 1000,
+                 drain_interval: float = 1.0,
+                 load_probe: Optional[Callable[[], int]] = None):
+        """
+        Args:
+            soft_limit: Carga a partir da qual trabalho de baixa prioridade é adiado
+            hard_limit: Carga a partir da qual apenas trabalho de alta prioridade é admitido
+            max_deferred: Número máximo de itens adiados (o excedente é descartado)
+            drain_interval: Intervalo (em segundos) entre tentativas de retomar itens adiados
+            load_probe: Função que retorna a profundidade das filas a jusante
+        """
+        self.soft_limit = soft_limit
+        self.hard_limit = hard_limit
+        self.max_deferred = max_deferred
+        self.drain_interval = drain_interval
+        self.load_probe = load_probe
+
+        self.in_flight = 0
+        self._deferred: Deque[Tuple[str, Callable[[], Awaitable], asyncio.Future]] = deque()
+        self._drainer: Optional[asyncio.Task] = None
+
+        self.decisions: Dict[str, Counter] = {decision.value: Counter() for decision in Decision}
+        self.resumed = 0
+
+    async def start(self) -> None:
+        """Inicia a rotina que retoma o trabalho adiado."""
+        if self._drainer is None:
+            self._drainer = asyncio.create_task(self._drain(), name="admission-drainer")
+
+    async def stop(self) -> None:
+        """Interrompe a rotina de retomada; as futures dos itens ainda adiados são canceladas."""
+        if self._drainer is not None:
+            self._drainer.cancel()
+            await asyncio.gather(self._drainer, return_exceptions=True)
+            self._drainer = None
+        while self._deferred:
+            _, _, outcome = self._deferred.popleft()
+            outcome.cancel()
+
+    @property
+    def load(self) -> int:
+        """Carga atual: trabalho em andamento mais a profundidade das filas."""
+        return self.in_flight + (self.load_probe() if self.load_probe else 0)
+
+    def decide(self, priority: Priority, deferrable: bool = True) -> Decision:
+        """
+        Decide se um trabalho deve ser admitido, adiado ou descartado.
+
+        Args:
+            priority: Prioridade do trabalho
+            deferrable: Se o trabalho pode ser adiado; se não, é admitido onde seria adiado
+        """
+        load = self.load
+        if load < self.soft_limit or priority is Priority.HIGH:
+            decision = Decision.ADMIT
+        elif load < self.hard_limit:
+            decision = Decision.ADMIT if priority is Priority.NORMAL else Decision.DEFER
+        else:
+            decision = Decision.DEFER if priority is Priority.NORMAL else Decision.SHED
+
+        if decision is Decision.DEFER and not deferrable:
+            decision = Decision.ADMIT
+        elif decision is Decision.DEFER and len(self._deferred) >= self.max_deferred:
+            decision = Decision.SHED
+
+        self.decisions[decision.value][priority.name.lower()] += 1
+        return decision
+
+    def defer(self, key: str, resume: Callable[[], Awaitable]) -> asyncio.Future:
+        """
+        Guarda um trabalho adiado para ser retomado quando a carga baixar.
+
+        Args:
+            key: Conversa do trabalho (telefone do paciente)
+            resume: Função sem argumentos que reenvia o trabalho ao pipeline e retorna
+                a future (ou corrotina) do seu resultado
+
+        Returns:
+            asyncio.Future: Resolvida com o resultado do trabalho depois de retomado;
+                cancelada se o serviço for encerrado antes
+        """
+        outcome = asyncio.get_running_loop().create_future()
+        self._deferred.append((key, resume, outcome))
+        return outcome
+
+    def has_deferred(self, key: str) -> bool:
+        """Indica se há trabalho adiado de uma conversa."""
+        return any(item[0] == key for item in self._deferred)
+
+    def flush(self, key: str) -> None:
+        """Retoma já, na ordem, o trabalho adiado de uma conversa."""
+        items = [item for item in self._deferred if item[0] == key]
+        if not items:
+            return
+        self._deferred = deque(item for item in self._deferred if item[0] != key)
+        for item in items:
+            self._resume(item)
+
+    async def run(self, job: Callable[[], Awaitable]):
+        """Executa um trabalho contabilizando-o como em andamento."""
+        self.in_flight += 1
+        try:
+            return await job()
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict:
+        """Retorna as métricas de admissão."""
+        return {
+            "load": self.load,
+            "in_flight": self.in_flight,
+            "soft_limit": self.soft_limit,
+            "hard_limit": self.hard_limit,
+            "deferred": len(self._deferred),
+            "resumed": self.resumed,
+            "decisions": {decision: dict(counts) for decision, counts in self.decisions.items()},
+        }
+
+    async def _drain(self) -> None:
+        while True:
+            await asyncio.sleep(self.drain_interval)
+            while self._deferred and self.load < self.soft_limit:
+                self._resume(self._deferred.popleft())
+
+    def _resume(self, item: Tuple[str, Callable[[], Awaitable], asyncio.Future]) -> None:
+        _, resume, outcome = item
+        self.resumed += 1
+        try:
+            result = asyncio.ensure_future(resume())
+        except Exception as e:
+            logger.error(f"Erro ao retomar trabalho adiado: {e}")
+            if not outcome.done():
+                outcome.set_exception(e)
+            return
+        result.add_done_callback(partial(_settle, outcome))
+
+
+def _settle(outcome: asyncio.Future, result: asyncio.Future) -> None:
+    """Repassa o desfecho do trabalho retomado para a future entregue por `defer`."""
+    if outcome.done():
+        return
+    if result.cancelled():
+        outcome.cancel()
+    elif result.exception() is not None:
+        outcome.set_exception(result.exception())
+    else:
+        outcome.set_result(result.result())
@@ -0,0 +1,314 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from collections import Counter
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+from app.services.outbound_scheduler import MessagePriority
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+QUEUED = "queued"
+SENT = "sent"
+FAILED = "failed"
+THROTTLED = "throttled"
+
+
+class BroadcastInProgressError(RuntimeError):
+    """Levantada ao tentar executar um broadcast que já está em andamento."""
+
+
+class BroadcastService:
+    """
+    Envio em massa de templates (lembretes, avisos) com checkpoint em disco.
+
+    Cada broadcast e o status de cada destinatário ficam gravados em SQLite.
+    Os envios correm em paralelo sob o agendador de saída do WhatsAppService,
+    e cada resultado é gravado assim que chega: se o processo cair, a retomada
+    envia apenas os destinatários que ainda não foram atendidos.
+
+    O destinatário é marcado como `queued` antes de o envio entrar na fila de
+    saída, e o envio corre protegido do cancelamento do `run`: se o cliente do
+    stream desconectar, o template ainda é enviado e o resultado é gravado, e
+    uma retomada não o repete. Destinatários que ficaram `queued` sem envio em
+    andamento (queda ou encerramento do processo) voltam a `pending` na
+    inicialização. O broadcast só é concluído sem nenhum destinatário pendente,
+    barrado ou na fila. Destinatários barrados pela fila de saída cheia são
+    tentados de novo, com backoff, no mesmo `run`.
+    """
+
+    def __init__(self,
+                 whatsapp_service,
+                 path: Optional[str] = "data/broadcasts.db",
+                 concurrency: int = 50,
+                 throttle_retries: int = 5,
+                 throttle_backoff: float = 1.0,
+                 throttle_backoff_max: float = 30.0):
+        """
+        Args:
+            whatsapp_service: Instância do WhatsAppService usada para os envios
+            path: Caminho do arquivo SQLite de checkpoint (None mantém apenas em memória)
+            concurrency: Número máximo de envios simultâneos por broadcast
+            throttle_retries: Novas tentativas de um destinatário barrado pela fila de saída
+                cheia antes de deixá-lo para a próxima retomada
+            throttle_backoff: Espera (em segundos) antes da primeira nova tentativa, dobrada a cada uma
+            throttle_backoff_max: Espera máxima (em segundos) entre tentativas
+        """
+        self.whatsapp_service = whatsapp_service
+        self.path = path
+        self.concurrency = concurrency
+        self.throttle_retries = throttle_retries
+        self.throttle_backoff = throttle_backoff
+        self.throttle_backoff_max = throttle_backoff_max
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._sends: Set[asyncio.Task] = set()
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS broadcasts ("
+            "id TEXT PRIMARY KEY, template_name TEXT NOT NULL, language_code TEXT NOT NULL, "
+            "priority INTEGER NOT NULL, created_at REAL NOT NULL, completed_at REAL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS broadcast_recipients ("
+            "broadcast_id TEXT NOT NULL, position INTEGER NOT NULL, phone TEXT NOT NULL, "
+            "components TEXT, status TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (broadcast_id, position))"
+        )
+        # Nenhum envio deste processo existe ainda: quem ficou na fila de saída de um
+        # processo anterior não foi entregue nem registrado e volta a ser atendido
+        self._db.execute(
+            "UPDATE broadcasts SET completed_at = NULL WHERE id IN "
+            "(SELECT broadcast_id FROM broadcast_recipients WHERE status = ?)", (QUEUED,)
+        )
+        self._db.execute(
+            "UPDATE broadcast_recipients SET status = ?, updated_at = ? WHERE status = ?",
+            (PENDING, time.time(), QUEUED)
+        )
+
+    def create(self,
+               template_name: str,
+               recipients: List[Dict],
+               language_code: str = "pt_BR",
+               priority: MessagePriority = MessagePriority.REMINDER,
+               broadcast_id: Optional[str] = None) -> str:
+        """
+        Registra um broadcast e os seus destinatários.
+
+        Args:
+            template_name: Nome do template aprovado
+            recipients: Lista de {"phone": ..., "components": [...]} (components opcional)
+            language_code: Código de idioma do template
+            priority: Classe de prioridade dos envios
+            broadcast_id: Identificador escolhido pelo chamador; se já existir, o
+                broadcast existente é mantido (útil para reenviar a mesma requisição)
+
+        Returns:
+            str: Identificador do broadcast
+        """
+        broadcast_id = broadcast_id or uuid.uuid4().hex
+        if self.exists(broadcast_id):
+            return broadcast_id
+
+        now = time.time()
+        self._db.execute("BEGIN")
+        try:
+            self._db.execute(
+                "INSERT INTO broadcasts (id, template_name, language_code, priority, created_at) VALUES (?, ?, ?, ?, ?)",
+                (broadcast_id, template_name, language_code, int(priority), now)
+            )
+            self._db.executemany(
+                "INSERT INTO broadcast_recipients (broadcast_id, position, phone, components, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (broadcast_id, position, recipient["phone"],
+                     json.dumps(recipient.get("components"), ensure_ascii=False), PENDING, now)
+                    for position, recipient in enumerate(recipients)
+                ]
+            )
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+        return broadcast_id
+
+    async def run(self, broadcast_id: str) -> AsyncIterator[Dict]:
+        """
+        Envia o broadcast aos destinatários ainda não atendidos.
+
+        Produz um dicionário por destinatário, na ordem em que os envios terminam,
+        e por fim um resumo com as contagens do broadcast inteiro.
+
+        Raises:
+            KeyError: Se o broadcast não existe
+            BroadcastInProgressError: Se o broadcast já está sendo enviado
+        """
+        broadcast = self._db.execute(
+            "SELECT template_name, language_code, priority FROM broadcasts WHERE id = ?", (broadcast_id,)
+        ).fetchone()
+        if broadcast is None:
+            raise KeyError(broadcast_id)
+        if broadcast_id in self._running:
+            raise BroadcastInProgressError(f"Broadcast {broadcast_id} já está em andamento")
+
+        template_name, language_code, priority = broadcast
+        rows = self._db.execute(
+            "SELECT position, phone, components FROM broadcast_recipients "
+            "WHERE broadcast_id = ? AND status IN (?, ?) ORDER BY position",
+            (broadcast_id, PENDING, THROTTLED)
+        ).fetchall()
+
+        self._running.add(broadcast_id)
+        pending = iter(rows)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            for position, phone, components in pending:
+                for attempt in range(self.throttle_retries + 1):
+                    try:
+                        status = await self._send(
+                            broadcast_id, position, phone, template_name, language_code, json.loads(components), priority
+                        )
+                    except Exception as e:
+                        logger.error(f"Erro no envio do broadcast {broadcast_id} para {phone}: {e}")
+                        status = FAILED
+                    if status != THROTTLED or attempt == self.throttle_retries:
+                        break
+                    # Fila de saída cheia: espera ela esvaziar antes de tentar de novo
+                    self._checkpoint(broadcast_id, position, THROTTLED)
+                    await asyncio.sleep(min(self.throttle_backoff * 2 ** attempt, self.throttle_backoff_max))
+                self._checkpoint(broadcast_id, position, status)
+                await results.put({"position": position, "phone": phone, "status": status})
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(rows)))]
+        try:
+            for _ in range(len(rows)):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._running.discard(broadcast_id)
+
+        yield {"summary": self._complete_if_done(broadcast_id)}
+
+    def summary(self, broadcast_id: str) -> Dict:
+        """Retorna as contagens de destinatários por status."""
+        counts = Counter(dict(self._db.execute(
+            "SELECT status, COUNT(*) FROM broadcast_recipients WHERE broadcast_id = ? GROUP BY status",
+            (broadcast_id,)
+        ).fetchall()))
+        return {
+            "broadcast_id": broadcast_id,
+            "total": sum(counts.values()),
+            QUEUED: counts[QUEUED],
+            SENT: counts[SENT],
+            FAILED: counts[FAILED],
+            THROTTLED: counts[THROTTLED],
+            PENDING: counts[PENDING],
+        }
+
+    def exists(self, broadcast_id: str) -> bool:
+        """Indica se o broadcast foi registrado."""
+        return self._db.execute("SELECT 1 FROM broadcasts WHERE id = ?", (broadcast_id,)).fetchone() is not None
+
+    def is_running(self, broadcast_id: str) -> bool:
+        """Indica se o broadcast está sendo enviado neste momento."""
+        return broadcast_id in self._running
+
+    def incomplete(self) -> List[str]:
+        """Broadcasts que ainda têm destinatários a atender."""
+        return [row[0] for row in self._db.execute(
+            "SELECT id FROM broadcasts WHERE completed_at IS NULL ORDER BY created_at"
+        ).fetchall()]
+
+    async def resume_incomplete(self) -> None:
+        """Retoma em segundo plano os broadcasts interrompidos (por exemplo, por um restart)."""
+        for broadcast_id in self.incomplete():
+            if broadcast_id not in self._running:
+                task = asyncio.create_task(self._drain(broadcast_id), name=f"broadcast-{broadcast_id}")
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def close(self) -> None:
+        """
+        Interrompe as retomadas e os envios em segundo plano e fecha o arquivo de checkpoint.
+        Os envios interrompidos continuam `queued` e voltam a `pending` na próxima inicialização.
+        """
+        tasks = self._tasks | self._sends
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._db.close()
+
+    def stats(self) -> Dict:
+        """Retorna as métricas de broadcast."""
+        return {
+            "running": len(self._running),
+            "incomplete": len(self.incomplete()),
+            "concurrency": self.concurrency,
+        }
+
+    async def _drain(self, broadcast_id: str) -> None:
+        try:
+            async for result in self.run(broadcast_id):
+                if "summary" in result:
+                    logger.info(f"Broadcast {broadcast_id} retomado: {result['summary']}")
+        except BroadcastInProgressError:
+            pass
+
+    async def _send(self, broadcast_id: str, position: int, phone: str, template_name: str,
+                    language_code: str, components: Optional[list], priority: int) -> str:
+        scheduler = self.whatsapp_service.outbound_scheduler
+        if scheduler is not None and scheduler.running and not scheduler.has_capacity:
+            return THROTTLED
+        # Gravado antes de o envio entrar na fila, para que uma retomada não o repita;
+        # o envio não é cancelado junto com o run e grava o próprio resultado
+        self._checkpoint(broadcast_id, position, QUEUED)
+        task = asyncio.create_task(self._deliver(
+            broadcast_id, position, phone, template_name, language_code, components, priority
+        ))
+        self._sends.add(task)
+        task.add_done_callback(self._sends.discard)
+        return await asyncio.shield(task)
+
+    async def _deliver(self, broadcast_id: str, position: int, phone: str, template_name: str,
+                       language_code: str, components: Optional[list], priority: int) -> str:
+        try:
+            sent = await self.whatsapp_service.send_template_message_async(
+                phone, template_name, language_code, components, MessagePriority(priority)
+            )
+            status = SENT if sent else FAILED
+        except Exception as e:
+            logger.error(f"Erro no envio do broadcast {broadcast_id} para {phone}: {e}")
+            status = FAILED
+        self._checkpoint(broadcast_id, position, status)
+        if broadcast_id not in self._running:
+            # O run já terminou (cliente desconectado): este pode ser o último envio
+            self._complete_if_done(broadcast_id)
+        return status
+
+    def _complete_if_done(self, broadcast_id: str) -> Dict:
+        summary = self.summary(broadcast_id)
+        if summary[PENDING] == 0 and summary[THROTTLED] == 0 and summary[QUEUED] == 0:
+            self._db.execute(
+                "UPDATE broadcasts SET completed_at = ? WHERE id = ? AND completed_at IS NULL",
+                (time.time(), broadcast_id)
+            )
+        return summary
+
+    def _checkpoint(self, broadcast_id: str, position: int, status: str) -> None:
+        self._db.execute(
+            "UPDATE broadcast_recipients SET status = ?, updated_at = ? WHERE broadcast_id = ? AND position = ?",
+            (status, time.time(), broadcast_id, position)
+        )
@@ -1,61 +1,527 @@
 import os
 import json
 import re
-from openai import OpenAI
+import time
+import asyncio
+from typing import Dict, List, Optional
+from openai import APIStatusError, AsyncOpenAI, OpenAI, RateLimitError
 from dotenv import load_dotenv
-from app.config.config import ACCEPTED_INSURANCE_PROVIDERS
+from pydantic import ValidationError
+from app.config.config import (
+    ACCEPTED_INSURANCE_PROVIDERS,
+    OPENAI_BREAKER_FAILURE_THRESHOLD,
+    OPENAI_BREAKER_RESET_SECONDS,
+    OPENAI_EXTRACTION_MAX_TOKENS,
+    OPENAI_HEDGE_DELAY_SECONDS,
+    OPENAI_HEDGE_MODEL,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_RATE_BURST_SECONDS,
+    OPENAI_ROUTES,
+    OPENAI_RPM_LIMIT,
+    OPENAI_SMALL_MODEL,
+    OPENAI_TIMEOUT_SECONDS,
+    OPENAI_TPM_LIMIT,
+)
+from app.models.intent import Intent, IntentExtraction
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.llm_cache import LLMResponseCache
+from app.services.model_router import ModelRouter
+from app.services.openai_rate_scheduler import LLMPriority, OpenAIRateScheduler, estimate_tokens
+from app.services.prompt_builder import PromptBuilder
+from app.services.slot_encoding import decode_slot_refs, encode_slots
+from app.services.slot_preference_filter import SlotPreferenceFilter
 from datetime import datetime
 
 load_dotenv()
 
+class LLMTimeoutError(RuntimeError):
+    """Raised when an OpenAI call does not finish before its deadline."""
+
+# Function the model is forced to call on the extraction path: its arguments are
+# the structured reading of the patient's message
+INTENT_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "record_intent",
+        "description": "Record what the patient wants and the reply to send back.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "intent": {"type": "string", "enum": [intent.value for intent in Intent]},
+                "date": {"type": ["string", "null"], "description": "Mentioned date, YYYY-MM-DD"},
+                "time": {"type": ["string", "null"], "description": "Mentioned time, HH:MM"},
+                "insurance": {"type": ["string", "null"], "description": "Mentioned insurance provider"},
+                "confirmation": {"type": ["boolean", "null"], "description": "True if the patient confirmed"},
+                "reply": {"type": "string", "description": "Short reply to the patient, in Portuguese"},
+            },
+            "required": ["intent", "reply"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Queue priority of each task when the caller does not give one: slot filtering
+# goes ahead of other patient messages, free conversation goes last
+TASK_PRIORITIES = {
+    "extract_intent": LLMPriority.NORMAL,
+    "analyze_patient_type": LLMPriority.NORMAL,
+    "filter_slots": LLMPriority.SLOT_FILTER,
+    "conversation": LLMPriority.SMALL_TALK,
+}
+
+# Pause applied to the request queue after a 429 without a Retry-After header
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+
+# Static part of the slot filtering prompt; the date, the slots and the preference go after it
+SLOT_FILTER_PROMPT = PromptBuilder("""
+You are an intelligent assistant helping a user filter available appointment slots based on their preference.
+You will be given the current date and time, a list of available slots, one line per day: the date, the weekday and then each slot as <number>=<start time HH:MM>, and the user's preference message.
+Analyze the user's preference considering dates (today, tomorrow, specific days like 'terça', 'dia 15'), time of day (morning, afternoon, specific hours like '10h', 'depois das 14h'), and relative terms.
+Use the current date and time given with the slots for relative terms like 'hoje' or 'amanhã' (America/Sao_Paulo time).
+
+Your task is to return ONLY a JSON object with the numbers of the slots from the list that strictly match the user's preference.
+
+Rules:
+- Return ONLY a valid JSON object like {"slots": [1, 4, 5]}.
+- If the user's preference is vague or implies flexibility (e.g., "qualquer horário", "pode ser"), return the numbers of ALL available slots.
+- If the user's preference does not match ANY available slots, return {"slots": []}.
+- If you cannot confidently determine matching slots based on the preference and the list, return {"slots": []}.
+- Do not include any explanations, introductory text, apologies, or formatting like ```json. Just the raw JSON object.
+- Interpret times relative to the America/Sao_Paulo timezone.
+- Assume 'morning' (manhã) is before 12:00, 'afternoon' (tarde) is from 12:00 to 18:00, 'evening/night' (noite) is after 18:00.
+""")
+
 class ChatGPTService:
-    def __init__(self):
+    def __init__(
+        self,
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+        timeout: float = OPENAI_TIMEOUT_SECONDS,
+        cache: Optional[LLMResponseCache] = None,
+        slot_filter: Optional[SlotPreferenceFilter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge_model: Optional[str] = OPENAI_HEDGE_MODEL,
+        hedge_delay: float = OPENAI_HEDGE_DELAY_SECONDS,
+        router: Optional[ModelRouter] = None,
+        rate_scheduler: Optional[OpenAIRateScheduler] = None
+    ):
+        """
+        Args:
+            max_concurrency: Maximum number of OpenAI calls in flight on the async path
+            timeout: Default deadline (in seconds) of an async call, time waiting for a slot included
+            cache: Response cache shared by generate_response and analyze_patient_type (no caching if omitted)
+            slot_filter: Local preference filter tried before the model in filter_slots_by_preference
+            breaker: Circuit breaker shared by every OpenAI call (created from the config if omitted)
+            hedge_model: Second model raced against a slow call on the async path (no hedging if omitted)
+            hedge_delay: Seconds to wait for the first answer before sending the hedged request
+            router: Model and generation parameters per task (OPENAI_MODEL for conversation and
+                    OPENAI_SMALL_MODEL for structured tasks if omitted)
+            rate_scheduler: Priority queue holding async calls within the account's RPM/TPM limits
+                            (created from OPENAI_RPM_LIMIT and OPENAI_TPM_LIMIT if omitted;
+                            no queueing if both are 0)
+        """
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
         
         if not self.api_key:
             raise ValueError("OpenAI API key not found in environment variables.")
         
+        # The sync client serves scripts running outside the event loop; request
+        # handling goes through the shared async client
         self.client = OpenAI(api_key=self.api_key)
+        self.async_client = AsyncOpenAI(api_key=self.api_key)
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.cache = cache
+        self.slot_filter = slot_filter or SlotPreferenceFilter()
+        self.breaker = breaker or CircuitBreaker(OPENAI_BREAKER_FAILURE_THRESHOLD, OPENAI_BREAKER_RESET_SECONDS)
+        self.hedge_model = hedge_model
+        self.hedge_delay = hedge_delay
+        self.router = router or ModelRouter.from_config(
+            self.model, OPENAI_SMALL_MODEL, OPENAI_EXTRACTION_MAX_TOKENS, OPENAI_ROUTES
+        )
+        if rate_scheduler is None and OPENAI_RPM_LIMIT > 0 and OPENAI_TPM_LIMIT > 0:
+            rate_scheduler = OpenAIRateScheduler(OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT, OPENAI_RATE_BURST_SECONDS)
+        self.rate_scheduler = rate_scheduler
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.invalid_extractions = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.rate_limited = 0
 
-    def generate_response(self, prompt: str, system_message: str = None) -> str:
+    @staticmethod
+    def _build_messages(prompt: str, system_message: Optional[str] = None) -> List[Dict]:
+        messages = []
+        if system_message:
+            messages.append({"role": "system", "content": system_message})
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    async def _complete(
+        self,
+        messages: List[Dict],
+        timeout: Optional[float] = None,
+        task: str = "conversation",
+        priority: Optional[LLMPriority] = None,
+        **params
+    ) -> str:
+        """
+        Runs a chat completion on the shared async client.
+
+        At most `max_concurrency` calls run at once; the others wait for a slot.
+        The deadline covers the wait and the call itself: once it passes, the
+        request is cancelled and LLMTimeoutError is raised. The model, `max_tokens`
+        and temperature come from the task's route; latency and token usage are
+        accounted under it.
+
+        With a rate scheduler, each request first waits its turn in the RPM/TPM
+        queue, by `priority` (the task's default priority if omitted); a 429
+        pauses the queue for the Retry-After and the request is sent once more.
+
+        While the circuit breaker is open, calls fail at once with CircuitOpenError.
+        A deadline counts as an OpenAI failure only if a request was actually sent;
+        one that expires while still waiting in our own queue or for a slot says
+        nothing about OpenAI's health. With a hedge model configured, a call still running after `hedge_delay`
+        is raced against the same request on that model.
+        """
+        self.breaker.check()
+        route = self.router.route(task)
+        params = {"max_tokens": route.max_tokens, "temperature": route.temperature, **params}
+        priority = TASK_PRIORITIES.get(task, LLMPriority.NORMAL) if priority is None else priority
+        deadline = self.timeout if timeout is None else timeout
+        dispatched = asyncio.Event()
+        try:
+            content = await asyncio.wait_for(
+                self._hedged_call(messages, params, task, route.model, priority, dispatched), deadline
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            if dispatched.is_set():
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+            raise LLMTimeoutError(f"OpenAI call exceeded its {deadline:.1f}s deadline")
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            self.failures += 1
+            self._record_outcome(e)
+            raise
+        self.breaker.record_success()
+        return content
+
+    def _record_outcome(self, error: Exception) -> None:
+        # Requests rejected for their own content (4xx other than 429) say nothing about OpenAI's health
+        if isinstance(error, APIStatusError) and error.status_code < 500 and error.status_code != 429:
+            self.breaker.release()
+        else:
+            self.breaker.record_failure()
+
+    async def _hedged_call(
+        self,
+        messages: List[Dict],
+        params: Dict,
+        task: str,
+        model: str,
+        priority: LLMPriority,
+        dispatched: asyncio.Event
+    ) -> str:
+        primary = asyncio.ensure_future(self._call(messages, params, task, model, priority, dispatched))
+        if not self.hedge_model:
+            return await primary
+
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_delay)
+            if done:
+                return primary.result()
+
+            self.hedged += 1
+            backup = asyncio.ensure_future(
+                self._call(messages, params, task, self.hedge_model, priority, dispatched)
+            )
+            pending.add(backup)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for call in done:
+                    if call.exception() is None:
+                        if call is backup:
+                            self.hedge_wins += 1
+                        return call.result()
+                    error = call.exception()
+            raise error
+        finally:
+            for call in pending:
+                call.cancel()
+
+    async def _call(
+        self,
+        messages: List[Dict],
+        params: Dict,
+        task: str,
+        model: str,
+        priority: LLMPriority,
+        dispatched: asyncio.Event
+    ) -> str:
+        tokens = estimate_tokens(messages, params.get("max_tokens", 0), params.get("tools"))
+        retried = False
+        while True:
+            if self.rate_scheduler is not None:
+                await self.rate_scheduler.acquire(tokens, priority)
+            try:
+                response, started = await self._send(messages, params, model, dispatched)
+                break
+            except RateLimitError as e:
+                self.rate_limited += 1
+                if self.rate_scheduler is None or retried:
+                    raise
+                retried = True
+                self.rate_scheduler.pause(self._retry_after(e))
+
+        self.completed += 1
+        self.router.record(task, model, time.perf_counter() - started, response)
+        message = response.choices[0].message
+        # With a forced tool call, the payload is in the call arguments, not in the content
+        tool_calls = getattr(message, "tool_calls", None)
+        if params.get("tools") and tool_calls:
+            return tool_calls[0].function.arguments
+        return (message.content or "").strip()
+
+    async def _send(self, messages: List[Dict], params: Dict, model: str, dispatched: asyncio.Event):
+        self.waiting += 1
+        acquired = False
+        try:
+            async with self._semaphore:
+                self.waiting -= 1
+                acquired = True
+                dispatched.set()
+                self.in_flight += 1
+                started = time.perf_counter()
+                try:
+                    response = await self.async_client.chat.completions.create(
+                        model=model, messages=messages, **params
+                    )
+                finally:
+                    self.in_flight -= 1
+        finally:
+            if not acquired:
+                self.waiting -= 1
+        return response, started
+
+    @staticmethod
+    def _retry_after(error: RateLimitError) -> float:
+        try:
+            return float(error.response.headers.get("retry-after"))
+        except (AttributeError, TypeError, ValueError):
+            return DEFAULT_RETRY_AFTER_SECONDS
+
+    async def aclose(self) -> None:
+        """Closes the HTTP connections of the OpenAI clients."""
+        await self.async_client.close()
+        self.client.close()
+
+    def stats(self) -> Dict:
+        """Returns the OpenAI call metrics of the async path."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "timeout_seconds": self.timeout,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "invalid_extractions": self.invalid_extractions,
+            "hedge_model": self.hedge_model,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "rate_limited": self.rate_limited,
+            "rate_limits": self.rate_scheduler.stats() if self.rate_scheduler is not None else None,
+            "circuit": self.breaker.stats(),
+            "slot_filter": self.slot_filter.stats(),
+            "routes": self.router.stats(),
+        }
+
+    def _cache_key(
+        self, prompt: str, system_message: Optional[str], cache: bool, task: str = "conversation"
+    ) -> Optional[str]:
+        if not cache or self.cache is None:
+            return None
+        return self.cache.key(prompt, system_message, self.router.route(task).model)
+
+    def generate_response(
+        self, prompt: str, system_message: str = None, cache: bool = True, task: str = "conversation"
+    ) -> str:
         """
         Generate a response using OpenAI's GPT model.
         
         Args:
             prompt (str): The user's message or prompt
             system_message (str, optional): A system message to guide the model's behavior
+            cache (bool): Reuse a cached response for the same normalized prompt (default True)
+            task (str): Route that picks the model, max_tokens and temperature (default "conversation")
             
         Returns:
             str: The generated response
             
         Raises:
+            CircuitOpenError: If OpenAI is failing and the circuit breaker is open
             Exception: If there's an error calling the OpenAI API
         """
+        key = self._cache_key(prompt, system_message, cache, task)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        self.breaker.check()
+        route = self.router.route(task)
         try:
-            messages = []
-            if system_message:
-                messages.append({"role": "system", "content": system_message})
-            messages.append({"role": "user", "content": prompt})
-
+            started = time.perf_counter()
             response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=150,
+                model=route.model,
+                messages=self._build_messages(prompt, system_message),
+                temperature=route.temperature,
+                max_tokens=route.max_tokens,
                 top_p=1.0,
                 frequency_penalty=0.0,
-                presence_penalty=0.0
+                presence_penalty=0.0,
+                timeout=self.timeout
             )
+            self.router.record(task, route.model, time.perf_counter() - started, response)
+            content = response.choices[0].message.content.strip()
+
+        except Exception as e:
+            self._record_outcome(e)
+            raise RuntimeError(f"Failed to generate response from OpenAI: {str(e)}")
+        self.breaker.record_success()
+
+        if key is not None:
+            self.cache.put(key, content, time.perf_counter() - started)
+        return content
 
-            return response.choices[0].message.content.strip()
+    async def generate_response_async(
+        self, prompt: str, system_message: str = None, timeout: Optional[float] = None, cache: bool = True
+    ) -> str:
+        """
+        Generate a response using OpenAI's GPT model without blocking the event loop.
+        
+        Args:
+            prompt (str): The user's message or prompt
+            system_message (str, optional): A system message to guide the model's behavior
+            timeout (float, optional): Deadline in seconds (defaults to the service's timeout)
+            cache (bool): Reuse a cached response for the same normalized prompt (default True)
+            
+        Returns:
+            str: The generated response
+            
+        Raises:
+            LLMTimeoutError: If the call does not finish before the deadline
+            CircuitOpenError: If OpenAI is failing and the circuit breaker is open
+            RuntimeError: If there's an error calling the OpenAI API
+        """
+        key = self._cache_key(prompt, system_message, cache)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
 
+        try:
+            started = time.perf_counter()
+            content = await self._complete(
+                self._build_messages(prompt, system_message),
+                timeout=timeout,
+                task="conversation",
+                top_p=1.0,
+                frequency_penalty=0.0,
+                presence_penalty=0.0
+            )
+        except (LLMTimeoutError, CircuitOpenError):
+            raise
         except Exception as e:
             raise RuntimeError(f"Failed to generate response from OpenAI: {str(e)}")
 
-    def analyze_patient_type(self, message: str) -> dict:
+        if key is not None:
+            self.cache.put(key, content, time.perf_counter() - started)
+        return content
+
+    async def extract_intent(
+        self,
+        message: str,
+        prompt: Optional[PromptBuilder] = None,
+        context: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        cache: bool = True,
+        priority: Optional[LLMPriority] = None
+    ) -> IntentExtraction:
+        """
+        Reads intent, date, time, insurance and confirmation from a patient's message in one call.
+
+        The model is forced to call `record_intent`, so the answer comes back as JSON
+        arguments validated against IntentExtraction instead of free text with markers.
+
+        Args:
+            message (str): The patient's message
+            prompt (PromptBuilder, optional): Static instructions sent ahead of everything else
+            context (dict, optional): Per-call context (current date, conversation step...) sent after them
+            timeout (float, optional): Deadline in seconds (defaults to the service's timeout)
+            cache (bool): Reuse a cached extraction for the same normalized message and context (default True)
+            priority (LLMPriority, optional): Place in the OpenAI request queue (NORMAL if omitted)
+
+        Returns:
+            IntentExtraction: The validated extraction; intent OTHER without a reply if the
+                              model's arguments do not validate
+
+        Raises:
+            LLMTimeoutError: If the call does not finish before the deadline
+            CircuitOpenError: If OpenAI is failing and the circuit breaker is open
+            RuntimeError: If there's an error calling the OpenAI API
+        """
+        prompt = prompt or PromptBuilder()
+        messages = prompt.build(message, context)
+        key = self._cache_key(message, "\0".join(m["content"] for m in messages[:-1]), cache, "extract_intent")
+        arguments = self.cache.get(key) if key is not None else None
+
+        if arguments is None:
+            try:
+                started = time.perf_counter()
+                arguments = await self._complete(
+                    messages,
+                    timeout=timeout,
+                    task="extract_intent",
+                    priority=priority,
+                    tools=[INTENT_TOOL],
+                    tool_choice={"type": "function", "function": {"name": INTENT_TOOL["function"]["name"]}}
+                )
+            except (LLMTimeoutError, CircuitOpenError):
+                raise
+            except Exception as e:
+                raise RuntimeError(f"Failed to extract intent from OpenAI: {str(e)}")
+            latency = time.perf_counter() - started
+        else:
+            latency = None
+
+        try:
+            extraction = IntentExtraction.model_validate_json(arguments)
+        except ValidationError as e:
+            self.invalid_extractions += 1
+            print(f"[ChatGPTService] Invalid intent extraction {arguments!r}: {e}")
+            return IntentExtraction()
+
+        if key is not None and latency is not None:
+            self.cache.put(key, arguments, latency)
+        return extraction.model_copy(update={"confidence": 1.0})
+
+    def analyze_patient_type(self, message: str, cache: bool = True) -> dict:
         """
         Analyze patient's message to classify insurance/private.
+        Identical messages (after normalization) reuse the cached classification unless `cache` is False.
         """
         system_message = """
         You are a medical scheduling assistant. Analyze the patient's message to determine:
@@ -72,7 +538,7 @@ class ChatGPTService:
         """
 
         try:
-            response = self.generate_response(message, system_message)
+            response = self.generate_response(message, system_message, cache=cache, task="analyze_patient_type")
             cleaned_response = self.clean_json_response(response)
             return json.loads(cleaned_response)
 
@@ -93,16 +559,20 @@ class ChatGPTService:
             return match.group(0)
         raise ValueError("No valid JSON found in response.")
 
-    def filter_slots_by_preference(
-        self, user_message: str, available_slots: list
+    async def filter_slots_by_preference(
+        self, user_message: str, available_slots: list, timeout: Optional[float] = None
     ) -> list:
         """
-        Uses ChatGPT to filter a list of available time slots based on user's natural language preference.
+        Filters a list of available time slots based on user's natural language preference.
+
+        Common phrasings (weekdays, "manhã/tarde/noite", "depois das 14h", "hoje/amanhã",
+        "dia N") are matched locally by the slot filter; ChatGPT only sees the rest.
 
         Args:
             user_message (str): The user's message describing their preference (e.g., "amanhã de manhã").
             available_slots (list): A list of dictionaries, where each dict represents a slot
                                     (e.g., {'slot_id': 'xyz', 'start_time': 'YYYY-MM-DDTHH:MM:SS'}).
+            timeout (float, optional): Deadline in seconds (defaults to the service's timeout)
 
         Returns:
             list: A (potentially empty) list containing only the slots that match the preference,
@@ -112,96 +582,72 @@ class ChatGPTService:
         if not available_slots:
             return [] # Nothing to filter
 
-        # 1. Format available slots for the prompt
-        formatted_slots_str = "\n".join(
-            [f"- ID: {slot['slot_id']} Time: {slot['start_time']}" for slot in available_slots]
+        local_matches = self.slot_filter.filter(user_message, available_slots)
+        if local_matches is not None:
+            return local_matches
+
+        # 1. Format available slots for the prompt: short ordinal references grouped by day,
+        # so neither the prompt nor the answer spends tokens on UUIDs and full timestamps
+        formatted_slots_str = encode_slots(available_slots)
+
+        # 2. Only the static instructions go first, so OpenAI can reuse its cached prefix;
+        # the current date, the slots and the preference change on every call and go last
+        now = datetime.now()
+        messages = SLOT_FILTER_PROMPT.build(
+            f"User preference: \"{user_message}\". Return the matching slot numbers.",
+            {
+                "Current date": now.strftime('%Y-%m-%d'),
+                "Current time": now.strftime('%H:%M'),
+                "Available slots": "\n" + formatted_slots_str,
+            }
         )
 
-        # 2. Define the system message
-        system_message = f"""
-You are an intelligent assistant helping a user filter available appointment slots based on their preference.
-You will be given the user's preference message and a list of available slots with their IDs and ISO 8601 start times.
-Analyze the user's preference considering dates (today, tomorrow, specific days like 'terça', 'dia 15'), time of day (morning, afternoon, specific hours like '10h', 'depois das 14h'), and relative terms.
-The current date and time context is important for relative terms like 'hoje' or 'amanhã'. Assume current date is {datetime.now().strftime('%Y-%m-%d')} and time is {datetime.now().strftime('%H:%M')} (America/Sao_Paulo time).
-
-Your task is to return ONLY a JSON list containing the exact 'slot_id' strings of the slots from the list below that strictly match the user's preference.
-
-Available Slots:
-{formatted_slots_str}
-
-Rules:
-- Return ONLY a valid JSON list of strings (slot IDs, e.g., ["slot1", "slot_xyz"]).
-- If the user's preference is vague or implies flexibility (e.g., "qualquer horário", "pode ser"), return the IDs of ALL available slots.
-- If the user's preference does not match ANY available slots, return an empty JSON list [].
-- If you cannot confidently determine matching slots based on the preference and the list, return an empty JSON list [].
-- Do not include any explanations, introductory text, apologies, or formatting like ```json. Just the raw JSON list.
-- Interpret times relative to the America/Sao_Paulo timezone.
-- Assume 'morning' (manhã) is before 12:00, 'afternoon' (tarde) is from 12:00 to 18:00, 'evening/night' (noite) is after 18:00.
-"""
-
-        # 3. Define the user prompt for the filtering task
-        user_prompt = f"User preference: \"{user_message}\". Please return the JSON list of matching slot IDs from the available list provided in the system message."
-
         print(f"[ChatGPTService] Filtering slots based on: '{user_message}'")
-        # print(f"[ChatGPTService] Prompt being sent to OpenAI:\nSystem: {system_message}\nUser: {user_prompt}") # Optional: Uncomment for debugging prompt
+        # print(f"[ChatGPTService] Messages being sent to OpenAI:\n{messages}") # Optional: Uncomment for debugging prompt
 
         try:
-            # 4. Call OpenAI API
-            # Using a model fine-tuned for JSON output might be better, but standard models work with clear instructions.
-            # Max tokens might need adjustment based on the number of slots. JSON list of IDs shouldn't be too long usually.
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.2, # Lower temperature for more deterministic filtering
-                max_tokens=500, # Estimate max tokens needed for a list of IDs
+            # 3. Call OpenAI API
+            raw_response_content = await self._complete(
+                messages,
+                timeout=timeout,
+                task="filter_slots", # Small model, low temperature; a slot number costs about two tokens
                 top_p=1.0,
                 frequency_penalty=0.0,
                 presence_penalty=0.0,
                 response_format={ "type": "json_object"} # Request JSON output if model supports it
             )
-            raw_response_content = response.choices[0].message.content.strip()
             print(f"[ChatGPTService] Raw response content from OpenAI: {raw_response_content}")
 
-            # 5. Parse the response (expecting a JSON object possibly containing a list)
+            # 4. Parse the response (expecting a JSON object with a list of slot numbers)
             try:
-                # Attempt to parse the response as JSON
                 parsed_json = json.loads(raw_response_content)
 
-                # The model might return {"slot_ids": [...]}. Extract the list.
                 # Handle cases where it might return just the list directly (less common with json_object mode)
                 if isinstance(parsed_json, list):
-                    matching_slot_ids = parsed_json
-                elif isinstance(parsed_json, dict) and isinstance(parsed_json.get("slot_ids"), list):
-                    matching_slot_ids = parsed_json["slot_ids"]
-                elif isinstance(parsed_json, dict) and isinstance(parsed_json.get("ids"), list):
-                    matching_slot_ids = parsed_json["ids"] # Handle another common key
+                    matching_refs = parsed_json
+                elif isinstance(parsed_json, dict):
+                    matching_refs = next(
+                        (parsed_json[key] for key in ("slots", "slot_ids", "ids") if isinstance(parsed_json.get(key), list)),
+                        None
+                    )
                 else:
-                    print("[ChatGPTService] JSON response did not contain a recognized list of slot IDs. Assuming no match.")
+                    matching_refs = None
+                if matching_refs is None:
+                    print("[ChatGPTService] JSON response did not contain a recognized list of slot numbers. Assuming no match.")
                     return []
 
-                # Validate that it's a list of strings
-                if not all(isinstance(sid, str) for sid in matching_slot_ids):
-                    print("[ChatGPTService] Parsed JSON list contains non-string elements. Returning empty list.")
-                    return []
+                # 5. Map the numbers back to the original slot dicts
+                filtered_list = decode_slot_refs(matching_refs, available_slots)
 
-            except json.JSONDecodeError:
-                print(f"[ChatGPTService] OpenAI response was not valid JSON: {raw_response_content}. Returning empty list.")
+            except (json.JSONDecodeError, ValueError):
+                print(f"[ChatGPTService] OpenAI response was not a valid list of slot numbers: {raw_response_content}. Returning empty list.")
                 return [] # Failed to parse JSON
 
-            # 6. Filter the original available_slots list based on the returned IDs
-            if not matching_slot_ids:
+            if not filtered_list:
                 print("[ChatGPTService] OpenAI returned no matching slots.")
                 return []
 
-            # Create a set for efficient lookup
-            matching_id_set = set(matching_slot_ids)
-
-            filtered_list = [slot for slot in available_slots if slot['slot_id'] in matching_id_set]
-
-            print(f"[ChatGPTService] Successfully filtered. Matched IDs: {matching_slot_ids}. Returning {len(filtered_list)} slots.")
+            print(f"[ChatGPTService] Successfully filtered. Matched slots: {matching_refs}. Returning {len(filtered_list)} slots.")
             return filtered_list
 
         except Exception as e:
@@ -0,0 +1,107 @@
+import time
+from enum import Enum
+from typing import Callable, Dict
+
+
+class CircuitOpenError(RuntimeError):
+    """Chamada recusada porque o circuito está aberto."""
+
+
+class CircuitState(Enum):
+    """Estado do disjuntor."""
+    CLOSED = "closed"        # Chamadas passam normalmente
+    OPEN = "open"            # Chamadas são recusadas na hora
+    HALF_OPEN = "half_open"  # Uma chamada de teste decide se o circuito fecha
+
+
+class CircuitBreaker:
+    """
+    Disjuntor para um serviço externo instável.
+
+    Após `failure_threshold` falhas seguidas, o circuito abre e as chamadas são
+    recusadas imediatamente, sem esperar pelo timeout do serviço. Passados
+    `reset_timeout` segundos, uma única chamada de teste é liberada: se der
+    certo, o circuito fecha; se falhar, volta a abrir por mais um período.
+    """
+
+    def __init__(self,
+                 failure_threshold: int = 5,
+                 reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            failure_threshold: Falhas seguidas que abrem o circuito
+            reset_timeout: Tempo (em segundos) com o circuito aberto antes da chamada de teste
+            clock: Relógio monotônico (substituível nos testes)
+        """
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold deve ser pelo menos 1")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+
+        self._state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> CircuitState:
+        """Estado atual, passando de aberto para semiaberto quando o período expira."""
+        if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._state = CircuitState.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        Indica se uma chamada pode seguir; no estado semiaberto, libera só a chamada de teste.
+        """
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def check(self) -> None:
+        """
+        Raises:
+            CircuitOpenError: Se o circuito não permitir a chamada
+        """
+        if not self.allow():
+            raise CircuitOpenError("Circuito aberto: serviço indisponível")
+
+    def release(self) -> None:
+        """Libera a chamada de teste sem resultado (ex.: cancelada ou erro do próprio pedido)."""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        """Registra uma chamada bem-sucedida e fecha o circuito."""
+        self._consecutive_failures = 0
+        self._state = CircuitState.CLOSED
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Registra uma falha; abre o circuito no limite ou se a chamada de teste falhar."""
+        self._consecutive_failures += 1
+        if self._state == CircuitState.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != CircuitState.OPEN:
+                self.opened += 1
+            self._state = CircuitState.OPEN
+            self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict:
+        """Retorna as métricas do disjuntor."""
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self._consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable]
+
+
+class LaneLimitError(RuntimeError):
+    """Levantada quando não há espaço para uma nova conversa ou para mais trabalho em uma conversa."""
+
+
+class _Lane:
+    """Fila serial (mailbox) de uma conversa."""
+
+    __slots__ = ("key", "pending", "scheduled", "last_active", "processed", "total_wait", "max_depth")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.pending: Deque[tuple] = deque()
+        self.scheduled = False
+        self.last_active = time.monotonic()
+        self.processed = 0
+        self.total_wait = 0.0
+        self.max_depth = 0
+
+    @property
+    def idle(self) -> bool:
+        return not self.pending and not self.scheduled
+
+
+class ConversationScheduler:
+    """
+    Agendador de trabalho por conversa.
+
+    Cada telefone tem a sua própria fila serial (lane), e um pool compartilhado de
+    workers atende as lanes prontas. O trabalho de um paciente é executado
+    estritamente em ordem, enquanto pacientes diferentes rodam em paralelo.
+    Lanes ociosas são recolhidas após `idle_ttl` segundos.
+    """
+
+    def __init__(self,
+                 workers: int = 8,
+                 max_lanes: int = 10000,
+                 max_lane_depth: int = 50,
+                 idle_ttl: float = 300.0):
+        """
+        Args:
+            workers: Número de workers compartilhados entre as lanes
+            max_lanes: Número máximo de conversas ativas simultaneamente
+            max_lane_depth: Número máximo de tarefas pendentes por conversa
+            idle_ttl: Tempo (em segundos) sem atividade até a lane ser recolhida
+        """
+        self.workers = workers
+        self.max_lanes = max_lanes
+        self.max_lane_depth = max_lane_depth
+        self.idle_ttl = idle_ttl
+
+        self._lanes: Dict[str, _Lane] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._pending = 0
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.reclaimed = 0
+
+    async def start(self) -> None:
+        """Inicia os workers e a rotina de recolhimento de lanes ociosas."""
+        if self._tasks:
+            return
+
+        self._ready = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"conversation-worker-{index}")
+            for index in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._reaper(), name="conversation-reaper"))
+
+    async def stop(self) -> None:
+        """Interrompe os workers e cancela o trabalho pendente."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        for lane in self._lanes.values():
+            for _, future, _ in lane.pending:
+                future.cancel()
+        self._lanes.clear()
+        self._pending = 0
+
+    def submit(self, key: str, job: Job) -> asyncio.Future:
+        """
+        Agenda uma tarefa na lane da conversa.
+
+        Args:
+            key: Identificador da conversa (telefone do paciente)
+            job: Função sem argumentos que retorna a corrotina a ser executada
+
+        Returns:
+            asyncio.Future: Resolvida com o resultado da tarefa quando ela terminar
+
+        Raises:
+            LaneLimitError: Se o limite de lanes ou de tarefas na lane foi atingido
+        """
+        if self._ready is None:
+            raise RuntimeError("ConversationScheduler não foi iniciado")
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            if len(self._lanes) >= self.max_lanes and not self._reclaim_idle(0.0):
+                self.rejected += 1
+                raise LaneLimitError(f"Limite de {self.max_lanes} conversas ativas atingido")
+            lane = self._lanes[key] = _Lane(key)
+
+        if len(lane.pending) >= self.max_lane_depth:
+            self.rejected += 1
+            raise LaneLimitError(f"Limite de {self.max_lane_depth} tarefas pendentes por conversa atingido")
+
+        future = asyncio.get_running_loop().create_future()
+        lane.pending.append((job, future, time.monotonic()))
+        lane.max_depth = max(lane.max_depth, len(lane.pending))
+        self._pending += 1
+        self.submitted += 1
+
+        if not lane.scheduled:
+            lane.scheduled = True
+            self._ready.put_nowait(lane)
+        return future
+
+    @property
+    def active_lanes(self) -> int:
+        """Número de lanes existentes (ativas ou aguardando recolhimento)."""
+        return len(self._lanes)
+
+    @property
+    def pending(self) -> int:
+        """Número total de tarefas aguardando execução."""
+        return self._pending
+
+    def stats(self, top: int = 10) -> Dict:
+        """
+        Retorna as métricas do agendador e das lanes mais carregadas.
+
+        Args:
+            top: Número de lanes detalhadas nas métricas
+        """
+        busiest = sorted(self._lanes.values(), key=lambda lane: len(lane.pending), reverse=True)[:top]
+        return {
+            "workers": self.workers,
+            "lanes": len(self._lanes),
+            "max_lanes": self.max_lanes,
+            "ready_lanes": self._ready.qsize() if self._ready is not None else 0,
+            "pending": self.pending,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "reclaimed": self.reclaimed,
+            "busiest_lanes": [
+                {
+                    "lane": f"***{lane.key[-4:]}",
+                    "depth": len(lane.pending),
+                    "max_depth": lane.max_depth,
+                    "processed": lane.processed,
+                    "avg_wait_ms": round(lane.total_wait / lane.processed * 1000, 3) if lane.processed else 0.0,
+                }
+                for lane in busiest
+            ],
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            lane = await self._ready.get()
+            job, future, submitted_at = lane.pending.popleft()
+            self._pending -= 1
+            lane.total_wait += time.monotonic() - submitted_at
+
+            if not future.cancelled():
+                try:
+                    result = await job()
+                    self.completed += 1
+                    if not future.done():
+                        future.set_result(result)
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Erro ao processar tarefa da conversa: {e}")
+                    if not future.done():
+                        future.set_exception(e)
+
+            lane.processed += 1
+            lane.last_active = time.monotonic()
+
+            # Devolve a lane ao fim da fila para alternar entre as conversas
+            if lane.pending:
+                self._ready.put_nowait(lane)
+            else:
+                lane.scheduled = False
+
+    async def _reaper(self) -> None:
+        interval = max(self.idle_ttl / 2, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            self._reclaim_idle(self.idle_ttl)
+
+    def _reclaim_idle(self, idle_for: float) -> int:
+        """Remove lanes sem trabalho há pelo menos `idle_for` segundos."""
+        now = time.monotonic()
+        expired = [
+            key for key, lane in self._lanes.items()
+            if lane.idle and now - lane.last_active >= idle_for
+        ]
+        for key in expired:
+            del self._lanes[key]
+        self.reclaimed += len(expired)
+        return len(expired)
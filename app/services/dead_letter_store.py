@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeadLetterStore:
+    """
+    Armazena os envios para a WhatsApp Cloud API que falharam de vez.
+
+    Cada registro guarda o destinatário, a prioridade, o payload da Cloud API,
+    o último erro e o número de tentativas, para inspeção e reenvio em lote.
+    """
+
+    def __init__(self, path: Optional[str] = "data/dead_letters.db"):
+        """
+        Args:
+            path: Caminho do arquivo SQLite (None mantém os registros apenas em memória)
+        """
+        self.path = path
+        self.added = 0
+        self.replayed = 0
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path or ":memory:", isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, recipient TEXT NOT NULL, priority INTEGER NOT NULL, "
+            "payload TEXT NOT NULL, error TEXT, attempts INTEGER NOT NULL, failed_at REAL NOT NULL, "
+            "replayed_at REAL)"
+        )
+
+    def add(self, recipient: str, priority: int, payload: Dict, error: str, attempts: int) -> int:
+        """
+        Registra um envio que falhou.
+
+        Returns:
+            int: Identificador do registro
+        """
+        cursor = self._db.execute(
+            "INSERT INTO dead_letters (recipient, priority, payload, error, attempts, failed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (recipient, int(priority), json.dumps(payload, ensure_ascii=False), error, attempts, time.time())
+        )
+        self.added += 1
+        logger.warning(f"Envio para {recipient} movido para a fila de mensagens mortas após {attempts} tentativa(s): {error}")
+        return cursor.lastrowid
+
+    def list(self, limit: int = 100, include_replayed: bool = False) -> List[Dict]:
+        """
+        Lista os registros mais antigos primeiro.
+
+        Args:
+            limit: Número máximo de registros
+            include_replayed: Se True, inclui os registros já reenviados
+        """
+        where = "" if include_replayed else "WHERE replayed_at IS NULL "
+        rows = self._db.execute(
+            f"SELECT * FROM dead_letters {where}ORDER BY id LIMIT ?", (limit,)
+        ).fetchall()
+        return [{**dict(row), "payload": json.loads(row["payload"])} for row in rows]
+
+    def get(self, ids: List[int]) -> List[Dict]:
+        """Retorna os registros com os identificadores informados que ainda não foram reenviados."""
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        rows = self._db.execute(
+            f"SELECT * FROM dead_letters WHERE replayed_at IS NULL AND id IN ({placeholders}) ORDER BY id", ids
+        ).fetchall()
+        return [{**dict(row), "payload": json.loads(row["payload"])} for row in rows]
+
+    def mark_replayed(self, ids: List[int]) -> None:
+        """Marca os registros como reenviados (uma nova falha gera um novo registro)."""
+        if not ids:
+            return
+        placeholders = ",".join("?" * len(ids))
+        self._db.execute(
+            f"UPDATE dead_letters SET replayed_at = ? WHERE id IN ({placeholders})", [time.time(), *ids]
+        )
+        self.replayed += len(ids)
+
+    def count(self) -> int:
+        """Número de registros aguardando reenvio."""
+        return self._db.execute("SELECT COUNT(*) FROM dead_letters WHERE replayed_at IS NULL").fetchone()[0]
+
+    def close(self) -> None:
+        """Fecha o arquivo SQLite."""
+        self._db.close()
+
+    def stats(self) -> Dict:
+        """Retorna as métricas da fila de mensagens mortas."""
+        return {
+            "pending": self.count(),
+            "added": self.added,
+            "replayed": self.replayed,
+            "persistent": bool(self.path),
+        }
@@ -0,0 +1,98 @@
+import logging
+from collections import Counter, OrderedDict
+from typing import Dict, Optional
+
+from pydantic import ValidationError
+
+from app.models.webhook import WebhookPayload, WebhookStatus
+
+logger = logging.getLogger(__name__)
+
+
+def is_status_only_payload(body: bytes) -> bool:
+    """
+    Classifica o corpo bruto do webhook sem decodificá-lo.
+
+    Notificações de status (sent, delivered, read) trazem a chave "statuses" e
+    nenhuma chave "messages". Dentro de textos enviados pelo paciente as aspas
+    chegam escapadas, então a busca pela chave entre aspas não confunde conteúdo
+    com estrutura; na dúvida, o payload segue para o pipeline principal.
+    """
+    return b'"statuses"' in body and b'"messages"' not in body
+
+
+class DeliveryTracker:
+    """
+    Registro leve das notificações de entrega de mensagens enviadas.
+
+    Guarda o último status de cada mensagem (limitado às mais recentes) e
+    contadores por status, sem passar pelo pipeline de conversação.
+    """
+
+    def __init__(self, enabled: bool = True, max_entries: int = 50000):
+        """
+        Args:
+            enabled: Se False, as notificações são apenas contadas e descartadas
+            max_entries: Número máximo de mensagens com status guardado
+        """
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._last_status: "OrderedDict[str, str]" = OrderedDict()
+        self.status_counts: Counter = Counter()
+        self.received = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def record(self, body: bytes) -> int:
+        """
+        Registra as notificações de status contidas no corpo do webhook.
+
+        Returns:
+            int: Número de notificações de status registradas
+        """
+        self.received += 1
+        if not self.enabled:
+            self.dropped += 1
+            return 0
+
+        try:
+            payload = WebhookPayload.decode(body)
+        except ValidationError as e:
+            self.errors += 1
+            logger.warning(f"Notificação de status inválida: {e}")
+            return 0
+
+        recorded = 0
+        for status in payload.iter_statuses():
+            self._track(status)
+            recorded += 1
+        return recorded
+
+    def get_status(self, message_id: str) -> Optional[str]:
+        """Retorna o último status conhecido de uma mensagem enviada."""
+        return self._last_status.get(message_id)
+
+    def stats(self) -> Dict:
+        """Retorna as métricas de entrega."""
+        return {
+            "enabled": self.enabled,
+            "received": self.received,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "tracked_messages": len(self._last_status),
+            "statuses": dict(self.status_counts),
+        }
+
+    def _track(self, status: WebhookStatus) -> None:
+        message_id = status.id
+        value = status.status or "unknown"
+        self.status_counts[value] += 1
+
+        if value == "failed":
+            logger.warning(f"Falha na entrega da mensagem {message_id}: {status.errors}")
+
+        if message_id:
+            self._last_status[message_id] = value
+            self._last_status.move_to_end(message_id)
+            while len(self._last_status) > self.max_entries:
+                self._last_status.popitem(last=False)
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from functools import partial
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+WebhookHandler = Callable[[bytes], Awaitable[Optional[asyncio.Future]]]
+
+
+class IngestionQueue:
+    """
+    Fila de ingestão de webhooks com spool em disco e pool de workers asyncio.
+
+    Cada payload bruto é gravado no spool (SQLite) antes de entrar na fila em
+    memória e só é removido depois que um worker termina de processá-lo. Assim,
+    um restart não perde mensagens: o que estava pendente é recuperado no start.
+
+    Se o handler retornar uma future (trabalho adiado pelo controle de admissão),
+    o worker segue para o próximo payload e o atual só sai do spool quando ela
+    terminar; se ela for cancelada (encerramento), o payload é reprocessado no
+    próximo start.
+    """
+
+    def __init__(self,
+                 handler: WebhookHandler,
+                 workers: int = 4,
+                 max_depth: int = 1000,
+                 spool_path: Optional[str] = "data/ingestion_spool.db"):
+        """
+        Args:
+            handler: Corrotina que processa um payload bruto e, opcionalmente, retorna
+                a future do trabalho que ficou pendente
+            workers: Número de workers concorrentes
+            max_depth: Número máximo de payloads pendentes antes de descartar novos
+            spool_path: Caminho do arquivo SQLite do spool (None desativa a persistência)
+        """
+        self.handler = handler
+        self.workers = workers
+        self.max_depth = max_depth
+        self.spool_path = spool_path
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._db: Optional[sqlite3.Connection] = None
+        self._next_id = 0
+
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.recovered = 0
+        self.held = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def start(self) -> None:
+        """Abre o spool, recupera os payloads pendentes e inicia os workers."""
+        if self._tasks:
+            return
+
+        self._queue = asyncio.Queue()
+        self._open_spool()
+
+        for row_id, body in self._pending_rows():
+            self._queue.put_nowait((row_id, body, time.monotonic()))
+            self.recovered += 1
+        if self.recovered:
+            logger.info(f"{self.recovered} payloads recuperados do spool {self.spool_path}")
+
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"ingestion-worker-{index}")
+            for index in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """
+        Interrompe os workers. Payloads não processados permanecem no spool
+        e são reprocessados no próximo start.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def enqueue(self, body: bytes) -> bool:
+        """
+        Grava o payload no spool e o coloca na fila.
+
+        Returns:
+            bool: True se o payload foi aceito, False se foi descartado por falta de espaço
+        """
+        if self._queue is None:
+            raise RuntimeError("IngestionQueue não foi iniciada")
+
+        if self._queue.qsize() >= self.max_depth:
+            self.dropped += 1
+            logger.warning(f"Fila de ingestão cheia ({self.max_depth}); payload descartado")
+            return False
+
+        row_id = self._spool(body)
+        self._queue.put_nowait((row_id, body, time.monotonic()))
+        self.enqueued += 1
+        return True
+
+    @property
+    def depth(self) -> int:
+        """Número de payloads aguardando um worker."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self) -> Dict:
+        """Retorna as métricas da fila."""
+        started = self.processed + self.failed
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "workers": self.workers,
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "recovered": self.recovered,
+            "held": self.held,
+            "avg_wait_ms": round(self._total_wait / started * 1000, 3) if started else 0.0,
+            "max_wait_ms": round(self._max_wait * 1000, 3),
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            row_id, body, enqueued_at = await self._queue.get()
+            wait = time.monotonic() - enqueued_at
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+
+            pending = None
+            try:
+                pending = await self.handler(body)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Erro ao processar payload do webhook: {e}")
+            finally:
+                self._queue.task_done()
+
+            if isinstance(pending, asyncio.Future) and not pending.done():
+                self.held += 1
+                pending.add_done_callback(partial(self._release_held, row_id))
+            elif not (isinstance(pending, asyncio.Future) and pending.cancelled()):
+                self._unspool(row_id)
+
+    def _release_held(self, row_id: int, pending: asyncio.Future) -> None:
+        self.held -= 1
+        # Cancelada: o trabalho foi descartado no encerramento e o payload fica para o próximo start
+        if not pending.cancelled():
+            self._unspool(row_id)
+
+    def _open_spool(self) -> None:
+        if not self.spool_path:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+        self._db = sqlite3.connect(self.spool_path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS webhook_spool ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, body BLOB NOT NULL, received_at REAL NOT NULL)"
+        )
+
+    def _pending_rows(self) -> List[tuple]:
+        if self._db is None:
+            return []
+        return self._db.execute("SELECT id, body FROM webhook_spool ORDER BY id").fetchall()
+
+    def _spool(self, body: bytes) -> int:
+        if self._db is None:
+            self._next_id += 1
+            return self._next_id
+        cursor = self._db.execute(
+            "INSERT INTO webhook_spool (body, received_at) VALUES (?, ?)", (body, time.time())
+        )
+        return cursor.lastrowid
+
+    def _unspool(self, row_id: int) -> None:
+        if self._db is not None:
+            self._db.execute("DELETE FROM webhook_spool WHERE id = ?", (row_id,))
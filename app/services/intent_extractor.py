@@ -0,0 +1,195 @@
+import re
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional
+
+from app.models.intent import Intent, IntentExtraction
+from app.services.conversation_state import ConversationState
+from app.services.text_normalization import normalize
+
+WEEKDAYS = {
+    "segunda": 0, "terca": 1, "quarta": 2, "quinta": 3, "sexta": 4, "sabado": 5, "domingo": 6,
+}
+
+MONTHS = {
+    "janeiro": 1, "fevereiro": 2, "marco": 3, "abril": 4, "maio": 5, "junho": 6,
+    "julho": 7, "agosto": 8, "setembro": 9, "outubro": 10, "novembro": 11, "dezembro": 12,
+}
+
+RELATIVE_DAYS = (("depois de amanha", 2), ("amanha", 1), ("hoje", 0))
+
+NUMERIC_DATE = re.compile(r"\b(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?\b")
+MONTH_DATE = re.compile(r"\b(?:dia\s+)?(\d{1,2})\s+de\s+(" + "|".join(MONTHS) + r")\b")
+DAY_OF_MONTH = re.compile(r"\bdia\s+(\d{1,2})\b")
+WEEKDAY = re.compile(r"\b(" + "|".join(WEEKDAYS) + r")(?:[\s-]*feira)?\b")
+
+HOUR_MINUTE = re.compile(r"\b(\d{1,2}):(\d{2})\b")
+HOUR_SUFFIX = re.compile(r"\b(\d{1,2})\s*h(?:s|oras?)?\s*(\d{2})?\b")
+AT_HOUR = re.compile(r"\bas\s+(\d{1,2})\b(?!\s*/)")
+AFTERNOON = re.compile(r"\b(da tarde|da noite)\b")
+
+PRIVATE = re.compile(r"\bparticular\b")
+INSURANCE_MENTION = re.compile(r"\b(convenio|plano de saude|plano)\b")
+CONFIRMATION = re.compile(r"^(sim|confirmo|confirmado|confirmar|pode ser|pode confirmar|ok|isso|claro|fechado|perfeito)\b")
+NEGATION = re.compile(r"\b(nao|nunca|cancela|cancelar)\b")
+SCHEDULING = re.compile(r"\b(agend\w*|marc\w*|horario|prefiro|pode ser|posso ir|tem vaga)\b")
+QUESTION = re.compile(r"\b(quanto|custa|valor|preco|onde|como|por que)\b")
+
+SCHEDULING_STATES = {
+    ConversationState.WAITING_FOR_DATE,
+    ConversationState.WAITING_FOR_TIME,
+    ConversationState.WAITING_FOR_CONFIRMATION,
+}
+
+
+class IntentExtractor:
+    """
+    Extrator local de intenção e entidades das mensagens dos pacientes.
+
+    Reconhece, sem chamada de rede, os padrões mais comuns em português: datas
+    ("amanhã", "terça", "dia 15", "15/05"), horários ("10h", "às 14:30"),
+    convênios aceitos, "particular" e confirmações ("sim", "confirmo"). Devolve
+    o mesmo IntentExtraction que a interpretação do ChatGPT, com uma confiança;
+    abaixo do limite, a mensagem segue para o ChatGPT.
+    """
+
+    def __init__(self, accepted_insurances: Iterable[str], threshold: float = 0.8):
+        """
+        Args:
+            accepted_insurances: Nomes dos convênios aceitos
+            threshold: Confiança mínima para dispensar o ChatGPT
+        """
+        # Nome normalizado -> nome como aparece na lista de convênios
+        self.insurances: Dict[str, str] = {normalize(name): name for name in accepted_insurances}
+        self._insurance_pattern = re.compile(
+            r"\b(" + "|".join(re.escape(name) for name in sorted(self.insurances, key=len, reverse=True)) + r")\b"
+        )
+        self.threshold = threshold
+
+        self.resolved = 0
+        self.fallbacks = 0
+
+    def extract(self,
+                text: str,
+                state: Optional[ConversationState] = None,
+                today: Optional[date] = None) -> IntentExtraction:
+        """
+        Interpreta uma mensagem do paciente.
+
+        Args:
+            text: Texto da mensagem
+            state: Estado atual da conversa (confirmações só valem aguardando confirmação)
+            today: Data de referência para termos relativos (padrão: hoje)
+
+        Returns:
+            IntentExtraction: Intenção, entidades e confiança
+        """
+        normalized = normalize(text)
+        today = today or date.today()
+
+        if PRIVATE.search(normalized):
+            return IntentExtraction(intent=Intent.PRIVATE, confidence=0.95)
+
+        insurance = self._insurance_pattern.search(normalized)
+        if insurance:
+            return IntentExtraction(
+                intent=Intent.INSURANCE, insurance=self.insurances[insurance.group(1)], confidence=0.95
+            )
+        if INSURANCE_MENTION.search(normalized):
+            # Convênio fora da lista: o ChatGPT identifica o nome para a resposta
+            return IntentExtraction(intent=Intent.INSURANCE, confidence=0.3)
+
+        found_date = self._extract_date(normalized, today)
+        found_time = self._extract_time(normalized)
+        if found_date or found_time:
+            # "hoje" ou "dia" soltos numa pergunta qualquer não bastam: fora da etapa de
+            # agendamento, a data só vale em mensagens curtas ou que falam de agendar
+            scheduling = state in SCHEDULING_STATES or (
+                not QUESTION.search(normalized)
+                and (len(normalized.split()) <= 6 or SCHEDULING.search(normalized))
+            )
+            confidence = 0.9 if scheduling else 0.6
+            if found_date:
+                return IntentExtraction(intent=Intent.DATE, date=found_date, time=found_time, confidence=confidence)
+            return IntentExtraction(intent=Intent.TIME, time=found_time, confidence=confidence)
+
+        if CONFIRMATION.search(normalized) and not NEGATION.search(normalized):
+            confidence = 0.9 if state == ConversationState.WAITING_FOR_CONFIRMATION else 0.4
+            return IntentExtraction(intent=Intent.CONFIRMATION, confirmation=True, confidence=confidence)
+
+        return IntentExtraction(intent=Intent.OTHER, confidence=0.0)
+
+    def is_confident(self, extraction: IntentExtraction) -> bool:
+        """Indica se a interpretação local basta, contabilizando o resultado."""
+        confident = extraction.confidence >= self.threshold
+        if confident:
+            self.resolved += 1
+        else:
+            self.fallbacks += 1
+        return confident
+
+    def stats(self) -> Dict:
+        """Retorna as métricas do extrator local."""
+        total = self.resolved + self.fallbacks
+        return {
+            "resolved_locally": self.resolved,
+            "llm_fallbacks": self.fallbacks,
+            "local_rate": round(self.resolved / total, 4) if total else 0.0,
+            "threshold": self.threshold,
+        }
+
+    @staticmethod
+    def _extract_date(text: str, today: date) -> Optional[str]:
+        for term, days in RELATIVE_DAYS:
+            if re.search(rf"\b{term}\b", text):
+                return (today + timedelta(days=days)).isoformat()
+
+        match = NUMERIC_DATE.search(text)
+        if match:
+            day, month, year = int(match.group(1)), int(match.group(2)), match.group(3)
+            if year:
+                year = int(year) + (2000 if len(year) == 2 else 0)
+            return IntentExtractor._build_date(day, month, year, today)
+
+        match = MONTH_DATE.search(text)
+        if match:
+            return IntentExtractor._build_date(int(match.group(1)), MONTHS[match.group(2)], None, today)
+
+        match = DAY_OF_MONTH.search(text)
+        if match:
+            day = int(match.group(1))
+            month, year = today.month, today.year
+            if day < today.day:
+                month, year = (1, year + 1) if month == 12 else (month + 1, year)
+            return IntentExtractor._build_date(day, month, year, today)
+
+        match = WEEKDAY.search(text)
+        if match:
+            days_ahead = (WEEKDAYS[match.group(1)] - today.weekday()) % 7 or 7
+            return (today + timedelta(days=days_ahead)).isoformat()
+
+        return None
+
+    @staticmethod
+    def _build_date(day: int, month: int, year: Optional[int], today: date) -> Optional[str]:
+        """Monta a data; sem ano, usa a próxima ocorrência a partir de hoje."""
+        try:
+            candidate = date(year or today.year, month, day)
+            if year is None and candidate < today:
+                candidate = date(today.year + 1, month, day)
+        except ValueError:
+            return None
+        return candidate.isoformat()
+
+    @staticmethod
+    def _extract_time(text: str) -> Optional[str]:
+        for pattern in (HOUR_MINUTE, HOUR_SUFFIX, AT_HOUR):
+            match = pattern.search(text)
+            if match:
+                hour = int(match.group(1))
+                minute = int(match.group(2) or 0) if pattern.groups >= 2 else 0
+                if hour < 12 and AFTERNOON.search(text):
+                    hour += 12
+                if hour < 24 and minute < 60:
+                    return f"{hour:02d}:{minute:02d}"
+        return None
+
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from app.services.text_normalization import normalize
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """
+    Cache das respostas da OpenAI.
+
+    Mensagens quase idênticas ("quero agendar", "Quero  agendar!") caem na mesma
+    chave: texto normalizado, hash da mensagem de sistema e modelo. As respostas
+    ficam em um LRU limitado com TTL e, opcionalmente, em um arquivo SQLite que
+    sobrevive a restarts. Cada acerto contabiliza a latência que a chamada
+    original levou, exportada como tempo economizado.
+    """
+
+    # Intervalo (em inserções) entre limpezas das respostas expiradas no SQLite
+    PURGE_EVERY = 1000
+
+    def __init__(self,
+                 max_entries: int = 1000,
+                 ttl: float = 3600.0,
+                 persist_path: Optional[str] = None):
+        """
+        Args:
+            max_entries: Número máximo de respostas mantidas em memória
+            ttl: Tempo (em segundos) durante o qual uma resposta é reaproveitada
+            persist_path: Caminho do arquivo SQLite do cache em disco (opcional)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.persist_path = persist_path
+
+        # chave -> (resposta, latência da chamada original, criado em)
+        self._entries: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._inserts = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+        if persist_path:
+            self._open_store()
+
+    @staticmethod
+    def key(prompt: str, system_message: Optional[str], model: str) -> str:
+        """Monta a chave do cache para um prompt, mensagem de sistema e modelo."""
+        system_hash = hashlib.sha256((system_message or "").encode("utf-8")).hexdigest()
+        raw = f"{model}\0{system_hash}\0{normalize(prompt)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Retorna a resposta em cache, se houver e não tiver expirado.
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and now - entry[2] >= self.ttl:
+            del self._entries[key]
+            entry = None
+
+        if entry is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT response, latency, created_at FROM llm_responses WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                entry = tuple(row)
+                self.disk_hits += 1
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.saved_seconds += entry[1]
+        self._remember(key, entry)
+        return entry[0]
+
+    def put(self, key: str, response: str, latency: float) -> None:
+        """
+        Armazena uma resposta.
+
+        Args:
+            key: Chave montada por `key()`
+            response: Resposta da OpenAI
+            latency: Duração (em segundos) da chamada que gerou a resposta
+        """
+        now = time.time()
+        self._remember(key, (response, latency, now))
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, latency, created_at) VALUES (?, ?, ?, ?)",
+                (key, response, latency, now)
+            )
+            self._inserts += 1
+            if self._inserts % self.PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl,))
+
+    def close(self) -> None:
+        """Fecha o arquivo do cache em disco."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict:
+        """Retorna as métricas do cache."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "persistent": self._db is not None,
+        }
+
+    def _remember(self, key: str, entry: Tuple[str, float, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _open_store(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.persist_path)), exist_ok=True)
+        self._db = sqlite3.connect(self.persist_path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, latency REAL NOT NULL, created_at REAL NOT NULL)"
+        )
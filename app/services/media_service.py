@@ -0,0 +1,205 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MediaTooLargeError(ValueError):
+    """Levantada quando a mídia passa do tamanho máximo permitido."""
+
+
+class MediaIntegrityError(ValueError):
+    """Levantada quando o hash do conteúdo baixado não confere com o informado pela Meta."""
+
+
+@dataclass
+class StoredMedia:
+    """Mídia armazenada localmente, endereçada pelo hash do conteúdo"""
+    sha256: str
+    path: str
+    mime_type: Optional[str]
+    size: int
+    deduplicated: bool = False
+
+
+def normalize_sha256(value: Optional[str]) -> Optional[str]:
+    """
+    Normaliza um hash SHA-256 para hexadecimal minúsculo.
+    A Meta pode informar o hash em hexadecimal ou em base64.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if len(value) == 64:
+        try:
+            bytes.fromhex(value)
+            return value.lower()
+        except ValueError:
+            pass
+    try:
+        digest = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return digest.hex() if len(digest) == 32 else None
+
+
+class MediaService:
+    """
+    Download das mídias recebidas pelo webhook (carteirinha, documentos).
+
+    A mídia é resolvida no endpoint de mídia da Cloud API e baixada em
+    streaming, em blocos, direto para um arquivo temporário enquanto o hash é
+    calculado; nenhum arquivo fica inteiro em memória. O arquivo final é
+    endereçado pelo SHA-256 do conteúdo, então a mesma imagem enviada duas vezes
+    é armazenada uma única vez (e, se a Meta informa o hash, nem é baixada de novo).
+    """
+
+    def __init__(self,
+                 whatsapp_service,
+                 storage_dir: str = "data/media",
+                 concurrency: int = 8,
+                 chunk_size: int = 64 * 1024,
+                 max_bytes: int = 100 * 1024 * 1024):
+        """
+        Args:
+            whatsapp_service: Instância do WhatsAppService (credenciais e cliente HTTP compartilhado)
+            storage_dir: Diretório de armazenamento das mídias
+            concurrency: Número máximo de downloads simultâneos
+            chunk_size: Tamanho (em bytes) dos blocos lidos da rede
+            max_bytes: Tamanho máximo aceito para uma mídia
+        """
+        self.whatsapp_service = whatsapp_service
+        self.storage_dir = storage_dir
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        self.downloads = 0
+        self.deduplicated = 0
+        self.failed = 0
+        self.bytes_downloaded = 0
+
+    async def fetch(self, media_id: str, sha256: Optional[str] = None, mime_type: Optional[str] = None) -> StoredMedia:
+        """
+        Baixa e armazena uma mídia, reaproveitando o arquivo se o conteúdo já existe.
+
+        Args:
+            media_id: Identificador da mídia informado pelo webhook
+            sha256: Hash do conteúdo informado pelo webhook (opcional)
+            mime_type: Tipo da mídia informado pelo webhook (opcional)
+
+        Returns:
+            StoredMedia: Arquivo armazenado
+
+        Raises:
+            MediaTooLargeError: Se a mídia passa de `max_bytes`
+            MediaIntegrityError: Se o conteúdo não confere com o hash informado
+            httpx.HTTPError: Se a Cloud API falhar
+        """
+        stored = self._existing(normalize_sha256(sha256), mime_type)
+        if stored is not None:
+            return stored
+
+        # Reentregas e mensagens repetidas compartilham o mesmo download em andamento
+        task = self._in_flight.get(media_id)
+        if task is None:
+            task = asyncio.create_task(self._download(media_id, sha256, mime_type), name=f"media-{media_id}")
+            self._in_flight[media_id] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(media_id, None))
+        return await asyncio.shield(task)
+
+    def path_for(self, sha256: str, mime_type: Optional[str] = None) -> str:
+        """Caminho endereçado pelo conteúdo: <storage_dir>/<2 primeiros dígitos>/<sha256><extensão>."""
+        extension = mimetypes.guess_extension((mime_type or "").split(";")[0].strip()) or ""
+        return os.path.join(self.storage_dir, sha256[:2], f"{sha256}{extension}")
+
+    async def close(self) -> None:
+        """Cancela os downloads em andamento."""
+        tasks = list(self._in_flight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        """Retorna as métricas de download de mídias."""
+        return {
+            "in_flight": len(self._in_flight),
+            "downloads": self.downloads,
+            "deduplicated": self.deduplicated,
+            "failed": self.failed,
+            "bytes_downloaded": self.bytes_downloaded,
+        }
+
+    def _existing(self, sha256: Optional[str], mime_type: Optional[str]) -> Optional[StoredMedia]:
+        if not sha256:
+            return None
+        path = self.path_for(sha256, mime_type)
+        if not os.path.exists(path):
+            return None
+        self.deduplicated += 1
+        return StoredMedia(sha256, path, mime_type, os.path.getsize(path), deduplicated=True)
+
+    async def _download(self, media_id: str, sha256: Optional[str], mime_type: Optional[str]) -> StoredMedia:
+        async with self._semaphore:
+            try:
+                return await self._stream_to_storage(media_id, sha256, mime_type)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Erro ao baixar a mídia {media_id}: {e}")
+                raise
+
+    async def _stream_to_storage(self, media_id: str, sha256: Optional[str], mime_type: Optional[str]) -> StoredMedia:
+        info = await self.whatsapp_service.get_media_info(media_id)
+        expected = normalize_sha256(info.get("sha256")) or normalize_sha256(sha256)
+        mime_type = info.get("mime_type") or mime_type
+        if int(info.get("file_size") or 0) > self.max_bytes:
+            raise MediaTooLargeError(f"Mídia {media_id} tem {info['file_size']} bytes (máximo {self.max_bytes})")
+
+        stored = self._existing(expected, mime_type)
+        if stored is not None:
+            return stored
+
+        os.makedirs(self.storage_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.storage_dir, suffix=".part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as file:
+                async with self.whatsapp_service.stream_media(info["url"]) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes(self.chunk_size):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise MediaTooLargeError(f"Mídia {media_id} passou de {self.max_bytes} bytes")
+                        digest.update(chunk)
+                        file.write(chunk)
+
+            actual = digest.hexdigest()
+            if expected and actual != expected:
+                raise MediaIntegrityError(f"Hash da mídia {media_id} não confere")
+
+            path = self.path_for(actual, mime_type)
+            deduplicated = os.path.exists(path)
+            if deduplicated:
+                os.remove(temp_path)
+                self.deduplicated += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self.downloads += 1
+        self.bytes_downloaded += size
+        return StoredMedia(actual, path, mime_type, size, deduplicated=deduplicated)
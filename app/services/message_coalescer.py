@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+Dispatch = Callable[[str], asyncio.Future]
+
+
+class _Burst:
+    """Mensagens de um paciente aguardando o fim da janela de debounce."""
+
+    __slots__ = ("texts", "future", "dispatch", "first_at", "timer")
+
+    def __init__(self, future: asyncio.Future, dispatch: Dispatch):
+        self.texts: List[str] = []
+        self.future = future
+        self.dispatch = dispatch
+        self.first_at = time.monotonic()
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class MessageCoalescer:
+    """
+    Agrupa rajadas de mensagens curtas de um mesmo paciente em um único turno.
+
+    Pacientes costumam mandar várias mensagens seguidas ("oi", "queria marcar",
+    "amanhã de manhã"). Cada nova mensagem reinicia a janela de debounce; quando
+    ela expira, as mensagens são unidas e despachadas de uma vez, gerando uma
+    única chamada ao LLM e uma única resposta. A rajada é liberada antes se a
+    mensagem terminar com pontuação final ou se o tempo máximo de espera passar.
+    """
+
+    def __init__(self,
+                 window: float = 1.5,
+                 max_wait: float = 4.0,
+                 flush_chars: str = ".?!"):
+        """
+        Args:
+            window: Janela de debounce em segundos (0 desativa o agrupamento)
+            max_wait: Tempo máximo (em segundos) que a primeira mensagem da rajada pode esperar
+            flush_chars: Caracteres finais que liberam a rajada imediatamente
+        """
+        self.window = window
+        self.max_wait = max_wait
+        self.flush_chars = flush_chars
+
+        self._bursts: Dict[str, _Burst] = {}
+
+        self.messages = 0
+        self.batches = 0
+        self.flush_reasons: Counter = Counter()
+
+    def submit(self, key: str, text: str, dispatch: Dispatch) -> asyncio.Future:
+        """
+        Adiciona uma mensagem à rajada do paciente.
+
+        Args:
+            key: Identificador da conversa (telefone do paciente)
+            text: Texto da mensagem
+            dispatch: Função que recebe o texto agrupado e agenda o seu processamento,
+                retornando um future. Usada a da primeira mensagem da rajada.
+
+        Returns:
+            asyncio.Future: Resolvida com o resultado do processamento da rajada inteira
+        """
+        self.messages += 1
+
+        if self.window <= 0:
+            self.batches += 1
+            self.flush_reasons["disabled"] += 1
+            return dispatch(text)
+
+        burst = self._bursts.get(key)
+        if burst is None:
+            burst = self._bursts[key] = _Burst(asyncio.get_running_loop().create_future(), dispatch)
+        burst.texts.append(text)
+
+        if burst.timer is not None:
+            burst.timer.cancel()
+            burst.timer = None
+
+        remaining = burst.first_at + self.max_wait - time.monotonic()
+        if text.rstrip().endswith(tuple(self.flush_chars)):
+            self._flush(key, "punctuation")
+        elif remaining <= 0:
+            self._flush(key, "max_wait")
+        elif remaining < self.window:
+            burst.timer = asyncio.get_running_loop().call_later(remaining, self._flush, key, "max_wait")
+        else:
+            burst.timer = asyncio.get_running_loop().call_later(self.window, self._flush, key, "window")
+
+        return burst.future
+
+    def close(self) -> None:
+        """
+        Descarta as rajadas pendentes, cancelando os seus futures. As mensagens
+        continuam no spool da fila de ingestão e são reprocessadas no próximo start.
+        """
+        for burst in self._bursts.values():
+            if burst.timer is not None:
+                burst.timer.cancel()
+            burst.future.cancel()
+        self._bursts.clear()
+
+    def stats(self) -> Dict:
+        """Retorna as métricas de agrupamento."""
+        return {
+            "window_seconds": self.window,
+            "max_wait_seconds": self.max_wait,
+            "pending_bursts": len(self._bursts),
+            "messages": self.messages,
+            "batches": self.batches,
+            "turns_saved": self.messages - self.batches - sum(len(b.texts) for b in self._bursts.values()),
+            "flush_reasons": dict(self.flush_reasons),
+        }
+
+    def _flush(self, key: str, reason: str) -> None:
+        burst = self._bursts.pop(key, None)
+        if burst is None:
+            return
+        if burst.timer is not None:
+            burst.timer.cancel()
+
+        self.batches += 1
+        self.flush_reasons[reason] += 1
+        merged_text = "\n".join(burst.texts)
+        if len(burst.texts) > 1:
+            logger.info(f"{len(burst.texts)} mensagens agrupadas em um único turno ({reason})")
+
+        try:
+            dispatched = burst.dispatch(merged_text)
+        except Exception as e:
+            burst.future.set_exception(e)
+            return
+
+        dispatched.add_done_callback(lambda done: self._resolve(burst.future, done))
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, done: asyncio.Future) -> None:
+        if future.done():
+            return
+        if done.cancelled():
+            future.cancel()
+        elif done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
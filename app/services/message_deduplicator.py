@@ -0,0 +1,142 @@
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MessageDeduplicator:
+    """
+    Deduplicação de mensagens do webhook pelo id da mensagem do WhatsApp.
+
+    A Meta reenvia webhooks quando demoramos a responder. Os ids já vistos ficam
+    em um cache LRU limitado com TTL e, opcionalmente, em um arquivo SQLite para
+    sobreviver a restarts. Reentregas são descartadas antes de qualquer chamada à
+    OpenAI ou ao Google Calendar.
+
+    `claim` marca o id apenas em memória, o que basta para barrar reentregas
+    concorrentes; o id só vai para o SQLite em `confirm`, depois que a mensagem
+    foi tratada. Assim, uma mensagem interrompida por um crash volta a ser
+    aceita quando a fila de ingestão a reprocessa.
+    """
+
+    # Intervalo (em inserções) entre limpezas dos ids expirados no SQLite
+    PURGE_EVERY = 1000
+
+    def __init__(self,
+                 ttl: float = 86400.0,
+                 max_entries: int = 100000,
+                 persist_path: Optional[str] = None):
+        """
+        Args:
+            ttl: Tempo (em segundos) durante o qual um id é considerado duplicado
+            max_entries: Número máximo de ids mantidos em memória
+            persist_path: Caminho do arquivo SQLite de persistência (opcional)
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._inserts = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        if persist_path:
+            self._open_store()
+
+    def claim(self, message_id: Optional[str]) -> bool:
+        """
+        Registra o id da mensagem.
+
+        Args:
+            message_id: Id da mensagem (messages[].id)
+
+        Returns:
+            bool: True se é a primeira vez que o id é visto e a mensagem deve
+                  ser processada, False se é uma reentrega
+        """
+        if not message_id:
+            return True
+
+        now = time.time()
+        seen_at = self._seen.get(message_id)
+        if seen_at is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT seen_at FROM seen_messages WHERE message_id = ?", (message_id,)
+            ).fetchone()
+            seen_at = row[0] if row else None
+
+        if seen_at is not None and now - seen_at < self.ttl:
+            self.hits += 1
+            self._remember(message_id, seen_at)
+            return False
+
+        self.misses += 1
+        self._remember(message_id, now)
+        return True
+
+    def confirm(self, message_id: Optional[str]) -> None:
+        """
+        Grava o id no arquivo de persistência depois que a mensagem foi tratada.
+        Sem persistência habilitada, não faz nada além do `claim`.
+        """
+        if not message_id or self._db is None:
+            return
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO seen_messages (message_id, seen_at) VALUES (?, ?)",
+            (message_id, self._seen.get(message_id, now))
+        )
+        self._inserts += 1
+        if self._inserts % self.PURGE_EVERY == 0:
+            self._db.execute("DELETE FROM seen_messages WHERE seen_at < ?", (now - self.ttl,))
+
+    def release(self, message_id: Optional[str]) -> None:
+        """
+        Esquece o id da mensagem para que uma reentrega volte a ser processada.
+        Usado quando o processamento falha.
+        """
+        if not message_id:
+            return
+        self._seen.pop(message_id, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM seen_messages WHERE message_id = ?", (message_id,))
+
+    def close(self) -> None:
+        """Fecha o arquivo de persistência."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict:
+        """Retorna as métricas de deduplicação."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._seen),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "persistent": self._db is not None,
+        }
+
+    def _remember(self, message_id: str, seen_at: float) -> None:
+        self._seen[message_id] = seen_at
+        self._seen.move_to_end(message_id)
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+    def _open_store(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.persist_path)), exist_ok=True)
+        self._db = sqlite3.connect(self.persist_path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen_messages (message_id TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+        )
@@ -0,0 +1,121 @@
+import json
+from dataclasses import dataclass, replace
+from typing import Dict, Optional
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """Modelo e parâmetros de geração usados em um tipo de tarefa"""
+    model: str
+    max_tokens: int
+    temperature: float
+
+
+class ModelRouter:
+    """
+    Roteamento das chamadas à OpenAI por tipo de tarefa.
+
+    Tarefas estreitas e estruturadas (extração de intenção, classificação,
+    filtro de horários) vão para o modelo mais barato e rápido; só a conversa
+    livre usa o modelo maior. Para cada rota, acumula latência e tokens
+    consumidos, para mostrar se o roteamento compensa.
+    """
+
+    def __init__(self, routes: Dict[str, ModelRoute], default: ModelRoute):
+        """
+        Args:
+            routes: Rota de cada tarefa ("conversation", "extract_intent"...)
+            default: Rota das tarefas sem configuração própria
+        """
+        self.routes = dict(routes)
+        self.default = default
+        self._metrics: Dict[str, Dict] = {}
+
+    @classmethod
+    def from_config(cls,
+                    large_model: str,
+                    small_model: str,
+                    extraction_max_tokens: int = 120,
+                    overrides: Optional[str] = None) -> "ModelRouter":
+        """
+        Monta as rotas padrão da aplicação.
+
+        Args:
+            large_model: Modelo da conversa livre
+            small_model: Modelo das tarefas estruturadas
+            extraction_max_tokens: Limite de tokens da extração de intenção
+            overrides: JSON opcional com ajustes por tarefa, ex.:
+                       '{"filter_slots": {"model": "gpt-4o", "max_tokens": 300}}'
+
+        Raises:
+            ValueError: Se `overrides` não for um JSON válido de rotas
+        """
+        conversation = ModelRoute(large_model, max_tokens=150, temperature=0.7)
+        routes = {
+            "conversation": conversation,
+            "extract_intent": ModelRoute(small_model, max_tokens=extraction_max_tokens, temperature=0.0),
+            "analyze_patient_type": ModelRoute(small_model, max_tokens=60, temperature=0.0),
+            "filter_slots": ModelRoute(small_model, max_tokens=500, temperature=0.2),
+        }
+        if overrides:
+            try:
+                for task, fields in json.loads(overrides).items():
+                    routes[task] = replace(routes.get(task, conversation), **fields)
+            except (AttributeError, TypeError, json.JSONDecodeError) as e:
+                raise ValueError(f"Invalid OpenAI route overrides: {e}")
+        return cls(routes, default=conversation)
+
+    def route(self, task: str) -> ModelRoute:
+        """Retorna a rota de uma tarefa (a rota padrão se ela não tiver uma própria)."""
+        return self.routes.get(task, self.default)
+
+    def record(self, task: str, model: str, latency: float, response=None) -> None:
+        """
+        Registra uma chamada concluída.
+
+        Args:
+            task: Tarefa da chamada
+            model: Modelo que respondeu (pode diferir da rota em chamadas de hedge)
+            latency: Duração da chamada em segundos
+            response: Resposta da OpenAI, de onde vem o uso de tokens (`usage`)
+        """
+        metrics = self._metrics.setdefault(task, {
+            "calls": 0, "latency_seconds": 0.0, "models": {},
+            "prompt_tokens": 0, "cached_prompt_tokens": 0, "completion_tokens": 0,
+        })
+        metrics["calls"] += 1
+        metrics["latency_seconds"] += latency
+        metrics["models"][model] = metrics["models"].get(model, 0) + 1
+
+        # Tokens servidos pelo cache de prompt da OpenAI versus processados do zero
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        if not isinstance(prompt_tokens, int):
+            return
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        metrics["prompt_tokens"] += prompt_tokens
+        metrics["cached_prompt_tokens"] += cached_tokens if isinstance(cached_tokens, int) else 0
+        metrics["completion_tokens"] += completion_tokens if isinstance(completion_tokens, int) else 0
+
+    def stats(self) -> Dict:
+        """Retorna a configuração e as métricas de cada rota."""
+        stats = {}
+        for task in {**self.routes, **self._metrics}:
+            route = self.route(task)
+            metrics = self._metrics.get(task)
+            entry = {"model": route.model, "max_tokens": route.max_tokens, "temperature": route.temperature}
+            if metrics:
+                entry.update({
+                    "calls": metrics["calls"],
+                    "avg_latency_ms": round(metrics["latency_seconds"] / metrics["calls"] * 1000, 1),
+                    "models": dict(metrics["models"]),
+                    "prompt_tokens": metrics["prompt_tokens"],
+                    "cached_prompt_tokens": metrics["cached_prompt_tokens"],
+                    "uncached_prompt_tokens": metrics["prompt_tokens"] - metrics["cached_prompt_tokens"],
+                    "cached_rate": round(metrics["cached_prompt_tokens"] / metrics["prompt_tokens"], 4)
+                    if metrics["prompt_tokens"] else 0.0,
+                    "completion_tokens": metrics["completion_tokens"],
+                })
+            stats[task] = entry
+        return stats
@@ -0,0 +1,176 @@
+import asyncio
+import heapq
+import itertools
+import json
+import time
+from collections import Counter
+from enum import IntEnum
+from typing import Dict, List, Optional
+
+from app.services.rate_limiter import TokenBucket
+
+# Caracteres por token numa estimativa conservadora para texto em português
+CHARS_PER_TOKEN = 4
+# Tokens que a API acrescenta a cada mensagem (papel e delimitadores)
+TOKENS_PER_MESSAGE = 4
+
+
+class LLMPriority(IntEnum):
+    """Prioridade das chamadas à OpenAI (menor valor sai primeiro)."""
+    CONFIRMATION = 0  # Confirmações e agendamentos em andamento
+    SLOT_FILTER = 1   # Filtro de horários por preferência
+    NORMAL = 2        # Demais mensagens de pacientes
+    SMALL_TALK = 3    # Conversa casual e respostas livres
+
+
+def estimate_tokens(messages: List[Dict], max_tokens: int = 0, tools: Optional[List[Dict]] = None) -> int:
+    """
+    Estima os tokens que uma chamada consome do limite por minuto (TPM).
+
+    A OpenAI desconta do limite o prompt mais o `max_tokens` pedido, antes de
+    saber quantos tokens a resposta terá de fato; a estimativa segue a mesma conta.
+
+    Args:
+        messages: Mensagens no formato da API de chat
+        max_tokens: Limite de tokens da resposta
+        tools: Definições de funções enviadas junto com o prompt
+
+    Returns:
+        int: Tokens estimados do prompt e da resposta
+    """
+    chars = sum(len(message.get("content") or "") for message in messages)
+    if tools:
+        chars += len(json.dumps(tools))
+    return chars // CHARS_PER_TOKEN + TOKENS_PER_MESSAGE * len(messages) + max_tokens
+
+
+class OpenAIRateScheduler:
+    """
+    Fila das chamadas à OpenAI dentro dos limites da conta.
+
+    Um balde de tokens controla as requisições por minuto (RPM) e outro os
+    tokens por minuto (TPM). Cada chamada informa os tokens estimados e espera
+    a sua vez: a de maior prioridade é sempre a próxima a sair e, dentro da
+    mesma prioridade, vale a ordem de chegada. Uma rajada fica na fila e é
+    liberada no ritmo dos limites, em vez de voltar como erro 429.
+
+    Se a API ainda assim responder 429, `pause` esvazia os baldes pelo tempo
+    pedido no Retry-After e a fila inteira espera junto.
+    """
+
+    def __init__(self,
+                 requests_per_minute: float,
+                 tokens_per_minute: float,
+                 burst_seconds: float = 10.0):
+        """
+        Args:
+            requests_per_minute: Limite de requisições por minuto da conta
+            tokens_per_minute: Limite de tokens por minuto da conta
+            burst_seconds: Segundos de limite que podem sair de uma vez numa rajada
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = TokenBucket(requests_per_minute / 60, max(requests_per_minute / 60 * burst_seconds, 1.0))
+        self._tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute / 60 * burst_seconds)
+        self._queue: List[list] = []
+        self._sequence = itertools.count()
+        self._condition: Optional[asyncio.Condition] = None
+
+        self.granted: Counter = Counter()
+        self.total_wait: Counter = Counter()
+        self.max_wait = 0.0
+        self.estimated_tokens = 0
+        self.pauses = 0
+
+    @property
+    def pending(self) -> int:
+        """Número de chamadas aguardando na fila."""
+        return len(self._queue)
+
+    def _wait_time(self, tokens: float) -> float:
+        return max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+
+    async def acquire(self, tokens: int, priority: LLMPriority = LLMPriority.NORMAL) -> float:
+        """
+        Aguarda a vez de uma chamada e consome a sua parte dos limites.
+
+        Se a chamada for cancelada na fila (ex.: prazo da resposta esgotado), ela
+        sai da fila sem consumir nada.
+
+        Args:
+            tokens: Tokens estimados da chamada (ver `estimate_tokens`)
+            priority: Prioridade da chamada
+
+        Returns:
+            float: Tempo de espera na fila, em segundos
+        """
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        # Uma chamada maior que a rajada inteira nunca caberia no balde
+        tokens = min(tokens, self._tokens.capacity)
+        started = time.monotonic()
+        entry = [priority, next(self._sequence), tokens]
+
+        async with self._condition:
+            heapq.heappush(self._queue, entry)
+            # Uma chegada mais prioritária passa à frente de quem estava esperando
+            self._condition.notify_all()
+            try:
+                while True:
+                    if self._queue[0] is entry:
+                        wait = self._wait_time(tokens)
+                        if wait == 0:
+                            break
+                        try:
+                            await asyncio.wait_for(self._condition.wait(), wait)
+                        except asyncio.TimeoutError:
+                            pass
+                    else:
+                        await self._condition.wait()
+                heapq.heappop(self._queue)
+                self._requests.try_acquire(1)
+                self._tokens.try_acquire(tokens)
+            except BaseException:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                raise
+            finally:
+                self._condition.notify_all()
+
+        waited = time.monotonic() - started
+        self.granted[priority.name] += 1
+        self.total_wait[priority.name] += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.estimated_tokens += tokens
+        return waited
+
+    def pause(self, seconds: float) -> None:
+        """
+        Segura a fila por `seconds` segundos depois de um 429 da API.
+
+        Args:
+            seconds: Espera pedida pela API (Retry-After)
+        """
+        self.pauses += 1
+        self._requests.drain(seconds)
+        self._tokens.drain(seconds)
+
+    def stats(self) -> Dict:
+        """Retorna as métricas da fila e dos limites."""
+        queued = Counter(entry[0].name for entry in self._queue)
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "pending": self.pending,
+            "queued": {priority.name: queued[priority.name] for priority in LLMPriority},
+            "granted": {priority.name: self.granted[priority.name] for priority in LLMPriority},
+            "avg_wait_ms": {
+                priority.name: round(self.total_wait[priority.name] / self.granted[priority.name] * 1000, 1)
+                if self.granted[priority.name] else 0.0
+                for priority in LLMPriority
+            },
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "estimated_tokens": self.estimated_tokens,
+            "pauses": self.pauses,
+        }
@@ -0,0 +1,375 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import Counter
+from enum import IntEnum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.services.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[], Awaitable[bool]]
+DeadLetterHandler = Callable[[str, int, Any, str, int], Any]
+
+
+class MessagePriority(IntEnum):
+    """Classe de prioridade dos envios (menor valor sai primeiro)."""
+    CONFIRMATION = 0  # Confirmações de agendamento
+    REPLY = 1         # Respostas às mensagens dos pacientes
+    REMINDER = 2      # Lembretes de consulta
+    MARKETING = 3     # Avisos e campanhas
+
+
+class OutboundQueueFullError(RuntimeError):
+    """Levantada quando a fila de envios atingiu o limite."""
+
+
+class SendError(Exception):
+    """
+    Falha de um envio, levantada pela função de envio.
+
+    Args:
+        message: Descrição do erro
+        retryable: Se o envio pode dar certo em uma nova tentativa (rede, 429, 5xx)
+        retry_after: Espera (em segundos) pedida pela API antes da nova tentativa
+    """
+
+    def __init__(self, message: str, retryable: bool = False, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class _Outbound:
+    """Envio aguardando a sua vez na fila."""
+
+    __slots__ = ("recipient", "priority", "deliver", "payload", "future", "enqueued_at", "attempts")
+
+    def __init__(self, recipient: str, priority: MessagePriority, deliver: Deliver, payload: Any, future: asyncio.Future):
+        self.recipient = recipient
+        self.priority = priority
+        self.deliver = deliver
+        self.payload = payload
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+
+class OutboundScheduler:
+    """
+    Agendador de envios para a WhatsApp Cloud API.
+
+    Um balde de tokens global mantém o throughput dentro do limite do número
+    (tier) na Meta, e um balde por destinatário respeita o limite de mensagens
+    para um mesmo usuário. Envios prontos saem por ordem de prioridade e, dentro
+    da mesma prioridade, por ordem de chegada; envios de um destinatário que
+    ainda precisa esperar ficam estacionados sem bloquear os demais.
+
+    Falhas transitórias voltam para a fila com backoff exponencial e jitter (ou
+    o Retry-After da API), sem ocupar nenhum worker durante a espera. Enquanto
+    isso, os envios seguintes ao mesmo destinatário ficam retidos, para que o
+    paciente não receba as respostas fora de ordem. Envios que esgotam as
+    tentativas ou falham de forma definitiva vão para o `dead_letter`.
+    """
+
+    def __init__(self,
+                 rate: float = 80.0,
+                 burst: Optional[float] = None,
+                 recipient_rate: float = 1 / 6,
+                 recipient_burst: float = 10,
+                 max_in_flight: int = 100,
+                 max_queue: int = 10000,
+                 max_attempts: int = 5,
+                 retry_base: float = 1.0,
+                 retry_max: float = 60.0,
+                 dead_letter: Optional[DeadLetterHandler] = None):
+        """
+        Args:
+            rate: Envios por segundo permitidos para o número (tier da Meta)
+            burst: Rajada máxima de envios globais (padrão: `rate`)
+            recipient_rate: Envios por segundo permitidos para um mesmo destinatário
+            recipient_burst: Rajada máxima de envios para um mesmo destinatário
+            max_in_flight: Número máximo de requisições simultâneas à API
+            max_queue: Número máximo de envios aguardando na fila
+            max_attempts: Número máximo de tentativas de um envio com falha transitória
+            retry_base: Base (em segundos) do backoff exponencial entre tentativas
+            retry_max: Espera máxima (em segundos) entre tentativas
+            dead_letter: Função chamada com (destinatário, prioridade, payload, erro,
+                tentativas) quando um envio falha de vez
+        """
+        self.rate = rate
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.dead_letter = dead_letter
+
+        self._bucket = TokenBucket(rate, burst)
+        self._recipients: Dict[str, TokenBucket] = {}
+        self._ready: List[Tuple[int, int, _Outbound]] = []
+        self._parked: List[Tuple[float, int, _Outbound]] = []
+        # Destinatário -> envio aguardando nova tentativa, e os envios retidos atrás dele
+        self._blocked: Dict[str, _Outbound] = {}
+        self._held: Dict[str, List[Tuple[int, int, _Outbound]]] = {}
+        self._sequence = itertools.count()
+        self._in_flight: Set[asyncio.Task] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.sent: Counter = Counter()
+        self.failed: Counter = Counter()
+        self.total_wait: Counter = Counter()
+        self.paced = 0
+        self.rejected = 0
+        self.backoffs = 0
+        self.retried = 0
+        self.dead_lettered = 0
+
+    async def start(self) -> None:
+        """Inicia a rotina de despacho."""
+        if self._dispatcher is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch(), name="outbound-dispatcher")
+
+    async def stop(self) -> None:
+        """Interrompe o despacho, aguarda os envios em andamento e descarta os pendentes."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+        # Envios ainda na fila não se perdem: vão para o dead letter, de onde podem ser reenviados
+        for *_, item in self._ready + self._parked + self._held_entries():
+            if self.dead_letter is not None and not item.future.done():
+                self._give_up(item, "Envio pendente no encerramento do serviço")
+            else:
+                item.future.cancel()
+        self._ready.clear()
+        self._parked.clear()
+        self._blocked.clear()
+        self._held.clear()
+        self._loop = None
+
+    @property
+    def running(self) -> bool:
+        """Indica se o agendador está ativo no event loop atual."""
+        try:
+            return self._dispatcher is not None and self._loop is asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+
+    @property
+    def pending(self) -> int:
+        """Número de envios aguardando na fila."""
+        return len(self._ready) + len(self._parked) + sum(len(held) for held in self._held.values())
+
+    @property
+    def has_capacity(self) -> bool:
+        """Indica se a fila ainda aceita novos envios."""
+        return self.pending < self.max_queue
+
+    def submit(self,
+               recipient: str,
+               deliver: Deliver,
+               priority: MessagePriority = MessagePriority.REPLY,
+               payload: Any = None) -> asyncio.Future:
+        """
+        Coloca um envio na fila.
+
+        Args:
+            recipient: Telefone do destinatário
+            deliver: Função sem argumentos que faz a requisição e retorna o sucesso do
+                envio, ou levanta SendError
+            priority: Classe de prioridade do envio
+            payload: Conteúdo do envio, repassado ao `dead_letter` em caso de falha
+
+        Returns:
+            asyncio.Future: Resolvida com o retorno de `deliver` quando o envio terminar
+                (False se o envio falhou de vez)
+
+        Raises:
+            OutboundQueueFullError: Se a fila atingiu `max_queue`
+        """
+        if self._dispatcher is None:
+            raise RuntimeError("OutboundScheduler não foi iniciado")
+        if not self.has_capacity:
+            self.rejected += 1
+            raise OutboundQueueFullError(f"Limite de {self.max_queue} envios na fila atingido")
+
+        item = _Outbound(recipient, priority, deliver, payload, self._loop.create_future())
+        heapq.heappush(self._ready, (priority, next(self._sequence), item))
+        self._wakeup.set()
+        return item.future
+
+    def backoff(self, seconds: float) -> None:
+        """
+        Suspende todos os envios por `seconds` segundos, por exemplo após a
+        Meta responder 429 (limite de taxa excedido).
+        """
+        self.backoffs += 1
+        self._bucket.drain(seconds)
+        logger.warning(f"Envios suspensos por {seconds:.1f}s após limite de taxa da API")
+
+    def stats(self) -> Dict:
+        """Retorna as métricas de envio por prioridade."""
+        queued = Counter(item.priority.name.lower() for *_, item in self._ready + self._parked + self._held_entries())
+        priorities = {}
+        for priority in MessagePriority:
+            name = priority.name.lower()
+            done = self.sent[name] + self.failed[name]
+            priorities[name] = {
+                "queued": queued[name],
+                "sent": self.sent[name],
+                "failed": self.failed[name],
+                "avg_wait_ms": round(self.total_wait[name] / done * 1000, 3) if done else 0.0,
+            }
+        return {
+            "rate_per_second": self.rate,
+            "recipient_rate_per_second": round(self.recipient_rate, 3),
+            "pending": self.pending,
+            "in_flight": len(self._in_flight),
+            "recipients_tracked": len(self._recipients),
+            "recipients_blocked": len(self._blocked),
+            "paced": self.paced,
+            "rejected": self.rejected,
+            "backoffs": self.backoffs,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "priorities": priorities,
+        }
+
+    async def _dispatch(self) -> None:
+        while True:
+            await self._slots.acquire()
+            item = await self._next_ready()
+            task = asyncio.create_task(self._deliver(item))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _next_ready(self) -> _Outbound:
+        """Aguarda o próximo envio liberado pelos limites global e do destinatário."""
+        while True:
+            now = time.monotonic()
+            while self._parked and self._parked[0][0] <= now:
+                _, sequence, item = heapq.heappop(self._parked)
+                heapq.heappush(self._ready, (item.priority, sequence, item))
+
+            timeout = self._parked[0][0] - now if self._parked else None
+            if self._ready:
+                global_wait = self._bucket.wait_time()
+                if global_wait > 0:
+                    await self._sleep(global_wait)
+                    continue
+
+                entry = heapq.heappop(self._ready)
+                _, sequence, item = entry
+                if item.future.cancelled():
+                    self._unblock(item)
+                    continue
+
+                head = self._blocked.get(item.recipient)
+                if head is not None and head is not item:
+                    # Um envio anterior ao mesmo destinatário aguarda nova tentativa
+                    self._held.setdefault(item.recipient, []).append(entry)
+                    continue
+
+                recipient_wait = self._recipient_bucket(item.recipient).try_acquire()
+                if recipient_wait > 0:
+                    self.paced += 1
+                    heapq.heappush(self._parked, (now + recipient_wait, sequence, item))
+                    continue
+
+                self._bucket.try_acquire()
+                return item
+
+            await self._sleep(timeout)
+
+    async def _sleep(self, timeout: Optional[float]) -> None:
+        """Dorme até `timeout` segundos ou até chegar um novo envio."""
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _recipient_bucket(self, recipient: str) -> TokenBucket:
+        bucket = self._recipients.get(recipient)
+        if bucket is None:
+            if len(self._recipients) >= self.max_queue:
+                # Destinatários sem envios recentes têm o balde cheio e podem ser esquecidos
+                for key in [key for key, value in self._recipients.items() if value.is_full()]:
+                    del self._recipients[key]
+            bucket = self._recipients[recipient] = TokenBucket(self.recipient_rate, self.recipient_burst)
+        return bucket
+
+    def _retry_delay(self, attempts: int, retry_after: Optional[float]) -> float:
+        """Backoff exponencial com jitter completo, ou o Retry-After pedido pela API."""
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.retry_max, self.retry_base * 2 ** (attempts - 1)))
+
+    async def _deliver(self, item: _Outbound) -> None:
+        name = item.priority.name.lower()
+        self.total_wait[name] += time.monotonic() - item.enqueued_at
+        item.attempts += 1
+        try:
+            result = await item.deliver()
+            (self.sent if result else self.failed)[name] += 1
+            if not item.future.done():
+                item.future.set_result(result)
+        except SendError as e:
+            if e.retryable and item.attempts < self.max_attempts and self._dispatcher is not None:
+                # Volta para a fila estacionado até a próxima tentativa; nenhum worker fica esperando
+                self.retried += 1
+                self._blocked.setdefault(item.recipient, item)
+                item.enqueued_at = time.monotonic()
+                ready_at = item.enqueued_at + self._retry_delay(item.attempts, e.retry_after)
+                heapq.heappush(self._parked, (ready_at, next(self._sequence), item))
+                self._wakeup.set()
+                return
+            self.failed[name] += 1
+            self._give_up(item, str(e))
+        except Exception as e:
+            self.failed[name] += 1
+            logger.error(f"Erro ao enviar mensagem: {e}")
+            if not item.future.done():
+                item.future.set_exception(e)
+        finally:
+            if item.future.done():
+                self._unblock(item)
+            self._slots.release()
+
+    def _unblock(self, item: _Outbound) -> None:
+        """Devolve à fila os envios retidos atrás de `item`, depois que ele terminou."""
+        if self._blocked.get(item.recipient) is not item:
+            return
+        del self._blocked[item.recipient]
+        for entry in self._held.pop(item.recipient, []):
+            heapq.heappush(self._ready, entry)
+        self._wakeup.set()
+
+    def _held_entries(self) -> List[Tuple[int, int, _Outbound]]:
+        return [entry for held in self._held.values() for entry in held]
+
+    def _give_up(self, item: _Outbound, error: str) -> None:
+        if self.dead_letter is not None:
+            self.dead_lettered += 1
+            try:
+                self.dead_letter(item.recipient, item.priority, item.payload, error, item.attempts)
+            except Exception as e:
+                logger.error(f"Erro ao registrar envio na fila de mensagens mortas: {e}")
+        if not item.future.done():
+            item.future.set_result(False)
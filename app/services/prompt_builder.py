@@ -0,0 +1,44 @@
+import textwrap
+from typing import Dict, List, Optional
+
+
+class PromptBuilder:
+    """
+    Monta as mensagens enviadas ao ChatGPT com um prefixo estático.
+
+    A OpenAI reaproveita o processamento de prompts cujo início é idêntico ao de
+    chamadas recentes (a partir de 1024 tokens). Por isso, as instruções, regras e
+    informações da clínica ficam em um prefixo montado uma única vez, byte a byte
+    igual em todas as chamadas. O contexto que muda a cada chamada (data atual,
+    horários, estado da conversa) e o texto do paciente vêm sempre depois dele.
+    """
+
+    def __init__(self, *sections: str):
+        """
+        Args:
+            sections: Blocos estáticos do prompt (instruções, regras, dados da clínica),
+                      unidos na ordem em que são passados
+        """
+        self.prefix = "\n\n".join(textwrap.dedent(section).strip() for section in sections if section)
+
+    def build(self, user_text: str, context: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """
+        Monta as mensagens: prefixo estático, contexto variável e texto do usuário.
+
+        Args:
+            user_text: Texto do usuário, sempre a última mensagem
+            context: Informações que mudam a cada chamada, como "rótulo: valor"
+
+        Returns:
+            List[Dict]: Mensagens no formato da API de chat
+        """
+        messages = []
+        if self.prefix:
+            messages.append({"role": "system", "content": self.prefix})
+        if context:
+            messages.append({
+                "role": "system",
+                "content": "\n".join(f"{label}: {value}" for label, value in context.items()),
+            })
+        messages.append({"role": "user", "content": user_text})
+        return messages
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Balde de tokens para limitar a taxa de operações.
+
+    Os tokens são repostos continuamente à taxa `rate` por segundo, até o
+    limite `capacity`, que define o tamanho máximo de uma rajada.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: Tokens repostos por segundo
+            capacity: Número máximo de tokens acumulados (padrão: `rate`, no mínimo 1)
+        """
+        if rate <= 0:
+            raise ValueError("A taxa do TokenBucket deve ser positiva")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """Retorna quantos segundos faltam para haver `tokens` disponíveis (0 se já há)."""
+        self._refill(time.monotonic())
+        missing = tokens - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Consome `tokens` se estiverem disponíveis.
+
+        Returns:
+            float: 0 se os tokens foram consumidos; caso contrário, os segundos até haver saldo
+        """
+        wait = self.wait_time(tokens)
+        if wait == 0:
+            self.tokens -= tokens
+        return wait
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Aguarda até haver `tokens` disponíveis e os consome.
+
+        Returns:
+            float: Tempo total de espera em segundos
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def drain(self, seconds: float) -> None:
+        """Esvazia o balde para que nenhum token fique disponível pelos próximos `seconds` segundos."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+    def is_full(self) -> bool:
+        """Indica se o balde está cheio, ou seja, sem uso recente."""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from app.services.outbound_scheduler import MessagePriority
+
+logger = logging.getLogger(__name__)
+
+
+class ReminderEngine:
+    """
+    Envia lembretes de consulta nos intervalos configurados antes de cada horário.
+
+    Os lembretes ficam em um heap ordenado pelo instante em que vencem, então
+    cada ciclo só toca nos lembretes vencidos. Os agendamentos são relidos
+    apenas quando o arquivo do SimplifiedSlotService muda; cancelamentos são
+    descobertos na hora do envio (o lembrete é descartado se o agendamento não
+    existe mais). Os lembretes enviados ficam registrados em SQLite para não
+    serem repetidos após um restart.
+    """
+
+    def __init__(self,
+                 whatsapp_service,
+                 slot_service,
+                 offsets: Sequence[timedelta] = (timedelta(hours=24), timedelta(hours=2)),
+                 interval: float = 3600.0,
+                 template_name: str = "appointment_reminder",
+                 language_code: str = "pt_BR",
+                 state_path: Optional[str] = "data/reminders.db"):
+        """
+        Args:
+            whatsapp_service: Instância do WhatsAppService usada para os envios
+            slot_service: SimplifiedSlotService com os agendamentos
+            offsets: Antecedências em que os lembretes são enviados
+            interval: Tempo máximo (em segundos) entre ciclos (NOTIFICATION_INTERVAL)
+            template_name: Template aprovado usado nos lembretes
+            language_code: Código de idioma do template
+            state_path: Caminho do SQLite com os lembretes já enviados (None mantém em memória)
+        """
+        self.whatsapp_service = whatsapp_service
+        self.slot_service = slot_service
+        self.offsets = sorted(offsets, reverse=True)
+        self.interval = interval
+        self.template_name = template_name
+        self.language_code = language_code
+
+        self._heap: List[Tuple[datetime, str, int]] = []
+        self._indexed: Set[Tuple[str, int]] = set()
+        self._mtime: Optional[float] = None
+        self._observed = False
+        self._task: Optional[asyncio.Task] = None
+
+        self.sent = 0
+        self.skipped = 0
+        self.reloads = 0
+
+        if state_path:
+            os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+        self._db = sqlite3.connect(state_path or ":memory:", isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sent_reminders ("
+            "appointment TEXT NOT NULL, phone TEXT NOT NULL, offset_minutes INTEGER NOT NULL, sent_at REAL NOT NULL, "
+            "PRIMARY KEY (appointment, phone, offset_minutes))"
+        )
+
+    async def start(self) -> None:
+        """Indexa os agendamentos e inicia o ciclo de envio."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="reminder-engine")
+
+    async def stop(self) -> None:
+        """Interrompe o ciclo de envio e fecha o registro de lembretes."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._db.close()
+
+    async def tick(self, now: Optional[datetime] = None) -> int:
+        """
+        Envia os lembretes vencidos.
+
+        Args:
+            now: Instante de referência (padrão: agora)
+
+        Returns:
+            int: Número de lembretes enviados
+        """
+        now = now or datetime.now()
+        self._refresh(now)
+
+        sent = 0
+        while self._heap and self._heap[0][0] <= now:
+            _, start_iso, offset_minutes = heapq.heappop(self._heap)
+            self._indexed.discard((start_iso, offset_minutes))
+            if await self._remind(start_iso, offset_minutes, now):
+                sent += 1
+        return sent
+
+    @property
+    def next_due(self) -> Optional[datetime]:
+        """Instante do próximo lembrete, se houver."""
+        return self._heap[0][0] if self._heap else None
+
+    def stats(self) -> Dict:
+        """Retorna as métricas dos lembretes."""
+        return {
+            "scheduled": len(self._heap),
+            "next_due": self.next_due.isoformat() if self.next_due else None,
+            "offsets_minutes": [int(offset.total_seconds() // 60) for offset in self.offsets],
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "reloads": self.reloads,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Erro no ciclo de lembretes: {e}")
+
+            delay = self.interval
+            if self._heap:
+                delay = min(delay, max((self._heap[0][0] - datetime.now()).total_seconds(), 0.0))
+            await asyncio.sleep(delay)
+
+    def _refresh(self, now: datetime) -> None:
+        """Relê os agendamentos se o arquivo mudou e indexa os lembretes novos."""
+        try:
+            mtime = os.stat(self.slot_service.appointments_file).st_mtime
+        except OSError:
+            mtime = None
+
+        # Após a primeira leitura, qualquer mudança recarrega, inclusive a criação do arquivo
+        if self._observed and mtime == self._mtime:
+            return
+        if self._observed:
+            self.slot_service.appointments = self.slot_service._load_appointments()
+            self.reloads += 1
+        self._observed = True
+        self._mtime = mtime
+
+        for start_iso in self.slot_service.appointments:
+            self._index(start_iso, now)
+
+    def _index(self, start_iso: str, now: datetime) -> None:
+        try:
+            start = datetime.fromisoformat(start_iso)
+        except ValueError:
+            return
+        if start <= now:
+            return
+
+        dues = [(start - offset, int(offset.total_seconds() // 60)) for offset in self.offsets]
+        upcoming = [(due, minutes) for due, minutes in dues if due > now]
+        # Lembretes que já passaram só valem se forem o último antes da consulta
+        # (por exemplo, após um restart); um lembrete de 24h não sai 3h antes se o de 2h ainda vem.
+        if not upcoming:
+            upcoming = dues[-1:]
+
+        for due, minutes in upcoming:
+            if (start_iso, minutes) not in self._indexed:
+                self._indexed.add((start_iso, minutes))
+                heapq.heappush(self._heap, (due, start_iso, minutes))
+
+    async def _remind(self, start_iso: str, offset_minutes: int, now: datetime) -> bool:
+        appointment = self.slot_service.appointments.get(start_iso)
+        start = datetime.fromisoformat(start_iso)
+        if not appointment or not appointment.get("phone") or start <= now:
+            # Agendamento cancelado ou já passado
+            self.skipped += 1
+            return False
+
+        phone = appointment["phone"]
+        already_sent = self._db.execute(
+            "SELECT 1 FROM sent_reminders WHERE appointment = ? AND phone = ? AND offset_minutes = ?",
+            (start_iso, phone, offset_minutes)
+        ).fetchone()
+        if already_sent:
+            self.skipped += 1
+            return False
+
+        components = self.whatsapp_service.appointment_template_components(
+            appointment.get("name") or "Paciente", start.strftime("%d/%m/%Y - %H:%M")
+        )
+        queued = await self.whatsapp_service.send_template_message_async(
+            phone, self.template_name, self.language_code, components, MessagePriority.REMINDER, wait=False
+        )
+        if not queued:
+            self.skipped += 1
+            return False
+
+        self._db.execute(
+            "INSERT OR IGNORE INTO sent_reminders (appointment, phone, offset_minutes, sent_at) VALUES (?, ?, ?, ?)",
+            (start_iso, phone, offset_minutes, time.time())
+        )
+        self.sent += 1
+        return True
@@ -0,0 +1,294 @@
+import logging
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.config.config import (
+    INGESTION_WORKERS,
+    INGESTION_MAX_DEPTH,
+    INGESTION_SPOOL_PATH,
+    CONVERSATION_WORKERS,
+    CONVERSATION_MAX_LANES,
+    CONVERSATION_MAX_LANE_DEPTH,
+    CONVERSATION_LANE_IDLE_SECONDS,
+    DEDUPE_TTL_SECONDS,
+    DEDUPE_MAX_ENTRIES,
+    DEDUPE_PERSIST_PATH,
+    DELIVERY_TRACKING_ENABLED,
+    COALESCE_WINDOW_SECONDS,
+    COALESCE_MAX_WAIT_SECONDS,
+    ADMISSION_SOFT_LIMIT,
+    ADMISSION_HARD_LIMIT,
+    ADMISSION_MAX_DEFERRED,
+    OUTBOUND_RATE_PER_SECOND,
+    OUTBOUND_BURST,
+    OUTBOUND_RECIPIENT_INTERVAL_SECONDS,
+    OUTBOUND_RECIPIENT_BURST,
+    OUTBOUND_MAX_QUEUE,
+    OUTBOUND_MAX_ATTEMPTS,
+    OUTBOUND_RETRY_BASE_SECONDS,
+    OUTBOUND_RETRY_MAX_SECONDS,
+    DEAD_LETTER_PATH,
+    BROADCAST_CONCURRENCY,
+    BROADCAST_PATH,
+    NOTIFICATION_ENABLED,
+    NOTIFICATION_INTERVAL,
+    REMINDER_TEMPLATE_NAME,
+    REMINDER_OFFSETS_HOURS,
+    REMINDER_STATE_PATH,
+    APPOINTMENTS_PATH,
+    MEDIA_STORAGE_PATH,
+    MEDIA_DOWNLOAD_CONCURRENCY,
+    MEDIA_CHUNK_SIZE,
+    MEDIA_MAX_BYTES,
+    WHATSAPP_HTTP_MAX_CONNECTIONS,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_MAX_ENTRIES,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_CACHE_PERSIST_PATH,
+)
+from app.services.admission_control import AdmissionController
+from app.services.broadcast_service import BroadcastService
+from app.services.chatgpt_service import ChatGPTService
+from app.services.calendar_service import CalendarService
+from app.services.conversation_scheduler import ConversationScheduler
+from app.services.dead_letter_store import DeadLetterStore
+from app.services.delivery_tracker import DeliveryTracker
+from app.services.ingestion_queue import IngestionQueue
+from app.services.llm_cache import LLMResponseCache
+from app.services.media_service import MediaService
+from app.services.message_coalescer import MessageCoalescer
+from app.services.message_deduplicator import MessageDeduplicator
+from app.services.outbound_scheduler import OutboundScheduler
+from app.services.reminder_engine import ReminderEngine
+from app.services.simplified_slot_service import SimplifiedSlotService
+from app.services.whatsapp_service import WhatsAppService
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """
+    Contêiner com os serviços compartilhados durante toda a vida da aplicação.
+
+    Os serviços são criados uma única vez no startup (credenciais, cliente do
+    Google Calendar e cliente da OpenAI) e injetados nas rotas, de modo que o
+    processamento de cada mensagem não paga nenhum custo de inicialização.
+    """
+
+    def __init__(self,
+                 webhook_handler: Optional[Callable[[bytes, "ServiceContainer"], Awaitable[None]]] = None):
+        """
+        Args:
+            webhook_handler: Corrotina que processa o corpo bruto de um webhook.
+                Quando informada, o startup cria a fila de ingestão que a executa.
+        """
+        self.webhook_handler = webhook_handler
+        self.llm_cache: Optional[LLMResponseCache] = None
+        self.chatgpt_service: Optional[ChatGPTService] = None
+        self.calendar_service: Optional[CalendarService] = None
+        self.whatsapp_service: Optional[WhatsAppService] = None
+        self.outbound_scheduler: Optional[OutboundScheduler] = None
+        self.dead_letter_store: Optional[DeadLetterStore] = None
+        self.broadcast_service: Optional[BroadcastService] = None
+        self.reminder_engine: Optional[ReminderEngine] = None
+        self.media_service: Optional[MediaService] = None
+        self.conversation_scheduler: Optional[ConversationScheduler] = None
+        self.message_deduplicator: Optional[MessageDeduplicator] = None
+        self.message_coalescer: Optional[MessageCoalescer] = None
+        self.delivery_tracker: Optional[DeliveryTracker] = None
+        self.admission_controller: Optional[AdmissionController] = None
+        self.ingestion_queue: Optional[IngestionQueue] = None
+        self.started = False
+
+    async def startup(self) -> None:
+        """Cria os serviços compartilhados. Chamado pelo lifespan do FastAPI."""
+        if self.started:
+            return
+
+        logger.info("Inicializando contêiner de serviços")
+        if LLM_CACHE_ENABLED:
+            self.llm_cache = LLMResponseCache(
+                max_entries=LLM_CACHE_MAX_ENTRIES,
+                ttl=LLM_CACHE_TTL_SECONDS,
+                persist_path=LLM_CACHE_PERSIST_PATH,
+            )
+        self.chatgpt_service = ChatGPTService(cache=self.llm_cache)
+        self.calendar_service = CalendarService()
+
+        self.dead_letter_store = DeadLetterStore(path=DEAD_LETTER_PATH)
+        self.outbound_scheduler = OutboundScheduler(
+            rate=OUTBOUND_RATE_PER_SECOND,
+            burst=OUTBOUND_BURST,
+            recipient_rate=1 / OUTBOUND_RECIPIENT_INTERVAL_SECONDS,
+            recipient_burst=OUTBOUND_RECIPIENT_BURST,
+            max_in_flight=WHATSAPP_HTTP_MAX_CONNECTIONS,
+            max_queue=OUTBOUND_MAX_QUEUE,
+            max_attempts=OUTBOUND_MAX_ATTEMPTS,
+            retry_base=OUTBOUND_RETRY_BASE_SECONDS,
+            retry_max=OUTBOUND_RETRY_MAX_SECONDS,
+            dead_letter=self.dead_letter_store.add,
+        )
+        await self.outbound_scheduler.start()
+
+        self.whatsapp_service = WhatsAppService(
+            chatgpt_service=self.chatgpt_service,
+            calendar_service=self.calendar_service,
+            outbound_scheduler=self.outbound_scheduler,
+        )
+
+        self.media_service = MediaService(
+            self.whatsapp_service,
+            storage_dir=MEDIA_STORAGE_PATH,
+            concurrency=MEDIA_DOWNLOAD_CONCURRENCY,
+            chunk_size=MEDIA_CHUNK_SIZE,
+            max_bytes=MEDIA_MAX_BYTES,
+        )
+
+        self.broadcast_service = BroadcastService(
+            self.whatsapp_service,
+            path=BROADCAST_PATH,
+            concurrency=BROADCAST_CONCURRENCY,
+        )
+        await self.broadcast_service.resume_incomplete()
+
+        if NOTIFICATION_ENABLED:
+            self.reminder_engine = ReminderEngine(
+                self.whatsapp_service,
+                SimplifiedSlotService(appointments_file=APPOINTMENTS_PATH),
+                offsets=[timedelta(hours=hours) for hours in REMINDER_OFFSETS_HOURS],
+                interval=NOTIFICATION_INTERVAL * 60,
+                template_name=REMINDER_TEMPLATE_NAME,
+                state_path=REMINDER_STATE_PATH,
+            )
+            await self.reminder_engine.start()
+
+        self.conversation_scheduler = ConversationScheduler(
+            workers=CONVERSATION_WORKERS,
+            max_lanes=CONVERSATION_MAX_LANES,
+            max_lane_depth=CONVERSATION_MAX_LANE_DEPTH,
+            idle_ttl=CONVERSATION_LANE_IDLE_SECONDS,
+        )
+        await self.conversation_scheduler.start()
+
+        self.message_deduplicator = MessageDeduplicator(
+            ttl=DEDUPE_TTL_SECONDS,
+            max_entries=DEDUPE_MAX_ENTRIES,
+            persist_path=DEDUPE_PERSIST_PATH,
+        )
+
+        self.message_coalescer = MessageCoalescer(
+            window=COALESCE_WINDOW_SECONDS,
+            max_wait=COALESCE_MAX_WAIT_SECONDS,
+        )
+
+        self.delivery_tracker = DeliveryTracker(enabled=DELIVERY_TRACKING_ENABLED)
+
+        self.admission_controller = AdmissionController(
+            soft_limit=ADMISSION_SOFT_LIMIT,
+            hard_limit=ADMISSION_HARD_LIMIT,
+            max_deferred=ADMISSION_MAX_DEFERRED,
+            load_probe=self._queued_work,
+        )
+        await self.admission_controller.start()
+
+        if self.webhook_handler is not None:
+            self.ingestion_queue = IngestionQueue(
+                handler=lambda body: self.webhook_handler(body, self),
+                workers=INGESTION_WORKERS,
+                max_depth=INGESTION_MAX_DEPTH,
+                spool_path=INGESTION_SPOOL_PATH,
+            )
+            await self.ingestion_queue.start()
+
+        self.started = True
+
+    async def shutdown(self) -> None:
+        """Libera os serviços compartilhados. Chamado pelo lifespan do FastAPI."""
+        if not self.started:
+            return
+
+        logger.info("Encerrando contêiner de serviços")
+        if self.ingestion_queue is not None:
+            await self.ingestion_queue.stop()
+            self.ingestion_queue = None
+
+        await self.admission_controller.stop()
+        self.admission_controller = None
+
+        self.message_coalescer.close()
+        self.message_coalescer = None
+
+        await self.conversation_scheduler.stop()
+        self.conversation_scheduler = None
+
+        self.message_deduplicator.close()
+        self.message_deduplicator = None
+        self.delivery_tracker = None
+
+        await self.media_service.close()
+        self.media_service = None
+
+        if self.reminder_engine is not None:
+            await self.reminder_engine.stop()
+            self.reminder_engine = None
+
+        await self.broadcast_service.close()
+        self.broadcast_service = None
+
+        await self.outbound_scheduler.stop()
+        self.outbound_scheduler = None
+        self.dead_letter_store.close()
+        self.dead_letter_store = None
+
+        await self.whatsapp_service.aclose()
+        self.whatsapp_service = None
+        self.calendar_service = None
+        await self.chatgpt_service.aclose()
+        self.chatgpt_service = None
+        if self.llm_cache is not None:
+            self.llm_cache.close()
+            self.llm_cache = None
+        self.started = False
+
+    def _queued_work(self) -> int:
+        """Trabalho aguardando nas filas da fila de ingestão e das lanes de conversa."""
+        queued = self.conversation_scheduler.pending if self.conversation_scheduler else 0
+        if self.ingestion_queue is not None:
+            queued += self.ingestion_queue.depth
+        return queued
+
+    def metrics(self) -> Dict:
+        """Retorna as métricas dos componentes gerenciados pelo contêiner."""
+        metrics = {"started": self.started}
+        if self.chatgpt_service is not None:
+            metrics["chatgpt_service"] = self.chatgpt_service.stats()
+        if self.llm_cache is not None:
+            metrics["llm_cache"] = self.llm_cache.stats()
+        if self.whatsapp_service is not None:
+            metrics["intent_extractor"] = {
+                **self.whatsapp_service.intent_extractor.stats(),
+                "offline_replies": self.whatsapp_service.offline_replies,
+            }
+        if self.conversation_scheduler is not None:
+            metrics["conversation_scheduler"] = self.conversation_scheduler.stats()
+        if self.message_deduplicator is not None:
+            metrics["message_deduplicator"] = self.message_deduplicator.stats()
+        if self.message_coalescer is not None:
+            metrics["message_coalescer"] = self.message_coalescer.stats()
+        if self.delivery_tracker is not None:
+            metrics["delivery_tracker"] = self.delivery_tracker.stats()
+        if self.outbound_scheduler is not None:
+            metrics["outbound_scheduler"] = self.outbound_scheduler.stats()
+        if self.broadcast_service is not None:
+            metrics["broadcast_service"] = self.broadcast_service.stats()
+        if self.media_service is not None:
+            metrics["media_service"] = self.media_service.stats()
+        if self.reminder_engine is not None:
+            metrics["reminder_engine"] = self.reminder_engine.stats()
+        if self.dead_letter_store is not None:
+            metrics["dead_letter_store"] = self.dead_letter_store.stats()
+        if self.admission_controller is not None:
+            metrics["admission_controller"] = self.admission_controller.stats()
+        if self.ingestion_queue is not None:
+            metrics["ingestion_queue"] = self.ingestion_queue.stats()
+        return metrics
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+WEEKDAY_ABBREVIATIONS = ["seg", "ter", "qua", "qui", "sex", "sáb", "dom"]
+
+
+def encode_slots(available_slots: List[Dict]) -> str:
+    """
+    Representação compacta dos horários para o prompt do ChatGPT.
+
+    Cada horário recebe como referência sua posição na lista (a partir de 1) e
+    os horários são agrupados por dia, uma linha por dia:
+
+        2025-05-05 seg: 1=09:00 2=09:45 3=10:30
+        2025-05-06 ter: 4=08:30 5=09:15
+
+    O modelo devolve os números, e não os UUIDs dos horários; `decode_slot_refs`
+    converte os números de volta nos dicionários originais.
+    """
+    days: Dict[str, List[str]] = {}
+    for position, slot in enumerate(available_slots, start=1):
+        start = slot["start_time"]
+        if not isinstance(start, datetime):
+            start = datetime.fromisoformat(start.replace("Z", "+00:00"))
+        day = f"{start:%Y-%m-%d} {WEEKDAY_ABBREVIATIONS[start.weekday()]}"
+        days.setdefault(day, []).append(f"{position}={start:%H:%M}")
+    return "\n".join(f"{day}: {' '.join(times)}" for day, times in days.items())
+
+
+def decode_slot_refs(refs: Iterable, available_slots: List[Dict]) -> List[Dict]:
+    """
+    Converte as referências devolvidas pelo modelo nos horários originais.
+
+    Aceita números ou textos numéricos; referências fora da lista são ignoradas.
+    Os horários voltam na ordem da lista original, sem repetição.
+
+    Raises:
+        ValueError: Se alguma referência não for numérica
+    """
+    positions = set()
+    for ref in refs:
+        if isinstance(ref, bool) or not isinstance(ref, (int, str)):
+            raise ValueError(f"Invalid slot reference: {ref!r}")
+        positions.add(int(ref))
+    return [slot for position, slot in enumerate(available_slots, start=1) if position in positions]
@@ -0,0 +1,186 @@
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.services.intent_extractor import RELATIVE_DAYS, WEEKDAYS
+from app.services.text_normalization import normalize
+
+# Períodos do dia: manhã antes das 12h, tarde das 12h às 18h, noite a partir das 18h
+PERIODS = {
+    "manha": (time(0, 0), time(12, 0)),
+    "tarde": (time(12, 0), time(18, 0)),
+    "noite": (time(18, 0), time(23, 59, 59)),
+}
+
+HOUR = r"(\d{1,2})(?:\s*(?::|h)\s*(\d{2})|\s*h(?:s|oras?)?)?"
+
+ANY_SLOT = re.compile(r"\b(qualquer (dia|horario|hora)|tanto faz|o que tiver|qualquer um)\b")
+AFTER = re.compile(r"\b(depois d[ao]s?|apos as|a partir d[ao]s?)\s+" + HOUR + r"\b")
+BEFORE = re.compile(r"\b(antes d[ao]s?|ate as)\s+" + HOUR + r"\b")
+AT = re.compile(r"\b(?:as|a)\s+" + HOUR + r"\b")
+DAY_OF_MONTH = re.compile(r"\bdia\s+(\d{1,2})\b")
+WEEKDAY = re.compile(r"\b(" + "|".join(WEEKDAYS) + r")(?:[\s-]*feira)?s?\b")
+PERIOD = re.compile(r"\b(" + "|".join(PERIODS) + r")\b")
+RELATIVE = re.compile(r"\b(" + "|".join(term for term, _ in RELATIVE_DAYS) + r")\b")
+
+# Palavras que não alteram a preferência; qualquer outra que sobrar após os
+# padrões reconhecidos (ex.: "não", "cedo", "feriado") manda a frase para o ChatGPT
+FILLER = {
+    "a", "o", "as", "os", "e", "ou", "de", "da", "do", "das", "dos", "na", "no", "nas", "nos", "em",
+    "pela", "pelo", "para", "pra", "por", "favor", "um", "uma", "algum", "alguma", "me", "eu",
+    "prefiro", "preferencia", "quero", "queria", "gostaria", "poderia", "pode", "ser", "seria",
+    "melhor", "tem", "teria", "ter", "vaga", "vagas", "horario", "horarios", "hora", "consulta",
+    "agendar", "marcar", "agendamento", "dia", "dias", "feira", "periodo", "turno", "sim", "ok",
+    "entao", "que", "se", "possivel", "fica", "bom", "boa", "certo", "mais", "ainda", "esta",
+    "semana", "proxima", "proximo", "essa", "esse", "nessa", "nesse", "disponivel", "disponiveis",
+}
+
+
+@dataclass
+class SlotPreference:
+    """Preferência de horário interpretada a partir do texto do paciente"""
+    dates: Set[date] = field(default_factory=set)
+    days_of_month: Set[int] = field(default_factory=set)
+    weekdays: Set[int] = field(default_factory=set)
+    periods: List[Tuple[time, time]] = field(default_factory=list)
+    after: Optional[time] = None
+    before: Optional[time] = None
+    at: Set[time] = field(default_factory=set)
+
+    def matches(self, start: datetime) -> bool:
+        """Indica se um horário atende a todas as restrições."""
+        if self.dates and start.date() not in self.dates:
+            return False
+        if self.days_of_month and start.day not in self.days_of_month:
+            return False
+        if self.weekdays and start.weekday() not in self.weekdays:
+            return False
+        moment = start.time()
+        if self.periods and not any(begin <= moment < end for begin, end in self.periods):
+            return False
+        if self.after is not None and moment < self.after:
+            return False
+        if self.before is not None and moment >= self.before:
+            return False
+        if self.at and moment.replace(second=0, microsecond=0) not in self.at:
+            return False
+        return True
+
+
+class SlotPreferenceFilter:
+    """
+    Filtro local das preferências de horário dos pacientes.
+
+    Interpreta, sem chamada de rede, os pedidos mais comuns ("terça de manhã",
+    "amanhã depois das 14h", "antes das 10", "dia 15", "qualquer horário") e
+    filtra a lista de horários disponíveis. Frases que não consegue interpretar
+    por completo ficam para o ChatGPT.
+    """
+
+    def __init__(self):
+        self.resolved = 0
+        self.fallbacks = 0
+
+    def parse(self, text: str, today: Optional[date] = None) -> Optional[SlotPreference]:
+        """
+        Interpreta a preferência do paciente.
+
+        Args:
+            text: Mensagem do paciente
+            today: Data de referência para "hoje" e "amanhã" (padrão: hoje)
+
+        Returns:
+            SlotPreference: A preferência, ou None se a frase não for totalmente reconhecida
+        """
+        normalized = normalize(text).replace("?", " ").replace("!", " ").replace(",", " ").replace(".", " ")
+        today = today or date.today()
+        preference = SlotPreference()
+        recognized = bool(ANY_SLOT.search(normalized))
+        normalized = ANY_SLOT.sub(" ", normalized)
+
+        # Horários fora do relógio ("depois das 25h") invalidam a interpretação local
+        parsed_times = []
+        for match in AFTER.finditer(normalized):
+            preference.after = self._time(match.group(2), match.group(3), normalized)
+            parsed_times.append(preference.after)
+        normalized = AFTER.sub(" ", normalized)
+        for match in BEFORE.finditer(normalized):
+            preference.before = self._time(match.group(2), match.group(3), normalized)
+            parsed_times.append(preference.before)
+        normalized = BEFORE.sub(" ", normalized)
+
+        for match in RELATIVE.finditer(normalized):
+            days = dict(RELATIVE_DAYS)[match.group(1)]
+            preference.dates.add(today + timedelta(days=days))
+        normalized = RELATIVE.sub(" ", normalized)
+
+        for match in AT.finditer(normalized):
+            parsed_times.append(self._time(match.group(1), match.group(2), normalized))
+            preference.at.add(parsed_times[-1])
+        normalized = AT.sub(" ", normalized)
+
+        for match in DAY_OF_MONTH.finditer(normalized):
+            preference.days_of_month.add(int(match.group(1)))
+        normalized = DAY_OF_MONTH.sub(" ", normalized)
+        for match in WEEKDAY.finditer(normalized):
+            preference.weekdays.add(WEEKDAYS[match.group(1)])
+        normalized = WEEKDAY.sub(" ", normalized)
+        for match in PERIOD.finditer(normalized):
+            preference.periods.append(PERIODS[match.group(1)])
+        normalized = PERIOD.sub(" ", normalized)
+
+        if None in parsed_times or preference.days_of_month - set(range(1, 32)):
+            return None
+        if preference.after and preference.before and preference.after >= preference.before:
+            return None
+        leftover = [word for word in normalized.split() if word not in FILLER]
+        if leftover or not (recognized or preference != SlotPreference()):
+            return None
+        return preference
+
+    def filter(self, text: str, available_slots: List[Dict], today: Optional[date] = None) -> Optional[List[Dict]]:
+        """
+        Filtra os horários de acordo com a preferência do paciente.
+
+        Args:
+            text: Mensagem do paciente
+            available_slots: Horários no formato {'slot_id': ..., 'start_time': 'YYYY-MM-DDTHH:MM:SS'}
+            today: Data de referência para "hoje" e "amanhã" (padrão: hoje)
+
+        Returns:
+            List[Dict]: Os horários que atendem à preferência, na ordem original,
+                        ou None se a frase precisar do ChatGPT
+        """
+        preference = self.parse(text, today)
+        if preference is None:
+            self.fallbacks += 1
+            return None
+
+        self.resolved += 1
+        return [slot for slot in available_slots if preference.matches(self._start(slot))]
+
+    def stats(self) -> Dict:
+        """Retorna as métricas do filtro local."""
+        total = self.resolved + self.fallbacks
+        return {
+            "resolved_locally": self.resolved,
+            "llm_fallbacks": self.fallbacks,
+            "local_rate": round(self.resolved / total, 4) if total else 0.0,
+        }
+
+    @staticmethod
+    def _time(hour: str, minute: Optional[str], text: str) -> Optional[time]:
+        hour, minute = int(hour), int(minute or 0)
+        if hour < 12 and re.search(r"\b(da tarde|da noite)\b", text):
+            hour += 12
+        if hour >= 24 or minute >= 60:
+            return None
+        return time(hour, minute)
+
+    @staticmethod
+    def _start(slot: Dict) -> datetime:
+        start = slot["start_time"]
+        if isinstance(start, datetime):
+            return start
+        return datetime.fromisoformat(start.replace("Z", "+00:00"))
@@ -0,0 +1,16 @@
+import re
+import unicodedata
+
+
+def normalize(text: str) -> str:
+    """
+    Texto em minúsculas, sem acentos e com espaços simples.
+
+    Usado por todas as camadas que comparam textos de pacientes (controle de
+    admissão, extração local de intenção, filtro de horários e chave do cache
+    da OpenAI), para que todas tratem "Amanhã  de MANHÃ" e "amanha de manha"
+    da mesma forma.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"\s+", " ", text).strip()
@@ -1,17 +1,41 @@
 import os
-from typing import Dict, Optional
+import asyncio
+from functools import partial
+from typing import Awaitable, Callable, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import httpx
 
-from app.services.chatgpt_service import ChatGPTService
+from app.config.config import (
+    WHATSAPP_HTTP_MAX_CONNECTIONS,
+    WHATSAPP_HTTP_MAX_KEEPALIVE,
+    WHATSAPP_HTTP_KEEPALIVE_EXPIRY,
+    WHATSAPP_HTTP_TIMEOUT,
+    WHATSAPP_HTTP_CONNECT_TIMEOUT,
+    WHATSAPP_HTTP2,
+    INTENT_CONFIDENCE_THRESHOLD,
+    LLM_REPLY_BUDGET_SECONDS,
+)
+from app.models.intent import Intent, IntentExtraction
+from app.services.admission_control import Priority, classify_message_priority
+from app.services.chatgpt_service import ChatGPTService, LLMTimeoutError
+from app.services.circuit_breaker import CircuitOpenError
 from app.services.conversation_state import ConversationState, ConversationManager
 from app.services.calendar_service import CalendarService, CalendarEvent
+from app.services.intent_extractor import IntentExtractor
+from app.services.openai_rate_scheduler import LLMPriority
+from app.services.prompt_builder import PromptBuilder
+from app.services.slot_encoding import WEEKDAY_ABBREVIATIONS
+from app.services.outbound_scheduler import MessagePriority, OutboundQueueFullError, OutboundScheduler, SendError
 
 load_dotenv()
 
-# Se futuramente você usar uma biblioteca como httpx para chamar a API real,
-# basta trocar o corpo desses métodos.
+# HTTP/2 depende do pacote opcional h2 (pip install "httpx[http2]")
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 class WhatsAppService:
     """
@@ -35,12 +59,81 @@ class WhatsAppService:
         "cassi"
     ]
 
-    def __init__(self):
+    # Prompt que guia a interpretação do ChatGPT; os campos estruturados
+    # (intenção, data, horário, convênio) vêm pela função record_intent.
+    # Montado uma única vez: instruções e dados da clínica formam um prefixo
+    # idêntico em todas as chamadas, e a data e a etapa da conversa vão depois
+    INTENT_PROMPT = PromptBuilder("""
+    Você é um assistente de agendamento de uma clínica de nutrição.
+    Sua função é ajudar os pacientes a agendarem consultas.
+    Seja educado, profissional e direto.
+    
+    Registre a mensagem do paciente com a função record_intent:
+    - intent "date" com date no formato YYYY-MM-DD se ele mencionar uma data;
+    - intent "time" com time no formato HH:MM se ele mencionar um horário;
+    - intent "confirmation" se ele confirmar o agendamento;
+    - intent "insurance" com o nome do convênio se ele quiser agendar por convênio;
+    - intent "private" se ele quiser agendar particular;
+    - intent "other" para qualquer outra mensagem.
+    Em reply, escreva uma resposta curta ao paciente.
+    Use a data de hoje informada a seguir para interpretar "hoje", "amanhã" e dias da semana.
+    """, f"""
+    Informações da clínica:
+    - Convênios aceitos: {", ".join(ACCEPTED_INSURANCES)}.
+    - Consulta particular: inicial R$ 200,00; retorno R$ 150,00; pacote de 4 consultas R$ 600,00.
+    """)
+
+    # Respostas do roteiro de agendamento usadas quando o ChatGPT não responde a tempo
+    FALLBACK_REPLIES = {
+        ConversationState.INITIAL: (
+            "Olá! Sou o assistente de agendamento da clínica. "
+            "Você gostaria de agendar pelo convênio ou particular?"
+        ),
+        ConversationState.WAITING_FOR_INSURANCE_DOCS: (
+            "Por favor, envie a foto da carteirinha do convênio e um documento pessoal com foto (RG ou CNH)."
+        ),
+        ConversationState.WAITING_FOR_DATE: (
+            "Qual data você gostaria de agendar? Pode responder, por exemplo, \"amanhã\" ou \"15/05\"."
+        ),
+        ConversationState.WAITING_FOR_TIME: (
+            "Qual horário você prefere? Pode responder, por exemplo, \"às 14h\"."
+        ),
+        ConversationState.WAITING_FOR_CONFIRMATION: (
+            "Para confirmar o agendamento, responda \"sim\"."
+        ),
+    }
+
+    def __init__(
+        self,
+        chatgpt_service: Optional[ChatGPTService] = None,
+        calendar_service: Optional[CalendarService] = None,
+        conversation_manager: Optional[ConversationManager] = None,
+        http_client: Optional[httpx.AsyncClient] = None,
+        outbound_scheduler: Optional[OutboundScheduler] = None,
+        intent_extractor: Optional[IntentExtractor] = None
+    ):
+        """
+        Args:
+            chatgpt_service: Instância compartilhada do ChatGPTService (criada se omitida)
+            calendar_service: Instância compartilhada do CalendarService (criada se omitida)
+            conversation_manager: Gerenciador de conversações (criado se omitido)
+            http_client: Cliente HTTP assíncrono para a Cloud API (criado sob demanda se omitido)
+            outbound_scheduler: Agendador que controla a taxa de envios (envia direto se omitido)
+            intent_extractor: Extrator local de intenção usado antes do ChatGPT (criado se omitido)
+        """
         self.token = os.getenv("WHATSAPP_API_TOKEN")
         self.phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
-        self.chatgpt_service = ChatGPTService()
-        self.calendar_service = CalendarService()
-        self.conversation_manager = ConversationManager()
+        self.chatgpt_service = chatgpt_service or ChatGPTService()
+        self.calendar_service = calendar_service or CalendarService()
+        self.conversation_manager = conversation_manager or ConversationManager()
+        self._http_client = http_client
+        self._http_client_loop = None
+        self.outbound_scheduler = outbound_scheduler
+        self.intent_extractor = intent_extractor or IntentExtractor(
+            self.ACCEPTED_INSURANCES, threshold=INTENT_CONFIDENCE_THRESHOLD
+        )
+        # Mensagens respondidas sem o ChatGPT por ele estar lento ou fora do ar
+        self.offline_replies = 0
 
         # Add debug logging
         print(f"DEBUG: Token loaded: {'Yes' if self.token else 'No'}")
@@ -53,11 +146,12 @@ class WhatsAppService:
 
         self.api_url = f"https://graph.facebook.com/{self.API_VERSION}/{self.phone_number_id}/messages"
 
-    def receive_message(self, payload: Dict) -> Dict:
+    async def receive_message(self, payload: Dict) -> Dict:
         """
         Processa uma mensagem recebida pelo webhook.
         'payload' é o JSON enviado pelo provedor (Twilio, 360dialog etc.).
-        Aqui, extraímos o telefone e o texto, e processamos com ChatGPT.
+        Aqui, extraímos o telefone e o texto, e processamos com ChatGPT
+        pelo cliente assíncrono, sem bloquear o event loop.
         """
         phone = payload.get("from")
         text = payload.get("text")
@@ -75,33 +169,28 @@ class WhatsAppService:
         # Obtém o estado atual da conversação
         current_state = self.conversation_manager.get_state(phone)
         
-        # Sistema para guiar a resposta do ChatGPT
-        system_message = """
-        Você é um assistente de agendamento de uma clínica de nutrição.
-        Sua função é ajudar os pacientes a agendarem consultas.
-        Seja educado, profissional e direto.
-        
-        Se o paciente mencionar uma data específica, indique no seu retorno com o formato
-        DATA_MENCIONADA: YYYY-MM-DD para que eu possa verificar disponibilidade.
-        
-        Se o paciente mencionar um horário específico, indique no seu retorno com o formato
-        HORARIO_MENCIONADO: HH:MM para que eu possa verificar disponibilidade.
+        # Padrões comuns (datas, horários, convênios, confirmações) são resolvidos
+        # localmente; o ChatGPT só é chamado quando a confiança é baixa e devolve a
+        # mesma interpretação estruturada, já validada, junto da resposta ao paciente
+        local_extraction = self.intent_extractor.extract(text, current_state)
+        if self.intent_extractor.is_confident(local_extraction):
+            extraction, response = local_extraction, None
+        else:
+            today = datetime.now()
+            try:
+                extraction = await self.chatgpt_service.extract_intent(text, self.INTENT_PROMPT, {
+                    "Data de hoje": f"{today:%Y-%m-%d} ({WEEKDAY_ABBREVIATIONS[today.weekday()]})",
+                    "Etapa da conversa": current_state.value,
+                }, timeout=LLM_REPLY_BUDGET_SECONDS, priority=self._llm_priority(text, current_state))
+                response = extraction.reply
+            except (LLMTimeoutError, CircuitOpenError, RuntimeError) as e:
+                # ChatGPT lento ou fora do ar: o paciente recebe uma resposta dentro do
+                # orçamento de latência, a partir da interpretação local ou do roteiro
+                print(f"ChatGPT indisponível, usando resposta local: {e}")
+                extraction, response = self._fallback(local_extraction, current_state)
         
-        Se o paciente confirmar o agendamento, indique no seu retorno com o formato
-        CONFIRMACAO: sim para que eu possa finalizar o agendamento.
-        
-        Se o paciente mencionar que deseja agendar por convênio, indique no seu retorno com o formato
-        CONVENIO: nome_do_convenio para que eu possa verificar se é aceito.
-        
-        Se o paciente mencionar que deseja agendar particular, indique no seu retorno com o formato
-        PARTICULAR: sim para que eu possa informar os valores.
-        """
-        
-        # Processa a mensagem com ChatGPT
-        response = self.chatgpt_service.generate_response(text, system_message)
-        
-        # Atualiza o estado da conversação com base na resposta
-        if "PARTICULAR:" in response:
+        # Atualiza o estado da conversação com base na interpretação
+        if extraction.intent == Intent.PRIVATE:
             self.conversation_manager.update_data(phone, {"insurance": "particular"})
             self.conversation_manager.set_state(phone, ConversationState.WAITING_FOR_DATE)
             current_state = ConversationState.WAITING_FOR_DATE
@@ -113,8 +202,8 @@ class WhatsAppService:
                 "Por favor, me informe qual data você gostaria de agendar."
             )
         
-        elif "CONVENIO:" in response:
-            insurance_name = response.split("CONVENIO:")[1].strip().lower()
+        elif extraction.intent == Intent.INSURANCE:
+            insurance_name = (extraction.insurance or "").strip().lower()
             if insurance_name in self.ACCEPTED_INSURANCES:
                 self.conversation_manager.update_data(phone, {"insurance": insurance_name})
                 self.conversation_manager.set_state(phone, ConversationState.WAITING_FOR_INSURANCE_DOCS)
@@ -136,21 +225,25 @@ class WhatsAppService:
                     "💰 Pacote de 4 consultas: R$ 600,00"
                 )
         
-        elif "DATA_MENCIONADA:" in response:
-            date_str = response.split("DATA_MENCIONADA:")[1].strip().split()[0]
+        elif extraction.intent == Intent.DATE:
+            date_str = extraction.date or ""
             if self.conversation_manager.is_valid_date(date_str):
                 self.conversation_manager.update_data(phone, {"date": date_str})
+                if extraction.time and self.conversation_manager.is_valid_time(extraction.time):
+                    self.conversation_manager.update_data(phone, {"time": extraction.time})
                 self.conversation_manager.set_state(phone, ConversationState.WAITING_FOR_TIME)
                 current_state = ConversationState.WAITING_FOR_TIME
+                response = response or f"Ótimo! Vou verificar os horários disponíveis para {date_str}."
         
-        elif "HORARIO_MENCIONADO:" in response:
-            time_str = response.split("HORARIO_MENCIONADO:")[1].strip().split()[0]
+        elif extraction.intent == Intent.TIME:
+            time_str = extraction.time or ""
             if self.conversation_manager.is_valid_time(time_str):
                 self.conversation_manager.update_data(phone, {"time": time_str})
                 self.conversation_manager.set_state(phone, ConversationState.WAITING_FOR_CONFIRMATION)
                 current_state = ConversationState.WAITING_FOR_CONFIRMATION
+                response = response or f"Ótimo! Vou verificar a disponibilidade do horário {time_str}."
         
-        elif "CONFIRMACAO:" in response:
+        elif extraction.intent == Intent.CONFIRMATION:
             # Verifica se temos todos os dados necessários
             conversation_data = self.conversation_manager.get_data(phone)
             date_str = conversation_data.get("date")
@@ -212,38 +305,256 @@ class WhatsAppService:
                     self.conversation_manager.set_state(phone, ConversationState.ERROR)
                     current_state = ConversationState.ERROR
                     response = "Desculpe, tive um problema ao criar o agendamento. Por favor, tente novamente."
+            else:
+                response = response or "Desculpe, não consegui identificar a data e horário. Poderia informar novamente?"
+        
+        if not response:
+            response = "Desculpe, não entendi. Poderia reformular sua mensagem?"
         
         return {"phone": phone, "text": text, "response": response, "state": current_state.value}
 
-    def send_message(self, phone: str, message: str) -> bool:
+    @staticmethod
+    def _llm_priority(text: str, state: ConversationState) -> LLMPriority:
+        """Lugar da mensagem na fila da OpenAI: confirmações primeiro, conversa casual por último."""
+        if state == ConversationState.WAITING_FOR_CONFIRMATION:
+            return LLMPriority.CONFIRMATION
+        if classify_message_priority(text, state) == Priority.LOW:
+            return LLMPriority.SMALL_TALK
+        return LLMPriority.NORMAL
+
+    def _fallback(self, local_extraction: IntentExtraction, state: ConversationState) -> Tuple[IntentExtraction, Optional[str]]:
         """
-        Sends a message using the Meta WhatsApp Cloud API.
-        Returns True if the API request was successful (status code 200).
+        Interpretação e resposta usadas quando o ChatGPT está indisponível.
+
+        Aproveita a interpretação local de baixa confiança quando ela traz os dados
+        necessários (data, horário, "particular" ou um convênio reconhecido); confirmações
+        nunca são aceitas assim. Caso contrário, responde com o roteiro da etapa atual.
         """
-        if not self.token or not self.phone_number_id:
-            print("Error: WhatsApp service not configured.")
-            return False
+        self.offline_replies += 1
+        intent = local_extraction.intent
+        if intent in (Intent.PRIVATE, Intent.DATE, Intent.TIME) or (
+            intent == Intent.INSURANCE and local_extraction.insurance
+        ):
+            return local_extraction, None
+        reply = self.FALLBACK_REPLIES.get(state, "Desculpe, não entendi. Poderia reformular sua mensagem?")
+        return IntentExtraction(), reply
+
+    def receive_document(self, phone: str, document_url: str, caption: Optional[str] = None) -> Dict:
+        """
+        Vincula um documento recebido (já armazenado) à conversa do paciente.
+
+        A legenda indica se é a carteirinha do convênio ou o documento pessoal;
+        sem legenda, o documento preenche o primeiro que ainda falta. Com os dois
+        documentos recebidos, a conversa segue para a escolha da data.
+
+        Args:
+            phone: Telefone do paciente
+            document_url: Caminho do arquivo armazenado
+            caption: Legenda enviada junto com a mídia
+
+        Returns:
+            Dict: Telefone, campo preenchido, resposta ao paciente e estado atual
+        """
+        conversation_data = self.conversation_manager.get_data(phone)
+        normalized = (caption or "").lower()
+
+        if any(word in normalized for word in ("rg", "cnh", "identidade", "documento pessoal")):
+            field = "id_document_url"
+        elif any(word in normalized for word in ("carteirinha", "convênio", "convenio", "plano")):
+            field = "insurance_card_url"
+        elif not conversation_data.get("insurance_card_url"):
+            field = "insurance_card_url"
+        else:
+            field = "id_document_url"
+        self.conversation_manager.update_data(phone, {field: document_url})
+
+        if conversation_data.get("insurance_card_url") and conversation_data.get("id_document_url"):
+            self.conversation_manager.set_state(phone, ConversationState.WAITING_FOR_DATE)
+            response = (
+                "Documentos recebidos! ✅\n\n"
+                "Por favor, me informe qual data você gostaria de agendar."
+            )
+        elif field == "insurance_card_url":
+            response = "Recebemos a foto da carteirinha. Agora envie um documento pessoal com foto (RG ou CNH)."
+        else:
+            response = "Recebemos seu documento pessoal. Agora envie a foto da carteirinha do convênio."
+
+        current_state = self.conversation_manager.get_state(phone)
+        return {"phone": phone, "field": field, "response": response, "state": current_state.value}
+
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """
+        Retorna o cliente HTTP compartilhado, criando-o na primeira chamada.
+
+        O pool de conexões fica preso ao event loop em que foi criado; se o loop
+        mudar (por exemplo, entre chamadas síncronas), um novo cliente é criado.
+        """
+        loop = asyncio.get_running_loop()
+        if self._http_client is None or self._http_client.is_closed or (
+            self._http_client_loop is not None and self._http_client_loop is not loop
+        ):
+            self._http_client = httpx.AsyncClient(
+                http2=WHATSAPP_HTTP2 and HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=WHATSAPP_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=WHATSAPP_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=WHATSAPP_HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(WHATSAPP_HTTP_TIMEOUT, connect=WHATSAPP_HTTP_CONNECT_TIMEOUT),
+            )
+            self._http_client_loop = loop
+        return self._http_client
+
+    async def aclose(self) -> None:
+        """Fecha o cliente HTTP compartilhado e as conexões mantidas abertas."""
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+        self._http_client = None
+        self._http_client_loop = None
 
+    def _run_sync(self, coroutine):
+        """Executa um envio assíncrono a partir de código síncrono."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._run_in_own_loop(coroutine))
+        coroutine.close()
+        raise RuntimeError("Dentro de um event loop, use os métodos *_async do WhatsAppService")
+
+    async def _run_in_own_loop(self, coroutine):
+        try:
+            return await coroutine
+        finally:
+            # O cliente criado neste loop não serve para o próximo: fecha as conexões
+            # agora, em vez de deixá-las abertas até o coletor de lixo
+            if self._http_client_loop is asyncio.get_running_loop():
+                await self.aclose()
+
+    async def _post_message(self, payload: Dict) -> httpx.Response:
         headers = {
             "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json",
         }
+        response = await self._get_http_client().post(self.api_url, headers=headers, json=payload)
+        if response.status_code == 429 and self.outbound_scheduler is not None:
+            # A Meta sinalizou que passamos do limite: segura todos os envios
+            retry_after = self._retry_after(response)
+            self.outbound_scheduler.backoff(retry_after if retry_after is not None else 1.0)
+        response.raise_for_status()
+        return response
+
+    async def get_media_info(self, media_id: str) -> Dict:
+        """
+        Resolve uma mídia recebida pelo webhook no endpoint de mídia da Cloud API.
+
+        Returns:
+            Dict: URL temporária de download, mime_type, sha256 e file_size
+        """
+        response = await self._get_http_client().get(
+            f"https://graph.facebook.com/{self.API_VERSION}/{media_id}",
+            headers={"Authorization": f"Bearer {self.token}"},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def stream_media(self, url: str):
+        """
+        Abre o download de uma mídia em streaming, pelo cliente HTTP compartilhado.
+        Use com `async with` e leia o corpo com `response.aiter_bytes()`.
+        """
+        return self._get_http_client().stream("GET", url, headers={"Authorization": f"Bearer {self.token}"})
+
+    @staticmethod
+    def _retry_after(response: httpx.Response) -> Optional[float]:
+        """Lê o cabeçalho Retry-After (em segundos) de uma resposta, se houver."""
+        try:
+            return max(float(response.headers["Retry-After"]), 0.0)
+        except (KeyError, ValueError):
+            return None
+
+    @classmethod
+    def _send_error(cls, exc: httpx.HTTPError) -> SendError:
+        """Classifica uma falha de envio: erros de rede, 429 e 5xx valem nova tentativa."""
+        if isinstance(exc, httpx.HTTPStatusError):
+            status_code = exc.response.status_code
+            retryable = status_code == 429 or status_code >= 500
+            return SendError(f"HTTP {status_code}: {exc.response.text}", retryable, cls._retry_after(exc.response))
+        return SendError(f"{type(exc).__name__}: {exc}", retryable=True)
+
+    async def _schedule(
+        self,
+        phone: str,
+        priority: MessagePriority,
+        deliver: Callable[[], Awaitable[bool]],
+        payload: Dict,
+        wait: bool = True
+    ) -> bool:
+        """
+        Passa o envio pelo agendador de saída, quando ele está ativo neste event loop.
+
+        Com `wait=False`, retorna assim que o envio entra na fila: novas tentativas
+        e o dead letter ficam a cargo do agendador, sem prender quem chamou.
+        """
+        if self.outbound_scheduler is None or not self.outbound_scheduler.running:
+            try:
+                return await deliver()
+            except SendError:
+                return False
+        try:
+            future = self.outbound_scheduler.submit(phone, deliver, priority, payload)
+        except OutboundQueueFullError as e:
+            print(f"Dropping message to {phone}: {e}")
+            return False
+        if not wait:
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+            return True
+        return await future
+
+    async def send_message_async(
+        self,
+        phone: str,
+        message: str,
+        priority: MessagePriority = MessagePriority.REPLY,
+        wait: bool = True
+    ) -> bool:
+        """
+        Sends a message using the Meta WhatsApp Cloud API over the shared,
+        pooled HTTP client (keep-alive and HTTP/2 when available).
+        The send waits its turn in the outbound scheduler according to `priority`;
+        transient failures are retried with backoff and then dead-lettered.
+        Returns True if the API request was successful (status code 200), or,
+        with `wait=False`, as soon as the message is queued.
+        """
+        if not self.token or not self.phone_number_id:
+            print("Error: WhatsApp service not configured.")
+            return False
+
         payload = {
             "messaging_product": "whatsapp",
             "to": phone,
             "type": "text",
             "text": {"body": message}
         }
+        return await self._schedule(phone, priority, partial(self._deliver_message, phone, payload), payload, wait)
 
-        # --- DEBUG --- 
-        # print(f"DEBUG: Attempting to send message TO: {phone}, Payload: {payload}")
-        # --- END DEBUG ---
+    async def send_payload_async(
+        self,
+        phone: str,
+        payload: Dict,
+        priority: MessagePriority = MessagePriority.REPLY,
+        wait: bool = True
+    ) -> bool:
+        """
+        Sends an already built Cloud API payload, e.g. when replaying dead letters.
+        """
+        if not self.token or not self.phone_number_id:
+            print("Error: WhatsApp service not configured.")
+            return False
+        return await self._schedule(phone, priority, partial(self._deliver_message, phone, payload), payload, wait)
 
+    async def _deliver_message(self, phone: str, payload: Dict) -> bool:
         try:
-            with httpx.Client() as client:
-                response = client.post(self.api_url, headers=headers, json=payload)
-
-            response.raise_for_status()
+            response = await self._post_message(payload)
             
             if response.status_code == 200:
                 print(f"Message sent successfully to {phone}. Response: {response.json()}")
@@ -254,29 +565,41 @@ class WhatsAppService:
                 
         except httpx.RequestError as exc:
             print(f"An error occurred while requesting {exc.request.url!r}: {exc}")
-            return False
+            raise self._send_error(exc) from exc
         except httpx.HTTPStatusError as exc:
             print(f"Error response {exc.response.status_code} while requesting {exc.request.url!r}: {exc.response.text}")
-            return False
+            raise self._send_error(exc) from exc
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
             return False
 
-    def send_template_message(
+    def send_message(self, phone: str, message: str, priority: MessagePriority = MessagePriority.REPLY) -> bool:
+        """
+        Sends a message using the Meta WhatsApp Cloud API.
+        Synchronous wrapper around send_message_async for code outside the event loop.
+        """
+        return self._run_sync(self.send_message_async(phone, message, priority))
+
+    async def send_template_message_async(
         self,
         phone: str,
         template_name: str,
         language_code: str = "en_US", # Default to English US
-        components: Optional[list] = None # Optional components for templates with variables
+        components: Optional[list] = None, # Optional components for templates with variables
+        priority: MessagePriority = MessagePriority.REMINDER,
+        wait: bool = True
     ) -> bool:
         """
-        Sends a template message using the Meta WhatsApp Cloud API.
+        Sends a template message using the Meta WhatsApp Cloud API over the
+        shared, pooled HTTP client.
 
         Args:
             phone: The recipient's phone number (E.164 format recommended).
             template_name: The name of the pre-approved template.
             language_code: The language code of the template (e.g., "en_US", "pt_BR").
             components: Optional list of components for templates with variables.
+            priority: Priority class used by the outbound scheduler.
+            wait: If False, return as soon as the message is queued.
 
         Returns:
             True if the API request was successful (status code 200).
@@ -285,10 +608,6 @@ class WhatsAppService:
             print("Error: WhatsApp service not configured.")
             return False
 
-        headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json",
-        }
         payload = {
             "messaging_product": "whatsapp",
             "to": phone,
@@ -302,22 +621,64 @@ class WhatsAppService:
         if components:
             payload["template"]["components"] = components
 
+        return await self._schedule(
+            phone, priority, partial(self._deliver_template, phone, template_name, payload), payload, wait
+        )
+
+    async def _deliver_template(self, phone: str, template_name: str, payload: Dict) -> bool:
         try:
-            with httpx.Client() as client:
-                response = client.post(self.api_url, headers=headers, json=payload)
-                response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-                print(f"Template message '{template_name}' sent successfully to {phone}. Response: {response.json()}")
-                return response.status_code == 200
+            response = await self._post_message(payload)
+            print(f"Template message '{template_name}' sent successfully to {phone}. Response: {response.json()}")
+            return response.status_code == 200
         except httpx.HTTPStatusError as e:
             print(f"HTTP error sending template message '{template_name}' to {phone}: {e.response.status_code} - {e.response.text}")
-            return False
+            raise self._send_error(e) from e
         except httpx.RequestError as e:
             print(f"Request error sending template message '{template_name}' to {phone}: {e}")
-            return False
+            raise self._send_error(e) from e
         except Exception as e:
             print(f"Unexpected error sending template message '{template_name}' to {phone}: {e}")
             return False
 
+    def send_template_message(
+        self,
+        phone: str,
+        template_name: str,
+        language_code: str = "en_US",
+        components: Optional[list] = None,
+        priority: MessagePriority = MessagePriority.REMINDER
+    ) -> bool:
+        """
+        Sends a template message using the Meta WhatsApp Cloud API.
+        Synchronous wrapper around send_template_message_async.
+        """
+        return self._run_sync(
+            self.send_template_message_async(phone, template_name, language_code, components, priority)
+        )
+
+    @staticmethod
+    def appointment_template_components(patient_name: str, formatted_date_time: str) -> list:
+        """
+        Monta os componentes (variáveis) dos templates de consulta: nome do paciente e data/hora.
+        """
+        return [
+            {
+                "type": "body",
+                "parameters": [
+                    {
+                        "type": "text",
+                        "parameter_name": "paciente",
+                        "text": patient_name
+                    },
+                    {
+                        "type": "text",
+                        "parameter_name": "data",
+                        "text": formatted_date_time
+                    }
+                ]
+            }
+        ]
+
     def send_appointment_confirmation(
         self,
         phone: str,
@@ -351,23 +712,7 @@ class WhatsAppService:
             return False, []
 
         # --- Construção dos Componentes (Variáveis) --- 
-        components = [
-            {
-                "type": "body",
-                "parameters": [
-                    {
-                        "type": "text",
-                        "parameter_name": "paciente",
-                        "text": patient_name
-                    },
-                    {
-                        "type": "text",
-                        "parameter_name": "data",
-                        "text": formatted_date_time
-                    }
-                ]
-            }
-        ]
+        components = self.appointment_template_components(patient_name, formatted_date_time)
         
         # --- Envio via Template ---
         print(f"Sending template '{template_name}' to {phone} with components: {components}")
@@ -375,7 +720,8 @@ class WhatsAppService:
             phone=phone,
             template_name=template_name,
             language_code=language_code,
-            components=components
+            components=components,
+            priority=MessagePriority.CONFIRMATION
         )
 
         # Atualiza o estado da conversa se a mensagem foi enviada com sucesso
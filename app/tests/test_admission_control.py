@@ -0,0 +1,135 @@
+import asyncio
+import pytest
+from app.services.admission_control import (
+    AdmissionController,
+    Decision,
+    Priority,
+    classify_message_priority,
+)
+from app.services.conversation_state import ConversationState
+
+def test_classify_message_priority():
+    """Testa a classificação de prioridade das mensagens"""
+    assert classify_message_priority("Quero agendar uma consulta", ConversationState.INITIAL) is Priority.HIGH
+    assert classify_message_priority("Sim, confirmo", ConversationState.INITIAL) is Priority.HIGH
+    assert classify_message_priority("pode ser às 14h", ConversationState.INITIAL) is Priority.HIGH
+    assert classify_message_priority("Olá!", ConversationState.INITIAL) is Priority.LOW
+    assert classify_message_priority("👍", ConversationState.INITIAL) is Priority.LOW
+    assert classify_message_priority("Vocês atendem crianças?", ConversationState.INITIAL) is Priority.NORMAL
+    # No meio de um agendamento, qualquer resposta é prioritária
+    assert classify_message_priority("ok", ConversationState.WAITING_FOR_CONFIRMATION) is Priority.HIGH
+
+@pytest.mark.asyncio
+async def test_decisions_by_load():
+    """Testa as decisões abaixo do limite suave, entre os limites e acima do limite rígido"""
+    load = 0
+    controller = AdmissionController(soft_limit=10, hard_limit=20, max_deferred=1, load_probe=lambda: load)
+
+    assert [controller.decide(priority) for priority in Priority] == [Decision.ADMIT] * 3
+
+    load = 15
+    assert controller.decide(Priority.HIGH) is Decision.ADMIT
+    assert controller.decide(Priority.NORMAL) is Decision.ADMIT
+    assert controller.decide(Priority.LOW) is Decision.DEFER
+
+    load = 25
+    assert controller.decide(Priority.HIGH) is Decision.ADMIT
+    assert controller.decide(Priority.NORMAL) is Decision.DEFER
+    assert controller.decide(Priority.LOW) is Decision.SHED
+
+    # Com a fila de adiados cheia, o excedente é descartado
+    controller.defer("5511999999999", asyncio.sleep)
+    assert controller.decide(Priority.NORMAL) is Decision.SHED
+    # Trabalho que não pode ser adiado é admitido onde seria adiado
+    load = 15
+    assert controller.decide(Priority.LOW, deferrable=False) is Decision.ADMIT
+    load = 25
+
+    stats = controller.stats()
+    assert stats["load"] == 25
+    assert stats["decisions"]["shed"] == {"low": 1, "normal": 1}
+
+@pytest.mark.asyncio
+async def test_run_tracks_in_flight_work():
+    """Testa que o trabalho em execução entra na carga"""
+    controller = AdmissionController()
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def job():
+        started.set()
+        await release.wait()
+        return "done"
+
+    task = asyncio.create_task(controller.run(job))
+    await started.wait()
+    assert controller.load == 1
+
+    release.set()
+    assert await task == "done"
+    assert controller.load == 0
+
+@pytest.mark.asyncio
+async def test_deferred_work_resumes_when_load_drops():
+    """Testa que o trabalho adiado só é retomado abaixo do limite suave"""
+    load = 5
+    resumed = []
+    controller = AdmissionController(soft_limit=5, drain_interval=0.01, load_probe=lambda: load)
+    async def resume():
+        resumed.append("oi")
+        return "respondido"
+
+    outcome = controller.defer("5511999999999", resume)
+    await controller.start()
+
+    await asyncio.sleep(0.03)
+    assert resumed == []
+
+    load = 0
+    assert await asyncio.wait_for(outcome, 1) == "respondido"
+    await controller.stop()
+
+    assert resumed == ["oi"]
+    assert controller.stats()["resumed"] == 1
+
+@pytest.mark.asyncio
+async def test_flush_resumes_a_conversation_in_order():
+    """Testa que flush retoma na hora, e na ordem, só o trabalho adiado da conversa"""
+    resumed = []
+
+    def resume(text):
+        async def job():
+            resumed.append(text)
+        return job
+
+    controller = AdmissionController(load_probe=lambda: 500)
+    controller.defer("5511111111111", resume("oi"))
+    controller.defer("5522222222222", resume("olá"))
+    controller.defer("5511111111111", resume("tudo bem?"))
+
+    controller.flush("5511111111111")
+    await asyncio.sleep(0)
+
+    assert resumed == ["oi", "tudo bem?"]
+    assert not controller.has_deferred("5511111111111")
+    assert controller.has_deferred("5522222222222")
+    await controller.stop()
+
+@pytest.mark.asyncio
+async def test_lost_deferred_work_is_discarded():
+    """Testa que trabalho adiado que falha ao ser retomado ou sobra no encerramento não se perde em silêncio"""
+    def fail():
+        raise RuntimeError("lane cheia")
+
+    controller = AdmissionController(drain_interval=0.01, load_probe=lambda: 0)
+    failed = controller.defer("5511999999999", fail)
+    await controller.start()
+    with pytest.raises(RuntimeError, match="lane cheia"):
+        await asyncio.wait_for(failed, 1)
+
+    controller.load_probe = lambda: 500
+    pending = controller.defer("5511999999999", asyncio.sleep)
+    await controller.stop()
+
+    assert pending.cancelled()
+    assert controller.stats()["deferred"] == 0
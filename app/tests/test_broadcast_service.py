@@ -0,0 +1,189 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from app.services.broadcast_service import BroadcastInProgressError, BroadcastService
+from app.services.outbound_scheduler import MessagePriority
+
+def fake_whatsapp(results=None, scheduler=None, hang_after=None):
+    """
+    WhatsAppService falso; `results` mapeia telefone -> sucesso do envio e,
+    com `hang_after`, os envios seguintes ficam presos (simulando uma queda).
+    """
+    results = results or {}
+    sent = []
+
+    async def send(phone, template_name, language_code, components, priority):
+        if hang_after is not None and len(sent) >= hang_after:
+            await asyncio.Event().wait()
+        sent.append(phone)
+        return results.get(phone, True)
+
+    return SimpleNamespace(send_template_message_async=AsyncMock(side_effect=send), outbound_scheduler=scheduler)
+
+def recipients(count):
+    return [
+        {"phone": f"55110000000{index:02d}", "components": [{"type": "body", "parameters": [{"type": "text", "text": f"P{index}"}]}]}
+        for index in range(count)
+    ]
+
+@pytest.mark.asyncio
+async def test_run_streams_results_and_summary():
+    """Testa que cada destinatário gera um resultado e o broadcast termina com o resumo"""
+    whatsapp = fake_whatsapp({"5511000000001": False})
+    service = BroadcastService(whatsapp, path=None, concurrency=3)
+    broadcast_id = service.create("appointment_reminder", recipients(5), priority=MessagePriority.REMINDER)
+
+    results = [result async for result in service.run(broadcast_id)]
+
+    assert sorted(result["position"] for result in results[:-1]) == [0, 1, 2, 3, 4]
+    assert results[-1]["summary"] == {
+        "broadcast_id": broadcast_id, "total": 5, "queued": 0, "sent": 4, "failed": 1, "throttled": 0, "pending": 0
+    }
+    phone, template, language, components, priority = whatsapp.send_template_message_async.await_args_list[0].args
+    assert (template, language, priority) == ("appointment_reminder", "pt_BR", MessagePriority.REMINDER)
+    assert components[0]["parameters"][0]["text"] == "P0"
+    assert service.incomplete() == []
+
+@pytest.mark.asyncio
+async def test_interrupted_broadcast_resumes_where_it_stopped(tmp_path):
+    """Testa que a retomada não reenvia para quem já recebeu e atende quem ficou na fila do processo anterior"""
+    path = str(tmp_path / "broadcasts.db")
+    first_run = fake_whatsapp(hang_after=2)
+    service = BroadcastService(first_run, path=path, concurrency=1)
+    broadcast_id = service.create("appointment_reminder", recipients(5), broadcast_id="lembretes-amanha")
+
+    stream = service.run(broadcast_id)
+    assert (await stream.__anext__())["status"] == "sent"
+    assert (await stream.__anext__())["status"] == "sent"
+    await stream.aclose()  # simula a queda no meio do broadcast
+    await service.close()
+
+    second_run = fake_whatsapp()
+    restarted = BroadcastService(second_run, path=path, concurrency=2)
+    assert restarted.incomplete() == [broadcast_id]
+    # Repetir a mesma requisição não duplica o broadcast
+    assert restarted.create("appointment_reminder", recipients(5), broadcast_id="lembretes-amanha") == broadcast_id
+
+    results = [result async for result in restarted.run(broadcast_id)]
+
+    sent_before = {call.args[0] for call in first_run.send_template_message_async.await_args_list[:2]}
+    sent_after = {call.args[0] for call in second_run.send_template_message_async.await_args_list}
+    assert len(sent_after) == 3
+    assert not sent_before & sent_after
+    assert results[-1]["summary"]["sent"] == 5
+    assert results[-1]["summary"]["queued"] == 0
+    assert restarted.incomplete() == []
+
+@pytest.mark.asyncio
+async def test_client_disconnect_does_not_cancel_queued_sends():
+    """Testa que, com o cliente do stream desconectado, os envios já na fila terminam e são gravados"""
+    release = asyncio.Event()
+    sent = []
+
+    async def send(phone, template_name, language_code, components, priority):
+        await release.wait()
+        sent.append(phone)
+        return True
+
+    whatsapp = SimpleNamespace(send_template_message_async=AsyncMock(side_effect=send), outbound_scheduler=None)
+    service = BroadcastService(whatsapp, path=None, concurrency=3)
+    broadcast_id = service.create("appointment_reminder", recipients(3))
+
+    stream = service.run(broadcast_id)
+    first = asyncio.ensure_future(stream.__anext__())
+    await asyncio.sleep(0.01)
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    await stream.aclose()  # cliente desconectado com os três envios na fila
+    assert service.summary(broadcast_id)["queued"] == 3
+    assert service.incomplete() == [broadcast_id]
+
+    release.set()
+    await asyncio.sleep(0.01)
+
+    assert len(sent) == 3
+    assert service.summary(broadcast_id)["sent"] == 3
+    assert service.incomplete() == []
+
+@pytest.mark.asyncio
+async def test_queued_rows_left_by_a_crash_are_resent(tmp_path):
+    """Testa que destinatários presos na fila de um processo que caiu voltam a ser atendidos"""
+    path = str(tmp_path / "broadcasts.db")
+    crashed = BroadcastService(fake_whatsapp(), path=path)
+    broadcast_id = crashed.create("appointment_reminder", recipients(2))
+    crashed._checkpoint(broadcast_id, 0, "queued")
+    crashed._db.execute("UPDATE broadcasts SET completed_at = 1 WHERE id = ?", (broadcast_id,))
+
+    whatsapp = fake_whatsapp()
+    restarted = BroadcastService(whatsapp, path=path)
+    assert restarted.incomplete() == [broadcast_id]
+    results = [result async for result in restarted.run(broadcast_id)]
+
+    assert whatsapp.send_template_message_async.await_count == 2
+    assert results[-1]["summary"]["sent"] == 2
+
+@pytest.mark.asyncio
+async def test_full_outbound_queue_marks_recipients_throttled():
+    """Testa que, com a fila de saída cheia, os destinatários ficam para a próxima retomada"""
+    scheduler = SimpleNamespace(running=True, has_capacity=False)
+    whatsapp = fake_whatsapp(scheduler=scheduler)
+    service = BroadcastService(whatsapp, path=None, throttle_retries=0)
+    broadcast_id = service.create("clinic_notice", recipients(2), priority=MessagePriority.MARKETING)
+
+    results = [result async for result in service.run(broadcast_id)]
+
+    assert results[-1]["summary"]["throttled"] == 2
+    whatsapp.send_template_message_async.assert_not_awaited()
+    assert service.incomplete() == [broadcast_id]
+
+    scheduler.has_capacity = True
+    results = [result async for result in service.run(broadcast_id)]
+    assert results[-1]["summary"]["sent"] == 2
+
+@pytest.mark.asyncio
+async def test_throttled_recipients_are_retried_once_the_queue_drains():
+    """Testa que destinatários barrados pela fila cheia são reenviados no mesmo run, com backoff"""
+    scheduler = SimpleNamespace(running=True, has_capacity=False)
+    whatsapp = fake_whatsapp(scheduler=scheduler)
+    service = BroadcastService(whatsapp, path=None, throttle_backoff=0.01)
+    broadcast_id = service.create("clinic_notice", recipients(2), priority=MessagePriority.MARKETING)
+
+    async def drain():
+        await asyncio.sleep(0.02)
+        scheduler.has_capacity = True
+
+    drainer = asyncio.create_task(drain())
+    results = [result async for result in service.run(broadcast_id)]
+    await drainer
+
+    assert [result["status"] for result in results[:-1]] == ["sent", "sent"]
+    assert results[-1]["summary"]["sent"] == 2
+    assert service.incomplete() == []
+
+@pytest.mark.asyncio
+async def test_concurrent_run_is_rejected():
+    """Testa que o mesmo broadcast não é executado duas vezes ao mesmo tempo"""
+    service = BroadcastService(fake_whatsapp(), path=None)
+    broadcast_id = service.create("appointment_reminder", recipients(3))
+
+    stream = service.run(broadcast_id)
+    await stream.__anext__()
+    with pytest.raises(BroadcastInProgressError):
+        await service.run(broadcast_id).__anext__()
+    await stream.aclose()
+
+@pytest.mark.asyncio
+async def test_resume_incomplete_in_background(tmp_path):
+    """Testa que broadcasts interrompidos são retomados em segundo plano no startup"""
+    path = str(tmp_path / "broadcasts.db")
+    BroadcastService(fake_whatsapp(), path=path).create("appointment_reminder", recipients(2), broadcast_id="b1")
+
+    whatsapp = fake_whatsapp()
+    service = BroadcastService(whatsapp, path=path)
+    await service.resume_incomplete()
+    await next(iter(service._tasks))
+
+    assert whatsapp.send_template_message_async.await_count == 2
+    assert service.incomplete() == []
+    await service.close()
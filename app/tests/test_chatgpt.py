@@ -1,7 +1,16 @@
 import os
+import asyncio
+import httpx
 import pytest
 from unittest.mock import patch, MagicMock
-from app.services.chatgpt_service import ChatGPTService
+from openai import RateLimitError
+from app.services.chatgpt_service import ChatGPTService, LLMTimeoutError
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.llm_cache import LLMResponseCache
+from app.services.model_router import ModelRouter
+from app.services.openai_rate_scheduler import LLMPriority, OpenAIRateScheduler
+from app.models.intent import Intent
+from app.services.prompt_builder import PromptBuilder
 
 def test_chatgpt_service_initialization():
     # Test successful initialization
@@ -45,6 +54,333 @@ def test_generate_response_error_handling(mock_openai):
         
         assert "Failed to generate response from OpenAI: Test error" in str(exc_info.value)
 
+def completion(content):
+    response = MagicMock()
+    response.choices = [MagicMock()]
+    response.choices[0].message.content = content
+    return response
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_generate_response_async_success(mock_async_openai):
+    async def create(**kwargs):
+        return completion(" Test response ")
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService()
+        response = await service.generate_response_async("Test prompt", "System")
+
+    assert response == "Test response"
+    messages = mock_async_openai.return_value.chat.completions.create.call_args.kwargs["messages"]
+    assert [message["role"] for message in messages] == ["system", "user"]
+    assert service.stats()["completed"] == 1
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_generate_response_async_deadline_cancels_call(mock_async_openai):
+    cancelled = asyncio.Event()
+
+    async def create(**kwargs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService(timeout=0.01)
+        with pytest.raises(LLMTimeoutError):
+            await service.generate_response_async("Test prompt")
+
+    assert cancelled.is_set()
+    assert service.stats()["timeouts"] == 1
+    assert service.stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_async_calls_respect_concurrency_limit(mock_async_openai):
+    running = []
+    peak = []
+
+    async def create(**kwargs):
+        running.append(1)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.pop()
+        return completion("ok")
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService(max_concurrency=2)
+        responses = await asyncio.gather(*(service.generate_response_async(f"Prompt {i}") for i in range(6)))
+
+    assert responses == ["ok"] * 6
+    assert max(peak) == 2
+    assert service.stats()["waiting"] == 0
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_filter_slots_by_preference_returns_empty_on_timeout(mock_async_openai):
+    async def create(**kwargs):
+        await asyncio.sleep(10)
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    slots = [{"slot_id": "a", "start_time": "2025-05-05T09:00:00"}]
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService()
+        assert await service.filter_slots_by_preference("perto do almoço", slots, timeout=0.01) == []
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_filter_slots_by_preference_matches_common_phrasing_locally(mock_async_openai):
+    slots = [
+        {"slot_id": "a", "start_time": "2025-05-05T09:00:00"},
+        {"slot_id": "b", "start_time": "2025-05-05T15:00:00"},
+        {"slot_id": "c", "start_time": "2025-05-06T09:00:00"},
+    ]
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService()
+        matches = await service.filter_slots_by_preference("segunda de manhã", slots)
+
+    assert matches == [slots[0]]
+    mock_async_openai.return_value.chat.completions.create.assert_not_called()
+    assert service.stats()["slot_filter"]["resolved_locally"] == 1
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_filter_slots_by_preference_uses_compact_slot_numbers(mock_async_openai):
+    async def create(**kwargs):
+        return completion('{"slots": [2, 3]}')
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    slots = [
+        {"slot_id": "5b0e1a52-1111-4000-8000-000000000001", "start_time": "2025-05-05T09:00:00"},
+        {"slot_id": "5b0e1a52-1111-4000-8000-000000000002", "start_time": "2025-05-05T12:00:00"},
+        {"slot_id": "5b0e1a52-1111-4000-8000-000000000003", "start_time": "2025-05-06T12:30:00"},
+    ]
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService()
+        matches = await service.filter_slots_by_preference("perto do almoço", slots)
+
+    assert matches == slots[1:]
+    context = mock_async_openai.return_value.chat.completions.create.call_args.kwargs["messages"][1]["content"]
+    assert "2025-05-05 seg: 1=09:00 2=12:00" in context
+    assert slots[0]["slot_id"] not in context
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_filter_slots_prompt_keeps_a_stable_prefix_and_tracks_cached_tokens(mock_async_openai):
+    usages = iter([(1500, 0), (1520, 1280)])
+
+    async def create(**kwargs):
+        response = completion('{"slots": []}')
+        response.usage.prompt_tokens, response.usage.prompt_tokens_details.cached_tokens = next(usages)
+        response.usage.completion_tokens = 6
+        return response
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService()
+        await service.filter_slots_by_preference(
+            "perto do almoço", [{"slot_id": "a", "start_time": "2025-05-05T09:00:00"}]
+        )
+        await service.filter_slots_by_preference(
+            "logo cedinho", [{"slot_id": "b", "start_time": "2025-06-10T14:00:00"}]
+        )
+
+    first, second = (call.kwargs["messages"] for call in mock_async_openai.return_value.chat.completions.create.call_args_list)
+    assert first[0] == second[0]
+    assert "2025" not in first[0]["content"]
+    assert "Current date" in first[1]["content"] and first[-1]["role"] == "user"
+
+    usage = service.stats()["routes"]["filter_slots"]
+    assert usage["calls"] == 2
+    assert usage["cached_prompt_tokens"] == 1280
+    assert usage["uncached_prompt_tokens"] == 1740
+    assert usage["completion_tokens"] == 12
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_open_circuit_fails_fast(mock_async_openai):
+    async def create(**kwargs):
+        await asyncio.sleep(10)
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService(breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        for _ in range(2):
+            with pytest.raises(LLMTimeoutError):
+                await service.generate_response_async("Test prompt", timeout=0.01)
+
+        with pytest.raises(CircuitOpenError):
+            await service.generate_response_async("Test prompt", timeout=5)
+
+    assert mock_async_openai.return_value.chat.completions.create.call_count == 2
+    assert service.stats()["circuit"]["state"] == "open"
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_deadlines_spent_in_our_own_queue_do_not_open_the_circuit(mock_async_openai):
+    async def create(**kwargs):
+        return completion("Olá!")
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    scheduler = OpenAIRateScheduler(requests_per_minute=60, tokens_per_minute=10**6, burst_seconds=1)
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService(rate_scheduler=scheduler, breaker=CircuitBreaker(failure_threshold=2))
+        results = await asyncio.gather(
+            *(service.generate_response_async(f"Pergunta {index}", timeout=0.05) for index in range(5)),
+            return_exceptions=True
+        )
+
+    assert sum(isinstance(result, LLMTimeoutError) for result in results) == 4
+    assert service.stats()["circuit"]["state"] == "closed"
+    assert mock_async_openai.return_value.chat.completions.create.call_count == 1
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_slow_call_is_hedged_on_second_model(mock_async_openai):
+    async def create(**kwargs):
+        if kwargs["model"] == "backup-model":
+            return completion("backup answer")
+        await asyncio.sleep(10)
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService(hedge_model="backup-model", hedge_delay=0.01)
+        response = await service.generate_response_async("Test prompt", timeout=1)
+
+    assert response == "backup answer"
+    assert service.stats()["hedged"] == 1
+    assert service.stats()["hedge_wins"] == 1
+    assert service.stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_tasks_are_routed_to_their_models(mock_async_openai):
+    async def create(**kwargs):
+        if kwargs.get("tools"):
+            return tool_call('{"intent": "other", "reply": "Olá!"}')
+        return completion("Olá!")
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    router = ModelRouter.from_config("large-model", "small-model", extraction_max_tokens=80)
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService(router=router)
+        await service.generate_response_async("Me conta sobre nutrição esportiva")
+        await service.extract_intent("Oi")
+
+    conversation, extraction = (call.kwargs for call in mock_async_openai.return_value.chat.completions.create.call_args_list)
+    assert (conversation["model"], conversation["max_tokens"], conversation["temperature"]) == ("large-model", 150, 0.7)
+    assert (extraction["model"], extraction["max_tokens"], extraction["temperature"]) == ("small-model", 80, 0.0)
+    routes = service.stats()["routes"]
+    assert routes["conversation"]["calls"] == routes["extract_intent"]["calls"] == 1
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_rate_limited_call_waits_and_retries(mock_async_openai):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    responses = [
+        RateLimitError("Rate limit reached", response=httpx.Response(429, headers={"retry-after": "0.05"}, request=request), body=None),
+        tool_call('{"intent": "confirmation", "confirmation": true, "reply": "Consulta confirmada!"}'),
+    ]
+    async def create(**kwargs):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    scheduler = OpenAIRateScheduler(requests_per_minute=6000, tokens_per_minute=10**6)
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService(rate_scheduler=scheduler)
+        extraction = await service.extract_intent("Oi", priority=LLMPriority.CONFIRMATION)
+
+    assert extraction.intent == Intent.CONFIRMATION
+    stats = service.stats()
+    assert stats["rate_limited"] == 1
+    assert stats["rate_limits"]["pauses"] == 1
+    assert stats["rate_limits"]["granted"]["CONFIRMATION"] == 2
+    assert stats["rate_limits"]["avg_wait_ms"]["CONFIRMATION"] >= 20
+    assert stats["circuit"]["state"] == "closed"
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_generate_response_async_uses_cache(mock_async_openai):
+    async def create(**kwargs):
+        return completion("Claro! Qual data?")
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService(cache=LLMResponseCache())
+        first = await service.generate_response_async("Quero agendar", "System")
+        second = await service.generate_response_async("  quero   AGENDAR ", "System")
+        await service.generate_response_async("Quero agendar", "System", cache=False)
+
+    assert first == second == "Claro! Qual data?"
+    assert mock_async_openai.return_value.chat.completions.create.call_count == 2
+    assert service.cache.stats()["hits"] == 1
+
+@patch('app.services.chatgpt_service.OpenAI')
+def test_analyze_patient_type_uses_cache(mock_openai):
+    mock_openai.return_value.chat.completions.create.return_value = completion(
+        '{"type": "insurance", "insurance_name": "unimed", "confidence": 0.9}'
+    )
+
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService(cache=LLMResponseCache())
+        assert service.analyze_patient_type("Aceita Unimed?")["insurance_name"] == "unimed"
+        assert service.analyze_patient_type("aceita unimed?")["insurance_name"] == "unimed"
+        service.analyze_patient_type("aceita unimed?", cache=False)
+
+    assert mock_openai.return_value.chat.completions.create.call_count == 2
+
+def tool_call(arguments):
+    response = MagicMock()
+    response.choices = [MagicMock()]
+    response.choices[0].message.content = None
+    response.choices[0].message.tool_calls = [MagicMock()]
+    response.choices[0].message.tool_calls[0].function.arguments = arguments
+    return response
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_extract_intent_returns_validated_fields(mock_async_openai):
+    async def create(**kwargs):
+        return tool_call('{"intent": "date", "date": "2024-05-01", "reply": "Vou verificar."}')
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService(cache=LLMResponseCache())
+        extraction = await service.extract_intent("No feriado de maio", PromptBuilder("System"))
+        cached = await service.extract_intent("no feriado de MAIO", PromptBuilder("System"))
+
+    assert extraction == cached
+    assert (extraction.intent, extraction.date, extraction.reply) == (Intent.DATE, "2024-05-01", "Vou verificar.")
+    assert extraction.confidence == 1.0
+    kwargs = mock_async_openai.return_value.chat.completions.create.call_args.kwargs
+    assert kwargs["tool_choice"]["function"]["name"] == "record_intent"
+    assert kwargs["max_tokens"] <= 150
+    assert mock_async_openai.return_value.chat.completions.create.call_count == 1
+
+@pytest.mark.asyncio
+@patch('app.services.chatgpt_service.AsyncOpenAI')
+async def test_extract_intent_rejects_invalid_arguments(mock_async_openai):
+    async def create(**kwargs):
+        return tool_call('{"intent": "agendar", "reply": "Ok"}')
+    mock_async_openai.return_value.chat.completions.create.side_effect = create
+
+    with patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"}):
+        service = ChatGPTService(cache=LLMResponseCache())
+        extraction = await service.extract_intent("Quero agendar", PromptBuilder("System"))
+
+    assert extraction.intent == Intent.OTHER
+    assert extraction.reply is None
+    assert service.stats()["invalid_extractions"] == 1
+    assert service.cache.stats()["size"] == 0
+
 # Fixture for the real ChatGPT service
 @pytest.fixture
 def real_chatgpt_service(use_real_api):
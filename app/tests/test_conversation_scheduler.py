@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from app.services.conversation_scheduler import ConversationScheduler, LaneLimitError
+
+@pytest_asyncio.fixture
+async def scheduler():
+    """Fixture que inicia e encerra um agendador para cada teste"""
+    scheduler = ConversationScheduler(workers=4, max_lanes=3, max_lane_depth=5, idle_ttl=60)
+    await scheduler.start()
+    yield scheduler
+    await scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_same_phone_runs_in_order(scheduler):
+    """Testa que as tarefas de um mesmo telefone são executadas em série e em ordem"""
+    order = []
+    running = []
+
+    async def job(index):
+        running.append(index)
+        assert len(running) == 1
+        await asyncio.sleep(0.005 * (5 - index))
+        order.append(index)
+        running.remove(index)
+
+    futures = [scheduler.submit("5511999999999", lambda i=i: job(i)) for i in range(5)]
+    await asyncio.gather(*futures)
+
+    assert order == [0, 1, 2, 3, 4]
+
+@pytest.mark.asyncio
+async def test_different_phones_run_in_parallel(scheduler):
+    """Testa que telefones diferentes são atendidos em paralelo pelo pool"""
+    gate = asyncio.Event()
+    started = []
+
+    async def job(phone):
+        started.append(phone)
+        await gate.wait()
+
+    futures = [scheduler.submit(phone, lambda p=phone: job(p)) for phone in ("a", "b", "c")]
+    await asyncio.sleep(0.01)
+    assert sorted(started) == ["a", "b", "c"]
+
+    gate.set()
+    await asyncio.gather(*futures)
+
+@pytest.mark.asyncio
+async def test_lane_limits(scheduler):
+    """Testa os limites de lanes e de tarefas pendentes por lane"""
+    gate = asyncio.Event()
+
+    async def job():
+        await gate.wait()
+
+    futures = [scheduler.submit(phone, job) for phone in ("a", "b", "c")]
+    await asyncio.sleep(0)
+    with pytest.raises(LaneLimitError):
+        scheduler.submit("d", job)
+
+    futures += [scheduler.submit("a", job) for _ in range(5)]
+    with pytest.raises(LaneLimitError):
+        scheduler.submit("a", job)
+
+    gate.set()
+    await asyncio.gather(*futures)
+    assert scheduler.stats()["rejected"] == 2
+
+@pytest.mark.asyncio
+async def test_idle_lanes_are_reclaimed(scheduler):
+    """Testa que lanes ociosas são recolhidas para abrir espaço a novas conversas"""
+    async def job():
+        return "ok"
+
+    for phone in ("a", "b", "c"):
+        assert await scheduler.submit(phone, job) == "ok"
+
+    assert await scheduler.submit("d", job) == "ok"
+    stats = scheduler.stats()
+    assert stats["reclaimed"] == 3
+    assert stats["lanes"] == 1
+    assert stats["busiest_lanes"][0]["processed"] == 1
@@ -0,0 +1,30 @@
+from app.services.dead_letter_store import DeadLetterStore
+
+def test_add_list_and_replay(tmp_path):
+    """Testa o registro, a listagem e a marcação de reenvio"""
+    store = DeadLetterStore(path=str(tmp_path / "dead_letters.db"))
+    first = store.add("5511111111111", 1, {"type": "text", "text": {"body": "Olá"}}, "HTTP 503", 5)
+    second = store.add("5522222222222", 2, {"type": "template"}, "HTTP 400", 1)
+
+    entries = store.list()
+    assert [entry["id"] for entry in entries] == [first, second]
+    assert entries[0]["payload"]["text"]["body"] == "Olá"
+    assert entries[0]["attempts"] == 5
+
+    store.mark_replayed([first])
+    assert [entry["id"] for entry in store.list()] == [second]
+    assert len(store.list(include_replayed=True)) == 2
+    assert store.get([first, second]) == store.list()
+    assert store.stats() == {"pending": 1, "added": 2, "replayed": 1, "persistent": True}
+    store.close()
+
+def test_entries_survive_restart(tmp_path):
+    """Testa que os registros persistem entre reinícios"""
+    path = str(tmp_path / "dead_letters.db")
+    store = DeadLetterStore(path=path)
+    store.add("5511111111111", 0, {"type": "text"}, "ConnectError", 5)
+    store.close()
+
+    reopened = DeadLetterStore(path=path)
+    assert reopened.count() == 1
+    reopened.close()
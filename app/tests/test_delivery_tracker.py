@@ -0,0 +1,50 @@
+import json
+from app.services.delivery_tracker import DeliveryTracker, is_status_only_payload
+
+def status_body(*statuses):
+    """Monta o corpo bruto de uma notificação de status"""
+    return json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"statuses": [
+            {"id": message_id, "status": status, "recipient_id": "5511999999999"}
+            for message_id, status in statuses
+        ]}}]}]
+    }, separators=(",", ":")).encode()
+
+def test_classifies_status_only_payloads():
+    """Testa a classificação do corpo bruto do webhook"""
+    message_body = json.dumps({"entry": [{"changes": [{"value": {
+        "messages": [{"id": "wamid.1", "type": "text", "text": {"body": '"statuses"'}}]
+    }}]}]}).encode()
+
+    assert is_status_only_payload(status_body(("wamid.1", "read"))) is True
+    assert is_status_only_payload(message_body) is False
+
+def test_records_last_status_per_message():
+    """Testa que o último status de cada mensagem e os contadores são registrados"""
+    tracker = DeliveryTracker()
+
+    assert tracker.record(status_body(("wamid.1", "sent"), ("wamid.2", "sent"))) == 2
+    tracker.record(status_body(("wamid.1", "delivered")))
+    tracker.record(status_body(("wamid.1", "read")))
+
+    assert tracker.get_status("wamid.1") == "read"
+    assert tracker.get_status("wamid.2") == "sent"
+    assert tracker.stats()["statuses"] == {"sent": 2, "delivered": 1, "read": 1}
+
+def test_disabled_tracker_only_counts():
+    """Testa que com o registro desabilitado as notificações são apenas descartadas"""
+    tracker = DeliveryTracker(enabled=False)
+
+    assert tracker.record(status_body(("wamid.1", "read"))) == 0
+    assert tracker.get_status("wamid.1") is None
+    assert tracker.stats()["dropped"] == 1
+
+def test_tracked_messages_are_bounded():
+    """Testa que apenas as mensagens mais recentes são guardadas"""
+    tracker = DeliveryTracker(max_entries=2)
+
+    tracker.record(status_body(("a", "sent"), ("b", "sent"), ("c", "sent")))
+
+    assert tracker.get_status("a") is None
+    assert tracker.stats()["tracked_messages"] == 2
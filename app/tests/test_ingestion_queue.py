@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+from app.services.ingestion_queue import IngestionQueue
+
+@pytest.mark.asyncio
+async def test_workers_drain_queue(tmp_path):
+    """Testa que os workers processam todos os payloads enfileirados"""
+    received = []
+
+    async def handler(body):
+        received.append(body)
+
+    queue = IngestionQueue(handler, workers=2, spool_path=str(tmp_path / "spool.db"))
+    await queue.start()
+    for index in range(5):
+        assert queue.enqueue(f"payload-{index}".encode())
+    await queue._queue.join()
+    await queue.stop()
+
+    assert sorted(received) == [f"payload-{index}".encode() for index in range(5)]
+    stats = queue.stats()
+    assert stats["processed"] == 5
+    assert stats["depth"] == 0
+
+@pytest.mark.asyncio
+async def test_enqueue_drops_when_full():
+    """Testa o descarte de payloads quando a fila atinge a profundidade máxima"""
+    blocker = asyncio.Event()
+
+    async def handler(body):
+        await blocker.wait()
+
+    queue = IngestionQueue(handler, workers=1, max_depth=2, spool_path=None)
+    await queue.start()
+    results = [queue.enqueue(b"{}") for _ in range(4)]
+    blocker.set()
+    await queue.stop()
+
+    assert results[:2] == [True, True]
+    assert results[-1] is False
+    assert queue.stats()["dropped"] >= 1
+
+@pytest.mark.asyncio
+async def test_pending_payloads_survive_restart(tmp_path):
+    """Testa que payloads não processados são recuperados do spool após um restart"""
+    spool_path = str(tmp_path / "spool.db")
+
+    async def never_finishes(body):
+        await asyncio.Event().wait()
+
+    queue = IngestionQueue(never_finishes, workers=1, spool_path=spool_path)
+    await queue.start()
+    queue.enqueue(b"first")
+    queue.enqueue(b"second")
+    await asyncio.sleep(0)
+    await queue.stop()
+
+    received = []
+
+    async def handler(body):
+        received.append(body)
+
+    restarted = IngestionQueue(handler, workers=1, spool_path=spool_path)
+    await restarted.start()
+    await restarted._queue.join()
+    await restarted.stop()
+
+    assert received == [b"first", b"second"]
+    assert restarted.stats()["recovered"] == 2
+
+@pytest.mark.asyncio
+async def test_payload_with_pending_work_stays_spooled(tmp_path):
+    """Testa que o payload com trabalho adiado só sai do spool quando ele termina, e fica se for descartado"""
+    spool_path = str(tmp_path / "spool.db")
+    loop = asyncio.get_running_loop()
+    pending = {b"done": loop.create_future(), b"discarded": loop.create_future()}
+
+    async def handler(body):
+        return pending[body]
+
+    queue = IngestionQueue(handler, workers=1, spool_path=spool_path)
+    await queue.start()
+    queue.enqueue(b"done")
+    queue.enqueue(b"discarded")
+    await queue._queue.join()
+    assert queue.stats()["held"] == 2
+    assert len(queue._pending_rows()) == 2
+
+    pending[b"done"].set_result(None)
+    pending[b"discarded"].cancel()
+    await asyncio.sleep(0)
+    assert queue.stats()["held"] == 0
+    assert [body for _, body in queue._pending_rows()] == [b"discarded"]
+    await queue.stop()
+
+@pytest.mark.asyncio
+async def test_enqueue_spools_without_awaiting_the_handler(tmp_path):
+    """Testa que o enfileiramento grava no spool e retorna sem esperar o processamento"""
+    started = asyncio.Event()
+    blocker = asyncio.Event()
+
+    async def handler(body):
+        started.set()
+        await blocker.wait()
+
+    queue = IngestionQueue(handler, workers=1, spool_path=str(tmp_path / "spool.db"))
+    await queue.start()
+    body = b'{"object": "whatsapp_business_account", "entry": []}'
+
+    assert queue.enqueue(body) is True
+    assert not started.is_set()
+    assert [spooled for _, spooled in queue._pending_rows()] == [body]
+
+    await asyncio.wait_for(started.wait(), 1)
+    blocker.set()
+    await queue._queue.join()
+    await queue.stop()
+    assert queue._pending_rows() == []
@@ -0,0 +1,86 @@
+import pytest
+from datetime import date
+from app.models.intent import Intent
+from app.services.conversation_state import ConversationState
+from app.services.intent_extractor import IntentExtractor
+
+# Sexta-feira, 15 de março de 2024
+TODAY = date(2024, 3, 15)
+
+@pytest.fixture
+def extractor():
+    """Fixture com os convênios aceitos pela clínica"""
+    return IntentExtractor(["unimed", "bradesco", "porto seguro", "intermédica"])
+
+@pytest.mark.parametrize("text, expected", [
+    ("hoje", "2024-03-15"),
+    ("Amanhã", "2024-03-16"),
+    ("depois de amanhã", "2024-03-17"),
+    ("pode ser terça-feira?", "2024-03-19"),
+    ("sexta", "2024-03-22"),
+    ("dia 20", "2024-03-20"),
+    ("dia 10", "2024-04-10"),
+    ("20/03", "2024-03-20"),
+    ("01/02/25", "2025-02-01"),
+    ("15 de maio", "2024-05-15"),
+    ("dia 2 de janeiro", "2025-01-02"),
+])
+def test_extracts_common_dates(extractor, text, expected):
+    """Testa as formas mais comuns de mencionar datas"""
+    result = extractor.extract(text, today=TODAY)
+
+    assert result.intent == Intent.DATE
+    assert result.date == expected
+    assert extractor.is_confident(result)
+
+@pytest.mark.parametrize("text, expected", [
+    ("14:30", "14:30"),
+    ("às 10h", "10:00"),
+    ("10h30", "10:30"),
+    ("às 3 da tarde", "15:00"),
+])
+def test_extracts_common_times(extractor, text, expected):
+    """Testa as formas mais comuns de mencionar horários"""
+    result = extractor.extract(text, ConversationState.WAITING_FOR_TIME, today=TODAY)
+
+    assert result.intent == Intent.TIME
+    assert result.time == expected
+    assert extractor.is_confident(result)
+
+def test_date_and_time_together(extractor):
+    """Testa que data e horário na mesma mensagem são extraídos juntos"""
+    result = extractor.extract("Quero agendar para amanhã às 14h", today=TODAY)
+
+    assert result.intent == Intent.DATE
+    assert (result.date, result.time) == ("2024-03-16", "14:00")
+
+def test_insurance_and_private(extractor):
+    """Testa convênios aceitos, desconhecidos e consulta particular"""
+    accepted = extractor.extract("Tenho Porto Seguro", today=TODAY)
+    assert (accepted.intent, accepted.insurance) == (Intent.INSURANCE, "porto seguro")
+    assert extractor.extract("Atende Intermedica?", today=TODAY).insurance == "intermédica"
+    assert extractor.extract("quero particular", today=TODAY).intent == Intent.PRIVATE
+
+    unknown = extractor.extract("tenho convênio da empresa", today=TODAY)
+    assert unknown.intent == Intent.INSURANCE
+    assert not extractor.is_confident(unknown)
+
+def test_confirmation_depends_on_state(extractor):
+    """Testa que confirmações só são aceitas localmente aguardando confirmação"""
+    waiting = extractor.extract("Sim, pode confirmar", ConversationState.WAITING_FOR_CONFIRMATION, today=TODAY)
+    assert waiting.intent == Intent.CONFIRMATION
+    assert extractor.is_confident(waiting)
+
+    assert not extractor.is_confident(extractor.extract("sim", today=TODAY))
+    assert extractor.extract(
+        "não, quero mudar", ConversationState.WAITING_FOR_CONFIRMATION, today=TODAY
+    ).intent == Intent.OTHER
+
+def test_ambiguous_messages_go_to_chatgpt(extractor):
+    """Testa que perguntas abertas não são resolvidas localmente"""
+    for text in ("Olá, bom dia", "Quanto custa uma consulta hoje?", "Vocês atendem crianças?"):
+        assert not extractor.is_confident(extractor.extract(text, today=TODAY))
+
+    stats = extractor.stats()
+    assert stats["resolved_locally"] == 0
+    assert stats["llm_fallbacks"] == 3
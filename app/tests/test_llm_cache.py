@@ -0,0 +1,67 @@
+import pytest
+from unittest.mock import patch
+from app.services.llm_cache import LLMResponseCache
+from app.services.text_normalization import normalize
+
+def test_normalize_prompt_ignores_case_accents_and_spaces():
+    """Testa que variações de caixa, acentos e espaços caem na mesma chave"""
+    assert normalize("  Quanto   CUSTA a consulta?\n") == "quanto custa a consulta?"
+    assert normalize("Aceita Unimed? Não sei") == normalize("aceita unimed?  nao sei")
+    assert LLMResponseCache.key("Quero agendar", "sistema", "gpt") == LLMResponseCache.key("quero  agendar", "sistema", "gpt")
+
+def test_key_depends_on_system_message_and_model():
+    """Testa que a mensagem de sistema e o modelo fazem parte da chave"""
+    key = LLMResponseCache.key("quero agendar", "sistema", "gpt")
+
+    assert key != LLMResponseCache.key("quero agendar", "outro sistema", "gpt")
+    assert key != LLMResponseCache.key("quero agendar", "sistema", "outro-modelo")
+
+def test_hits_report_saved_latency():
+    """Testa que cada acerto contabiliza a latência da chamada original"""
+    cache = LLMResponseCache()
+    key = cache.key("quero agendar", None, "gpt")
+
+    assert cache.get(key) is None
+    cache.put(key, "Claro!", 1.5)
+    assert cache.get(key) == "Claro!"
+    assert cache.get(key) == "Claro!"
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["hit_rate"] == pytest.approx(2 / 3, abs=1e-3)
+    assert stats["saved_seconds"] == pytest.approx(3.0)
+
+def test_entries_expire_after_ttl():
+    """Testa que respostas expiradas não são reaproveitadas"""
+    cache = LLMResponseCache(ttl=10)
+
+    with patch('app.services.llm_cache.time.time', return_value=1000.0):
+        cache.put("k", "resposta", 1.0)
+    with patch('app.services.llm_cache.time.time', return_value=1011.0):
+        assert cache.get("k") is None
+    assert cache.stats()["size"] == 0
+
+def test_cache_is_bounded():
+    """Testa que o cache em memória descarta as respostas menos usadas"""
+    cache = LLMResponseCache(max_entries=2)
+    cache.put("a", "A", 1.0)
+    cache.put("b", "B", 1.0)
+    cache.get("a")
+    cache.put("c", "C", 1.0)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+
+def test_disk_tier_survives_restart(tmp_path):
+    """Testa que o cache em disco sobrevive a um restart e volta para a memória"""
+    path = str(tmp_path / "llm_cache.db")
+    cache = LLMResponseCache(persist_path=path)
+    cache.put("k", "resposta", 2.0)
+    cache.close()
+
+    restarted = LLMResponseCache(persist_path=path)
+    assert restarted.get("k") == "resposta"
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.get("k") == "resposta"
+    assert restarted.stats()["disk_hits"] == 1
+    restarted.close()
@@ -0,0 +1,115 @@
+import asyncio
+import base64
+import hashlib
+import os
+import httpx
+import pytest
+from types import SimpleNamespace
+from app.services.media_service import MediaIntegrityError, MediaService, MediaTooLargeError, normalize_sha256
+
+CONTENT = b"carteirinha" * 10000
+
+def fake_whatsapp(content=CONTENT, sha256=None, file_size=None, delay=0.0):
+    """WhatsAppService falso: endpoint de mídia e download servidos por um MockTransport"""
+    calls = {"info": 0, "download": 0}
+
+    async def handler(request):
+        calls["download"] += 1
+        await asyncio.sleep(delay)
+        return httpx.Response(200, content=content)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def get_media_info(media_id):
+        calls["info"] += 1
+        return {
+            "url": f"https://lookaside.fbsbx.com/{media_id}",
+            "mime_type": "image/jpeg",
+            "sha256": sha256 if sha256 is not None else hashlib.sha256(content).hexdigest(),
+            "file_size": file_size if file_size is not None else len(content),
+        }
+
+    return SimpleNamespace(
+        get_media_info=get_media_info,
+        stream_media=lambda url: client.stream("GET", url),
+        calls=calls,
+    )
+
+def stored_files(root):
+    return sorted(os.path.relpath(os.path.join(dirpath, name), root)
+                  for dirpath, _, names in os.walk(root) for name in names)
+
+@pytest.mark.asyncio
+async def test_fetch_streams_to_content_addressed_path(tmp_path):
+    """Testa que a mídia é gravada em blocos no caminho endereçado pelo hash"""
+    service = MediaService(fake_whatsapp(), storage_dir=str(tmp_path), chunk_size=1024)
+
+    media = await service.fetch("media.1")
+
+    digest = hashlib.sha256(CONTENT).hexdigest()
+    assert media.sha256 == digest
+    assert media.path == os.path.join(str(tmp_path), digest[:2], f"{digest}.jpg")
+    assert media.size == len(CONTENT)
+    with open(media.path, "rb") as file:
+        assert file.read() == CONTENT
+    assert stored_files(tmp_path) == [os.path.join(digest[:2], f"{digest}.jpg")]
+    assert service.stats()["bytes_downloaded"] == len(CONTENT)
+
+@pytest.mark.asyncio
+async def test_same_content_is_stored_once(tmp_path):
+    """Testa que o mesmo conteúdo é armazenado uma vez e, com o hash conhecido, nem é baixado"""
+    whatsapp = fake_whatsapp()
+    service = MediaService(whatsapp, storage_dir=str(tmp_path))
+    first = await service.fetch("media.1")
+
+    second = await service.fetch("media.2", mime_type="image/jpeg")
+    assert second.path == first.path
+    assert second.deduplicated
+    assert whatsapp.calls["download"] == 1
+
+    third = await service.fetch("media.3", sha256=first.sha256, mime_type="image/jpeg")
+    assert third.deduplicated
+    assert whatsapp.calls["info"] == 2
+    assert len(stored_files(tmp_path)) == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_fetches_share_the_download(tmp_path):
+    """Testa que pedidos simultâneos da mesma mídia compartilham um único download"""
+    whatsapp = fake_whatsapp(delay=0.01)
+    service = MediaService(whatsapp, storage_dir=str(tmp_path))
+
+    results = await asyncio.gather(*(service.fetch("media.1") for _ in range(5)))
+
+    assert len({media.path for media in results}) == 1
+    assert whatsapp.calls["download"] == 1
+    assert service.stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_hash_mismatch_leaves_no_file(tmp_path):
+    """Testa que conteúdo que não confere com o hash da Meta é descartado"""
+    service = MediaService(fake_whatsapp(sha256="0" * 64), storage_dir=str(tmp_path))
+
+    with pytest.raises(MediaIntegrityError):
+        await service.fetch("media.1")
+    assert stored_files(tmp_path) == []
+    assert service.stats()["failed"] == 1
+
+@pytest.mark.asyncio
+async def test_oversized_media_is_rejected(tmp_path):
+    """Testa que mídias acima do limite são recusadas, mesmo se o tamanho informado mentir"""
+    with pytest.raises(MediaTooLargeError):
+        await MediaService(fake_whatsapp(), storage_dir=str(tmp_path), max_bytes=1000).fetch("media.1")
+
+    service = MediaService(fake_whatsapp(file_size=10), storage_dir=str(tmp_path), max_bytes=1000, chunk_size=100)
+    with pytest.raises(MediaTooLargeError):
+        await service.fetch("media.2")
+    assert stored_files(tmp_path) == []
+
+def test_normalize_sha256_accepts_hex_and_base64():
+    """Testa a normalização do hash informado pela Meta"""
+    digest = hashlib.sha256(CONTENT)
+
+    assert normalize_sha256(digest.hexdigest().upper()) == digest.hexdigest()
+    assert normalize_sha256(base64.b64encode(digest.digest()).decode()) == digest.hexdigest()
+    assert normalize_sha256("abc") is None
+    assert normalize_sha256(None) is None
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from app.services.message_coalescer import MessageCoalescer
+
+def recording_dispatch(dispatched):
+    """Cria uma função de despacho que registra o texto agrupado"""
+    def dispatch(text):
+        dispatched.append(text)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(text)
+        return future
+    return dispatch
+
+@pytest.mark.asyncio
+async def test_burst_is_merged_after_window():
+    """Testa que mensagens dentro da janela são unidas em um único despacho"""
+    dispatched = []
+    coalescer = MessageCoalescer(window=0.02, max_wait=1.0)
+
+    futures = [
+        coalescer.submit("5511999999999", text, recording_dispatch(dispatched))
+        for text in ("oi", "queria marcar", "amanhã de manhã")
+    ]
+    results = await asyncio.gather(*futures)
+
+    assert dispatched == ["oi\nqueria marcar\namanhã de manhã"]
+    assert results == [dispatched[0]] * 3
+    stats = coalescer.stats()
+    assert stats["batches"] == 1
+    assert stats["turns_saved"] == 2
+
+@pytest.mark.asyncio
+async def test_punctuation_flushes_early():
+    """Testa que pontuação final libera a rajada sem esperar a janela"""
+    dispatched = []
+    coalescer = MessageCoalescer(window=10, max_wait=10)
+
+    coalescer.submit("5511999999999", "oi", recording_dispatch(dispatched))
+    future = coalescer.submit("5511999999999", "aceita unimed?", recording_dispatch(dispatched))
+
+    assert await asyncio.wait_for(future, timeout=1) == "oi\naceita unimed?"
+    assert coalescer.stats()["flush_reasons"] == {"punctuation": 1}
+
+@pytest.mark.asyncio
+async def test_max_wait_bounds_latency():
+    """Testa que uma rajada contínua é liberada ao atingir o tempo máximo"""
+    dispatched = []
+    coalescer = MessageCoalescer(window=0.05, max_wait=0.08)
+
+    first = coalescer.submit("5511999999999", "um", recording_dispatch(dispatched))
+    await asyncio.sleep(0.04)
+    coalescer.submit("5511999999999", "dois", recording_dispatch(dispatched))
+    await asyncio.wait_for(first, timeout=0.07)
+
+    assert dispatched == ["um\ndois"]
+    assert coalescer.stats()["flush_reasons"] == {"max_wait": 1}
+
+@pytest.mark.asyncio
+async def test_patients_are_coalesced_separately():
+    """Testa que pacientes diferentes não são misturados"""
+    dispatched = []
+    coalescer = MessageCoalescer(window=0.01)
+
+    await asyncio.gather(
+        coalescer.submit("a", "oi", recording_dispatch(dispatched)),
+        coalescer.submit("b", "olá", recording_dispatch(dispatched)),
+    )
+
+    assert sorted(dispatched) == ["oi", "olá"]
+
+@pytest.mark.asyncio
+async def test_zero_window_dispatches_immediately():
+    """Testa que a janela zero desativa o agrupamento"""
+    dispatched = []
+    coalescer = MessageCoalescer(window=0)
+
+    await coalescer.submit("a", "oi", recording_dispatch(dispatched))
+    await coalescer.submit("a", "tudo bem", recording_dispatch(dispatched))
+
+    assert dispatched == ["oi", "tudo bem"]
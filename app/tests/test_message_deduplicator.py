@@ -0,0 +1,75 @@
+import pytest
+from unittest.mock import patch
+from app.services.message_deduplicator import MessageDeduplicator
+
+def test_claim_detects_redelivery():
+    """Testa que o mesmo id só é aceito uma vez"""
+    deduplicator = MessageDeduplicator()
+
+    assert deduplicator.claim("wamid.1") is True
+    assert deduplicator.claim("wamid.1") is False
+    assert deduplicator.claim("wamid.2") is True
+
+    stats = deduplicator.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == pytest.approx(1 / 3, abs=1e-3)
+
+def test_missing_id_is_always_processed():
+    """Testa que mensagens sem id nunca são descartadas"""
+    deduplicator = MessageDeduplicator()
+
+    assert deduplicator.claim(None) is True
+    assert deduplicator.claim(None) is True
+
+def test_ids_expire_after_ttl():
+    """Testa que um id volta a ser aceito depois do TTL"""
+    deduplicator = MessageDeduplicator(ttl=10)
+
+    with patch('app.services.message_deduplicator.time.time', return_value=1000.0):
+        assert deduplicator.claim("wamid.1") is True
+    with patch('app.services.message_deduplicator.time.time', return_value=1011.0):
+        assert deduplicator.claim("wamid.1") is True
+
+def test_cache_is_bounded():
+    """Testa que o cache em memória descarta os ids mais antigos"""
+    deduplicator = MessageDeduplicator(max_entries=2)
+
+    for message_id in ("a", "b", "c"):
+        deduplicator.claim(message_id)
+
+    assert deduplicator.stats()["size"] == 2
+    assert deduplicator.claim("a") is True
+
+def test_release_allows_reprocessing():
+    """Testa que um id liberado após uma falha volta a ser processado"""
+    deduplicator = MessageDeduplicator()
+
+    deduplicator.claim("wamid.1")
+    deduplicator.release("wamid.1")
+
+    assert deduplicator.claim("wamid.1") is True
+
+def test_persistent_store_survives_restart(tmp_path):
+    """Testa que os ids vistos sobrevivem a um restart com persistência habilitada"""
+    path = str(tmp_path / "dedupe.db")
+    deduplicator = MessageDeduplicator(persist_path=path)
+    deduplicator.claim("wamid.1")
+    deduplicator.confirm("wamid.1")
+    deduplicator.close()
+
+    restarted = MessageDeduplicator(persist_path=path)
+    assert restarted.claim("wamid.1") is False
+    restarted.close()
+
+def test_unconfirmed_claim_is_not_persisted(tmp_path):
+    """Testa que uma mensagem interrompida por um crash é aceita de novo após o restart"""
+    path = str(tmp_path / "dedupe.db")
+    deduplicator = MessageDeduplicator(persist_path=path)
+    assert deduplicator.claim("wamid.1") is True
+    assert deduplicator.claim("wamid.1") is False
+    deduplicator.close()
+
+    restarted = MessageDeduplicator(persist_path=path)
+    assert restarted.claim("wamid.1") is True
+    restarted.close()
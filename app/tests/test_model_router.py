@@ -0,0 +1,41 @@
+import pytest
+from types import SimpleNamespace
+from app.services.model_router import ModelRoute, ModelRouter
+
+def test_structured_tasks_use_the_small_model():
+    """Testa que só a conversa livre usa o modelo maior"""
+    router = ModelRouter.from_config("gpt-4o", "gpt-4o-mini", extraction_max_tokens=100)
+
+    assert router.route("conversation") == ModelRoute("gpt-4o", max_tokens=150, temperature=0.7)
+    assert router.route("extract_intent") == ModelRoute("gpt-4o-mini", max_tokens=100, temperature=0.0)
+    assert router.route("filter_slots").model == "gpt-4o-mini"
+    assert router.route("analyze_patient_type").model == "gpt-4o-mini"
+    assert router.route("unknown_task") == router.route("conversation")
+
+def test_overrides_adjust_single_fields():
+    """Testa os ajustes por tarefa vindos da configuração"""
+    router = ModelRouter.from_config(
+        "gpt-4o", "gpt-4o-mini", overrides='{"filter_slots": {"model": "gpt-4o", "max_tokens": 300}}'
+    )
+
+    assert router.route("filter_slots") == ModelRoute("gpt-4o", max_tokens=300, temperature=0.2)
+
+    with pytest.raises(ValueError):
+        ModelRouter.from_config("gpt-4o", "gpt-4o-mini", overrides='{"filter_slots": {"modelo": "x"}}')
+
+def test_records_latency_and_tokens_per_route():
+    """Testa as métricas de latência e tokens por rota"""
+    router = ModelRouter.from_config("gpt-4o", "gpt-4o-mini")
+    usage = SimpleNamespace(prompt_tokens=1200, completion_tokens=20,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=1024))
+
+    router.record("extract_intent", "gpt-4o-mini", 0.2, SimpleNamespace(usage=usage))
+    router.record("extract_intent", "gpt-4o", 0.4, SimpleNamespace(usage=None))
+
+    stats = router.stats()
+    assert stats["extract_intent"]["calls"] == 2
+    assert stats["extract_intent"]["avg_latency_ms"] == 300.0
+    assert stats["extract_intent"]["models"] == {"gpt-4o-mini": 1, "gpt-4o": 1}
+    assert stats["extract_intent"]["uncached_prompt_tokens"] == 176
+    assert stats["extract_intent"]["completion_tokens"] == 20
+    assert "calls" not in stats["conversation"]
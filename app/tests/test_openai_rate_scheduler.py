@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+from app.services.openai_rate_scheduler import LLMPriority, OpenAIRateScheduler, estimate_tokens
+
+def test_estimate_counts_prompt_and_completion_budget():
+    """Testa que a estimativa soma o prompt, as funções e o max_tokens"""
+    messages = [{"role": "system", "content": "a" * 400}, {"role": "user", "content": "b" * 40}]
+
+    assert estimate_tokens(messages) == 110 + 8
+    assert estimate_tokens(messages, max_tokens=150) == 110 + 8 + 150
+    assert estimate_tokens(messages, tools=[{"name": "x"}]) > estimate_tokens(messages)
+
+@pytest.mark.asyncio
+async def test_burst_within_limits_is_not_queued():
+    """Testa que chamadas dentro da rajada saem sem espera"""
+    scheduler = OpenAIRateScheduler(requests_per_minute=600, tokens_per_minute=60000, burst_seconds=1)
+
+    waits = [await scheduler.acquire(100) for _ in range(10)]
+
+    # Nenhuma chamada esperou o balde repor uma requisição (0,1 s a 600 RPM)
+    assert max(waits) < 0.1
+    assert scheduler.pending == 0
+    assert scheduler.stats()["granted"]["NORMAL"] == 10
+    assert scheduler.stats()["estimated_tokens"] == 1000
+
+@pytest.mark.asyncio
+async def test_queue_serves_higher_priority_first():
+    """Testa que, com os limites esgotados, confirmações saem antes de conversa casual"""
+    scheduler = OpenAIRateScheduler(requests_per_minute=1200, tokens_per_minute=10**6, burst_seconds=0.05)
+    await scheduler.acquire(10)
+    order = []
+
+    async def call(name, priority):
+        await scheduler.acquire(10, priority)
+        order.append(name)
+
+    calls = [
+        asyncio.create_task(call("small talk", LLMPriority.SMALL_TALK)),
+        asyncio.create_task(call("slots", LLMPriority.SLOT_FILTER)),
+        asyncio.create_task(call("confirmation", LLMPriority.CONFIRMATION)),
+    ]
+    await asyncio.sleep(0)
+    assert scheduler.stats()["queued"]["SMALL_TALK"] == 1
+    await asyncio.gather(*calls)
+
+    assert order == ["confirmation", "slots", "small talk"]
+    stats = scheduler.stats()
+    assert stats["pending"] == 0
+    assert stats["avg_wait_ms"]["SMALL_TALK"] > stats["avg_wait_ms"]["CONFIRMATION"] > 0
+    assert stats["max_wait_ms"] >= stats["avg_wait_ms"]["SMALL_TALK"]
+
+@pytest.mark.asyncio
+async def test_token_limit_paces_large_prompts():
+    """Testa que o limite de tokens por minuto espaça prompts grandes"""
+    scheduler = OpenAIRateScheduler(requests_per_minute=6000, tokens_per_minute=60000, burst_seconds=0.1)
+    await scheduler.acquire(100)
+
+    waited = await scheduler.acquire(50)
+
+    assert waited == pytest.approx(0.05, abs=0.03)
+
+@pytest.mark.asyncio
+async def test_cancelled_call_leaves_the_queue():
+    """Testa que uma chamada cancelada na fila não consome nem trava as seguintes"""
+    scheduler = OpenAIRateScheduler(requests_per_minute=600, tokens_per_minute=10**6, burst_seconds=0.1)
+    await scheduler.acquire(10)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(scheduler.acquire(10, LLMPriority.CONFIRMATION), 0.01)
+
+    assert scheduler.pending == 0
+    await asyncio.wait_for(scheduler.acquire(10), 1)
+    assert scheduler.stats()["granted"]["CONFIRMATION"] == 0
+
+@pytest.mark.asyncio
+async def test_pause_holds_the_queue():
+    """Testa que um 429 segura a fila pelo Retry-After"""
+    scheduler = OpenAIRateScheduler(requests_per_minute=60000, tokens_per_minute=10**7)
+    scheduler.pause(0.05)
+
+    waited = await scheduler.acquire(10)
+
+    assert waited == pytest.approx(0.05, abs=0.03)
+    assert scheduler.stats()["pauses"] == 1
@@ -0,0 +1,167 @@
+import asyncio
+import time
+import pytest
+import pytest_asyncio
+from app.services.outbound_scheduler import MessagePriority, OutboundQueueFullError, OutboundScheduler, SendError
+
+def recorder(sent, label, result=True):
+    """Cria uma função de envio que registra a ordem e o instante dos envios"""
+    async def deliver():
+        sent.append((label, time.monotonic()))
+        return result
+    return deliver
+
+@pytest_asyncio.fixture
+async def scheduler():
+    scheduler = OutboundScheduler(rate=1000, recipient_rate=1000, recipient_burst=1000, max_in_flight=1)
+    await scheduler.start()
+    yield scheduler
+    await scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_higher_priority_is_sent_first(scheduler):
+    """Testa que confirmações saem antes de lembretes e campanhas"""
+    sent = []
+    futures = [
+        scheduler.submit("5511000000001", recorder(sent, "marketing"), MessagePriority.MARKETING),
+        scheduler.submit("5511000000002", recorder(sent, "reminder"), MessagePriority.REMINDER),
+        scheduler.submit("5511000000003", recorder(sent, "confirmation"), MessagePriority.CONFIRMATION),
+    ]
+
+    assert await asyncio.gather(*futures) == [True, True, True]
+    assert [label for label, _ in sent] == ["confirmation", "reminder", "marketing"]
+    assert scheduler.stats()["priorities"]["confirmation"]["sent"] == 1
+
+@pytest.mark.asyncio
+async def test_global_rate_is_respected():
+    """Testa que o balde global segura os envios acima da taxa"""
+    scheduler = OutboundScheduler(rate=100, burst=1, recipient_rate=1000, recipient_burst=1000)
+    await scheduler.start()
+    sent = []
+
+    started = time.monotonic()
+    await asyncio.gather(*(scheduler.submit(f"55110000000{index:02d}", recorder(sent, index)) for index in range(5)))
+    await scheduler.stop()
+
+    # A primeira sai na hora, as outras quatro a 10 ms de distância
+    assert time.monotonic() - started >= 0.035
+
+@pytest.mark.asyncio
+async def test_paced_recipient_does_not_block_others():
+    """Testa que o limite por destinatário não atrasa outros destinatários"""
+    scheduler = OutboundScheduler(rate=1000, recipient_rate=20, recipient_burst=1)
+    await scheduler.start()
+    sent = []
+
+    futures = [
+        scheduler.submit("5511111111111", recorder(sent, "a1")),
+        scheduler.submit("5511111111111", recorder(sent, "a2")),
+        scheduler.submit("5522222222222", recorder(sent, "b1")),
+    ]
+    await asyncio.gather(*futures)
+    await scheduler.stop()
+
+    assert [label for label, _ in sent] == ["a1", "b1", "a2"]
+    times = dict(sent)
+    assert times["a2"] - times["a1"] >= 0.04
+    assert scheduler.stats()["paced"] >= 1
+
+@pytest.mark.asyncio
+async def test_backoff_pauses_all_sends(scheduler):
+    """Testa que um 429 suspende os envios pelo tempo indicado"""
+    sent = []
+    scheduler.backoff(0.05)
+
+    started = time.monotonic()
+    await scheduler.submit("5511000000001", recorder(sent, "after-backoff"))
+
+    assert sent[0][1] - started >= 0.04
+    assert scheduler.stats()["backoffs"] == 1
+
+@pytest.mark.asyncio
+async def test_queue_limit():
+    """Testa que a fila recusa envios acima do limite"""
+    scheduler = OutboundScheduler(rate=1, burst=1, max_queue=1)
+    await scheduler.start()
+    sent = []
+
+    scheduler.submit("5511000000001", recorder(sent, "first"))
+    with pytest.raises(OutboundQueueFullError):
+        scheduler.submit("5511000000002", recorder(sent, "second"))
+    await scheduler.stop()
+
+@pytest.mark.asyncio
+async def test_retryable_failure_is_requeued_then_dead_lettered():
+    """Testa que falhas transitórias voltam para a fila e, esgotadas, vão para o dead letter"""
+    dead_letters = []
+    attempts = []
+    scheduler = OutboundScheduler(max_attempts=3, retry_base=0.01,
+                                  dead_letter=lambda *entry: dead_letters.append(entry))
+    await scheduler.start()
+
+    async def flaky():
+        attempts.append(time.monotonic())
+        raise SendError("HTTP 503", retryable=True)
+
+    result = await scheduler.submit("5511000000001", flaky, MessagePriority.REPLY, payload={"type": "text"})
+    await scheduler.stop()
+
+    assert result is False
+    assert len(attempts) == 3
+    assert dead_letters == [("5511000000001", MessagePriority.REPLY, {"type": "text"}, "HTTP 503", 3)]
+    assert scheduler.stats()["retried"] == 2
+
+@pytest.mark.asyncio
+async def test_retry_holds_later_sends_to_the_same_recipient(scheduler):
+    """Testa que, durante a nova tentativa, o mesmo destinatário não recebe as mensagens seguintes antes"""
+    sent = []
+    failures = [SendError("HTTP 503", retryable=True, retry_after=0.05)]
+
+    async def flaky():
+        if failures:
+            raise failures.pop()
+        sent.append(("first", time.monotonic()))
+        return True
+
+    futures = [
+        scheduler.submit("5511000000001", flaky),
+        scheduler.submit("5511000000001", recorder(sent, "second")),
+        scheduler.submit("5511000000002", recorder(sent, "other")),
+    ]
+    await asyncio.sleep(0.01)
+    assert scheduler.stats()["recipients_blocked"] == 1
+
+    assert await asyncio.gather(*futures) == [True, True, True]
+    labels = [label for label, _ in sent]
+    assert labels.index("first") < labels.index("second")
+    assert labels[0] == "other"
+    assert scheduler.stats()["recipients_blocked"] == 0
+    assert scheduler.pending == 0
+
+@pytest.mark.asyncio
+async def test_permanent_failure_is_not_retried(scheduler):
+    """Testa que erros definitivos vão direto para o dead letter"""
+    dead_letters = []
+    scheduler.dead_letter = lambda *entry: dead_letters.append(entry)
+
+    async def rejected():
+        raise SendError("HTTP 400", retryable=False)
+
+    assert await scheduler.submit("5511000000001", rejected) is False
+    assert dead_letters[0][4] == 1
+
+@pytest.mark.asyncio
+async def test_pending_sends_are_dead_lettered_on_stop():
+    """Testa que envios ainda na fila não se perdem no encerramento"""
+    dead_letters = []
+    scheduler = OutboundScheduler(rate=1, burst=1, dead_letter=lambda *entry: dead_letters.append(entry))
+    await scheduler.start()
+    sent = []
+
+    first = scheduler.submit("5511000000001", recorder(sent, "first"))
+    second = scheduler.submit("5511000000002", recorder(sent, "second"), payload={"type": "text"})
+    await first
+    await scheduler.stop()
+
+    assert await second is False
+    assert dead_letters[0][0] == "5511000000002"
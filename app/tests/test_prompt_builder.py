@@ -0,0 +1,20 @@
+from app.services.prompt_builder import PromptBuilder
+
+def test_static_prefix_comes_first_and_is_stable():
+    """Testa que o prefixo estático é idêntico entre chamadas e vem antes do contexto variável"""
+    builder = PromptBuilder("""
+        Instruções do assistente.
+        """, "Convênios aceitos: unimed, amil.")
+
+    first = builder.build("Quero agendar", {"Data de hoje": "2025-05-05"})
+    second = builder.build("Outra mensagem", {"Data de hoje": "2025-05-06"})
+
+    assert first[0] == second[0] == {
+        "role": "system", "content": "Instruções do assistente.\n\nConvênios aceitos: unimed, amil."
+    }
+    assert first[1] == {"role": "system", "content": "Data de hoje: 2025-05-05"}
+    assert first[-1] == {"role": "user", "content": "Quero agendar"}
+
+def test_empty_parts_are_omitted():
+    """Testa que prefixo e contexto vazios não geram mensagens"""
+    assert PromptBuilder().build("Olá") == [{"role": "user", "content": "Olá"}]
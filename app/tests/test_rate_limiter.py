@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+from app.services.rate_limiter import TokenBucket
+
+def test_bucket_allows_burst_then_waits():
+    """Testa que o balde libera a rajada inicial e depois exige espera"""
+    bucket = TokenBucket(rate=10, capacity=3)
+
+    assert [bucket.try_acquire() for _ in range(3)] == [0, 0, 0]
+    wait = bucket.try_acquire()
+    assert 0 < wait <= 0.1
+
+def test_bucket_drain_blocks_for_given_time():
+    """Testa que esvaziar o balde suspende a liberação de tokens"""
+    bucket = TokenBucket(rate=100, capacity=100)
+    bucket.drain(2)
+
+    assert bucket.wait_time() == pytest.approx(2.01, abs=0.01)
+    assert not bucket.is_full()
+
+def test_bucket_rejects_invalid_rate():
+    """Testa que taxas não positivas são recusadas"""
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_refill():
+    """Testa que acquire aguarda a reposição de tokens"""
+    bucket = TokenBucket(rate=50, capacity=1)
+    await bucket.acquire()
+
+    waited = await bucket.acquire()
+
+    assert waited == pytest.approx(0.02, abs=0.01)
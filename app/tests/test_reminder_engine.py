@@ -0,0 +1,135 @@
+import json
+import os
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from app.services.outbound_scheduler import MessagePriority
+from app.services.reminder_engine import ReminderEngine
+from app.services.simplified_slot_service import SimplifiedSlotService
+from app.services.whatsapp_service import WhatsAppService
+
+NOW = datetime(2025, 5, 5, 8, 0)
+
+def fake_whatsapp(result=True):
+    return SimpleNamespace(
+        send_template_message_async=AsyncMock(return_value=result),
+        appointment_template_components=WhatsAppService.appointment_template_components,
+    )
+
+def slot_service(tmp_path, appointments):
+    path = tmp_path / "appointments.json"
+    path.write_text(json.dumps(appointments))
+    return SimplifiedSlotService(appointments_file=str(path), schedule_config_file=str(tmp_path / "schedule.json"))
+
+def appointment(name, phone="5511999999999"):
+    return {"name": name, "phone": phone, "reason": "Consulta", "email": "", "notes": ""}
+
+@pytest.mark.asyncio
+async def test_tick_sends_only_due_reminders(tmp_path):
+    """Testa que cada ciclo envia apenas os lembretes vencidos, em cada antecedência"""
+    start = NOW + timedelta(hours=26)
+    whatsapp = fake_whatsapp()
+    engine = ReminderEngine(whatsapp, slot_service(tmp_path, {start.isoformat(): appointment("Maria")}), state_path=None)
+
+    assert await engine.tick(NOW) == 0
+    assert engine.next_due == start - timedelta(hours=24)
+
+    assert await engine.tick(start - timedelta(hours=24)) == 1
+    phone, template, language, components, priority = whatsapp.send_template_message_async.await_args.args
+    assert (phone, template, language, priority) == ("5511999999999", "appointment_reminder", "pt_BR", MessagePriority.REMINDER)
+    assert whatsapp.send_template_message_async.await_args.kwargs == {"wait": False}
+    assert [parameter["text"] for parameter in components[0]["parameters"]] == ["Maria", start.strftime("%d/%m/%Y - %H:%M")]
+
+    assert await engine.tick(start - timedelta(hours=3)) == 0
+    assert await engine.tick(start - timedelta(hours=2)) == 1
+    assert engine.stats()["sent"] == 2
+    assert engine.next_due is None
+
+@pytest.mark.asyncio
+async def test_late_indexing_sends_only_the_last_reminder(tmp_path):
+    """Testa que, após um restart tardio, apenas o último lembrete vencido é enviado"""
+    start = NOW + timedelta(hours=1)
+    whatsapp = fake_whatsapp()
+    engine = ReminderEngine(whatsapp, slot_service(tmp_path, {start.isoformat(): appointment("Maria")}), state_path=None)
+
+    assert await engine.tick(NOW) == 1
+    assert whatsapp.send_template_message_async.await_count == 1
+    assert await engine.tick(NOW + timedelta(minutes=30)) == 0
+
+@pytest.mark.asyncio
+async def test_cancelled_appointment_is_skipped(tmp_path):
+    """Testa que um agendamento cancelado depois de indexado não recebe lembrete"""
+    start = NOW + timedelta(hours=26)
+    slots = slot_service(tmp_path, {start.isoformat(): appointment("Maria")})
+    whatsapp = fake_whatsapp()
+    engine = ReminderEngine(whatsapp, slots, state_path=None)
+    await engine.tick(NOW)
+
+    slots.cancel_appointment(start)
+    os.utime(slots.appointments_file, (1, 1))  # garante mtime diferente mesmo em sistemas de arquivos lentos
+
+    assert await engine.tick(start - timedelta(hours=2)) == 0
+    whatsapp.send_template_message_async.assert_not_awaited()
+    assert engine.stats()["skipped"] == 2
+
+@pytest.mark.asyncio
+async def test_new_appointments_are_picked_up_when_file_changes(tmp_path):
+    """Testa que os agendamentos são relidos só quando o arquivo muda"""
+    first = NOW + timedelta(hours=30)
+    slots = slot_service(tmp_path, {first.isoformat(): appointment("Maria")})
+    engine = ReminderEngine(fake_whatsapp(), slots, state_path=None)
+    await engine.tick(NOW)
+    await engine.tick(NOW)
+    assert engine.stats()["reloads"] == 0
+
+    second = NOW + timedelta(hours=27)
+    other = SimplifiedSlotService(appointments_file=slots.appointments_file, schedule_config_file=slots.schedule_config_file)
+    other.book_slot(second, appointment("João", "5511888888888"))
+    os.utime(slots.appointments_file, (1, 1))
+
+    await engine.tick(NOW)
+    assert engine.stats()["reloads"] == 1
+    assert engine.next_due == second - timedelta(hours=24)
+
+@pytest.mark.asyncio
+async def test_appointments_file_created_after_start_is_loaded(tmp_path):
+    """Testa que um arquivo de agendamentos criado depois do primeiro ciclo é lido"""
+    path = tmp_path / "appointments.json"
+    slots = SimplifiedSlotService(appointments_file=str(path), schedule_config_file=str(tmp_path / "schedule.json"))
+    engine = ReminderEngine(fake_whatsapp(), slots, state_path=None)
+    await engine.tick(NOW)
+    assert engine.next_due is None
+
+    start = NOW + timedelta(hours=30)
+    path.write_text(json.dumps({start.isoformat(): appointment("Maria")}))
+
+    await engine.tick(NOW)
+    assert engine.stats()["reloads"] == 1
+    assert engine.next_due == start - timedelta(hours=24)
+
+@pytest.mark.asyncio
+async def test_sent_reminders_survive_restart(tmp_path):
+    """Testa que um lembrete já enviado não é repetido após reiniciar o motor"""
+    start = NOW + timedelta(hours=1)
+    state_path = str(tmp_path / "reminders.db")
+    appointments = {start.isoformat(): appointment("Maria")}
+
+    engine = ReminderEngine(fake_whatsapp(), slot_service(tmp_path, appointments), state_path=state_path)
+    assert await engine.tick(NOW) == 1
+    await engine.stop()
+
+    whatsapp = fake_whatsapp()
+    restarted = ReminderEngine(whatsapp, slot_service(tmp_path, appointments), state_path=state_path)
+    assert await restarted.tick(NOW + timedelta(minutes=5)) == 0
+    whatsapp.send_template_message_async.assert_not_awaited()
+    await restarted.stop()
+
+@pytest.mark.asyncio
+async def test_failed_enqueue_is_not_recorded(tmp_path):
+    """Testa que um envio recusado não é registrado como lembrete enviado"""
+    start = NOW + timedelta(hours=1)
+    engine = ReminderEngine(fake_whatsapp(result=False), slot_service(tmp_path, {start.isoformat(): appointment("Maria")}), state_path=None)
+
+    assert await engine.tick(NOW) == 0
+    assert engine.stats()["sent"] == 0
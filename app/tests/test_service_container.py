@@ -0,0 +1,75 @@
+import pytest
+from unittest.mock import patch, AsyncMock
+from app.services.service_container import ServiceContainer
+from app.api.whatsapp import process_whatsapp_message
+from app.models.intent import IntentExtraction
+from app.models.webhook import WebhookPayload
+
+def build_payload(phone="5511999999999", text="Olá", message_id="wamid.1"):
+    """Monta um payload mínimo de webhook com uma mensagem de texto"""
+    return WebhookPayload.model_validate({
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [
+            {"from": phone, "id": message_id, "type": "text", "text": {"body": text}}
+        ]}}]}]
+    })
+
+@pytest.fixture
+def patched_services():
+    """Substitui os serviços externos por mocks"""
+    with patch('app.services.service_container.COALESCE_WINDOW_SECONDS', 0), \
+         patch('app.services.service_container.DEAD_LETTER_PATH', None), \
+         patch('app.services.service_container.BROADCAST_PATH', None), \
+         patch('app.services.service_container.NOTIFICATION_ENABLED', False), \
+         patch('app.services.service_container.ChatGPTService') as mock_chatgpt, \
+         patch('app.services.service_container.CalendarService') as mock_calendar, \
+         patch('app.services.whatsapp_service.ChatGPTService') as inner_chatgpt, \
+         patch('app.services.whatsapp_service.CalendarService') as inner_calendar:
+        mock_chatgpt.return_value.aclose = AsyncMock()
+        yield mock_chatgpt, mock_calendar, inner_chatgpt, inner_calendar
+
+@pytest.mark.asyncio
+async def test_startup_creates_services_once(patched_services):
+    """Testa que o startup cria uma única instância de cada serviço e as compartilha"""
+    mock_chatgpt, mock_calendar, inner_chatgpt, inner_calendar = patched_services
+
+    services = ServiceContainer()
+    await services.startup()
+    await services.startup()
+
+    assert mock_chatgpt.call_count == 1
+    assert mock_calendar.call_count == 1
+    inner_chatgpt.assert_not_called()
+    inner_calendar.assert_not_called()
+    assert services.whatsapp_service.chatgpt_service is services.chatgpt_service
+    assert services.whatsapp_service.calendar_service is services.calendar_service
+    await services.shutdown()
+
+@pytest.mark.asyncio
+async def test_shutdown_releases_services(patched_services):
+    """Testa que o shutdown libera os serviços"""
+    services = ServiceContainer()
+    await services.startup()
+    await services.shutdown()
+
+    assert services.started is False
+    assert services.whatsapp_service is None
+
+@pytest.mark.asyncio
+async def test_messages_reuse_container_services(patched_services):
+    """Testa que o processamento de mensagens não constrói novos serviços"""
+    mock_chatgpt, mock_calendar, _, _ = patched_services
+    mock_chatgpt.return_value.extract_intent = AsyncMock(return_value=IntentExtraction(reply="Olá! Como posso ajudar?"))
+
+    services = ServiceContainer()
+    await services.startup()
+    services.whatsapp_service.send_message_async = AsyncMock(return_value=True)
+
+    for index in range(3):
+        await process_whatsapp_message(build_payload(message_id=f"wamid.{index}"), services)
+
+    assert mock_chatgpt.call_count == 1
+    assert mock_calendar.call_count == 1
+    assert services.whatsapp_service.send_message_async.await_count == 3
+    assert mock_chatgpt.return_value.extract_intent.await_count == 3
+    await services.shutdown()
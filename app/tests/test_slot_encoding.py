@@ -0,0 +1,29 @@
+import pytest
+from app.services.slot_encoding import decode_slot_refs, encode_slots
+
+SLOTS = [
+    {"slot_id": "3f2a9c1e-0000-4000-8000-000000000001", "start_time": "2025-05-05T09:00:00"},
+    {"slot_id": "3f2a9c1e-0000-4000-8000-000000000002", "start_time": "2025-05-05T09:45:00"},
+    {"slot_id": "3f2a9c1e-0000-4000-8000-000000000003", "start_time": "2025-05-06T14:00:00"},
+]
+
+def test_encode_groups_by_day_with_ordinals():
+    """Testa que os horários viram números curtos agrupados por dia"""
+    assert encode_slots(SLOTS) == "2025-05-05 seg: 1=09:00 2=09:45\n2025-05-06 ter: 3=14:00"
+
+def test_encoding_is_much_shorter_than_ids_and_timestamps():
+    """Testa que a codificação compacta é bem menor que UUID + timestamp ISO"""
+    legacy = "\n".join(f"- ID: {slot['slot_id']} Time: {slot['start_time']}" for slot in SLOTS)
+    assert len(encode_slots(SLOTS)) * 3 < len(legacy)
+
+def test_decode_maps_back_to_original_slots():
+    """Testa que os números voltam para os dicionários originais, na ordem original"""
+    assert decode_slot_refs([3, "1", 3, 99], SLOTS) == [SLOTS[0], SLOTS[2]]
+    assert decode_slot_refs([], SLOTS) == []
+
+def test_decode_rejects_non_numeric_refs():
+    """Testa que referências não numéricas (ex.: UUIDs) são rejeitadas"""
+    with pytest.raises(ValueError):
+        decode_slot_refs([SLOTS[0]["slot_id"]], SLOTS)
+    with pytest.raises(ValueError):
+        decode_slot_refs([True], SLOTS)
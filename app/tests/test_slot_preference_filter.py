@@ -0,0 +1,67 @@
+import pytest
+from datetime import date, datetime, timedelta
+from app.services.slot_preference_filter import SlotPreferenceFilter
+
+# Sexta-feira, 15 de março de 2024
+TODAY = date(2024, 3, 15)
+
+def build_slots():
+    """Duas semanas de horários: 9h, 11h, 15h e 19h todos os dias"""
+    slots = []
+    for offset in range(14):
+        day = datetime.combine(TODAY, datetime.min.time()) + timedelta(days=offset)
+        for hour in (9, 11, 15, 19):
+            start = day.replace(hour=hour)
+            slots.append({"slot_id": f"{start:%m%d%H}", "start_time": start.isoformat()})
+    return slots
+
+def starts(slots):
+    return [slot["start_time"][5:16] for slot in slots]
+
+@pytest.fixture
+def slot_filter():
+    return SlotPreferenceFilter()
+
+def test_weekday_and_period(slot_filter):
+    """Testa dia da semana combinado com período do dia"""
+    matches = slot_filter.filter("Prefiro terça de manhã", build_slots(), today=TODAY)
+
+    assert starts(matches) == ["03-19T09:00", "03-19T11:00", "03-26T09:00", "03-26T11:00"]
+
+def test_relative_day_with_lower_bound(slot_filter):
+    """Testa "amanhã depois das 14h" """
+    matches = slot_filter.filter("amanhã depois das 14h", build_slots(), today=TODAY)
+
+    assert starts(matches) == ["03-16T15:00", "03-16T19:00"]
+
+@pytest.mark.parametrize("text, expected", [
+    ("antes das 10", 14),
+    ("dia 20 à noite", 1),
+    ("hoje às 11h", 1),
+    ("sexta ou segunda à tarde", 4),
+    ("qualquer horário", 56),
+])
+def test_common_phrasings(slot_filter, text, expected):
+    """Testa as formas mais comuns de expressar a preferência"""
+    assert len(slot_filter.filter(text, build_slots(), today=TODAY)) == expected
+
+def test_preserves_slot_dicts_and_order(slot_filter):
+    """Testa que os dicionários originais são devolvidos na ordem original"""
+    slots = build_slots()
+    matches = slot_filter.filter("noite", slots, today=TODAY)
+
+    assert all(any(match is slot for slot in slots) for match in matches)
+    assert matches == sorted(matches, key=lambda slot: slot["start_time"])
+
+@pytest.mark.parametrize("text", [
+    "não pode ser de manhã",
+    "perto do feriado",
+    "de manhã bem cedo",
+    "depois das 25h",
+    "a partir das 16 e antes das 12",
+    "Olá",
+])
+def test_unrecognized_phrasing_falls_back(slot_filter, text):
+    """Testa que frases não reconhecidas por completo ficam para o ChatGPT"""
+    assert slot_filter.filter(text, build_slots(), today=TODAY) is None
+    assert slot_filter.stats()["llm_fallbacks"] == 1
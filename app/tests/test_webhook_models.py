@@ -0,0 +1,56 @@
+import pytest
+from pydantic import ValidationError
+from app.models.webhook import WebhookPayload
+
+BODY = (
+    b'{"object":"whatsapp_business_account","entry":[{"id":"1","changes":[{"field":"messages","value":{'
+    b'"messaging_product":"whatsapp","metadata":{"phone_number_id":"106540352242922"},'
+    b'"contacts":[{"profile":{"name":"Paciente"},"wa_id":"5511999999999"}],'
+    b'"messages":[{"from":"5511999999999","id":"wamid.1","timestamp":"1714000000",'
+    b'"text":{"body":"oi"},"type":"text","context":{"id":"wamid.0"}}],'
+    b'"statuses":[{"id":"wamid.9","status":"read","recipient_id":"5511999999999"}]}}]}]}'
+)
+
+def test_decode_from_bytes():
+    """Testa a decodificação tipada direto dos bytes da requisição"""
+    payload = WebhookPayload.decode(BODY)
+
+    message = next(payload.iter_messages())
+    assert message.from_ == "5511999999999"
+    assert message.text.body == "oi"
+    assert payload.entry[0].changes[0].value.contacts[0].profile.name == "Paciente"
+    assert [status.status for status in payload.iter_statuses()] == ["read"]
+
+def test_unknown_fields_are_skipped():
+    """Testa que campos desconhecidos não são materializados nos modelos"""
+    payload = WebhookPayload.decode(BODY)
+
+    message = next(payload.iter_messages())
+    assert not hasattr(message, "context")
+    assert "metadata" not in payload.entry[0].changes[0].value.model_dump()
+
+def test_missing_sections_default_to_empty():
+    """Testa que seções ausentes resultam em listas vazias"""
+    payload = WebhookPayload.decode(b'{"object":"whatsapp_business_account","entry":[{"changes":[{}]}]}')
+
+    assert list(payload.iter_messages()) == []
+    assert list(payload.iter_statuses()) == []
+
+def test_media_messages():
+    """Testa que imagens e documentos expõem a mídia anexada"""
+    payload = WebhookPayload.decode(
+        b'{"object":"whatsapp_business_account","entry":[{"changes":[{"value":{"messages":['
+        b'{"from":"5511999999999","id":"wamid.1","type":"image","image":{"id":"m1","mime_type":"image/jpeg","sha256":"abc"}},'
+        b'{"from":"5511999999999","id":"wamid.2","type":"document","document":{"id":"m2","filename":"rg.pdf","caption":"RG"}},'
+        b'{"from":"5511999999999","id":"wamid.3","type":"text","text":{"body":"oi"}}]}}]}]}'
+    )
+
+    image, document, text = payload.iter_messages()
+    assert (image.media.id, image.media.mime_type, image.media.sha256) == ("m1", "image/jpeg", "abc")
+    assert (document.media.filename, document.media.caption) == ("rg.pdf", "RG")
+    assert text.media is None
+
+def test_invalid_body_raises():
+    """Testa que corpos inválidos levantam ValidationError"""
+    with pytest.raises(ValidationError):
+        WebhookPayload.decode(b'not json')
@@ -1,8 +1,17 @@
+import asyncio
+import json
 from datetime import datetime, timedelta
+import httpx
 import pytest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
+from app.models.intent import Intent, IntentExtraction
+from app.services.chatgpt_service import LLMTimeoutError
+from app.services.circuit_breaker import CircuitOpenError
 from app.services.whatsapp_service import WhatsAppService
 from app.services.conversation_state import ConversationState
+from app.services.dead_letter_store import DeadLetterStore
+from app.services.openai_rate_scheduler import LLMPriority
+from app.services.outbound_scheduler import OutboundScheduler
 
 @pytest.fixture
 def whatsapp_service():
@@ -11,16 +20,18 @@ def whatsapp_service():
          patch('app.services.whatsapp_service.CalendarService') as mock_calendar:
         service = WhatsAppService()
         service.chatgpt_service = mock_chatgpt.return_value
+        service.chatgpt_service.extract_intent = AsyncMock()
         service.calendar_service = mock_calendar.return_value
         yield service
 
-def test_receive_message_initial_state(whatsapp_service):
+@pytest.mark.asyncio
+async def test_receive_message_initial_state(whatsapp_service):
     """Testa o processamento de mensagem no estado inicial"""
     # Configura o mock do ChatGPT
-    whatsapp_service.chatgpt_service.generate_response.return_value = "Olá! Como posso ajudar?"
+    whatsapp_service.chatgpt_service.extract_intent.return_value = IntentExtraction(reply="Olá! Como posso ajudar?")
     
     # Processa a mensagem
-    result = whatsapp_service.receive_message({
+    result = await whatsapp_service.receive_message({
         "from": "5511999999999",
         "text": "Olá"
     })
@@ -30,13 +41,16 @@ def test_receive_message_initial_state(whatsapp_service):
     assert result["text"] == "Olá"
     assert result["state"] == ConversationState.INITIAL.value
 
-def test_receive_message_with_insurance(whatsapp_service):
+@pytest.mark.asyncio
+async def test_receive_message_with_insurance(whatsapp_service):
     """Testa o processamento de mensagem com convênio aceito"""
     # Configura o mock do ChatGPT
-    whatsapp_service.chatgpt_service.generate_response.return_value = "CONVENIO: unimed"
+    whatsapp_service.chatgpt_service.extract_intent.return_value = IntentExtraction(
+        intent=Intent.INSURANCE, insurance="Unimed", reply="Qual convênio?"
+    )
     
     # Processa a mensagem
-    result = whatsapp_service.receive_message({
+    result = await whatsapp_service.receive_message({
         "from": "5511999999999",
         "text": "Quero agendar com Unimed"
     })
@@ -47,13 +61,16 @@ def test_receive_message_with_insurance(whatsapp_service):
     assert "carteirinha" in result["response"].lower()
     assert "documento" in result["response"].lower()
 
-def test_receive_message_with_invalid_insurance(whatsapp_service):
+@pytest.mark.asyncio
+async def test_receive_message_with_invalid_insurance(whatsapp_service):
     """Testa o processamento de mensagem com convênio não aceito"""
     # Configura o mock do ChatGPT
-    whatsapp_service.chatgpt_service.generate_response.return_value = "CONVENIO: nao_aceito"
+    whatsapp_service.chatgpt_service.extract_intent.return_value = IntentExtraction(
+        intent=Intent.INSURANCE, insurance="nao_aceito", reply="Qual convênio?"
+    )
     
     # Processa a mensagem
-    result = whatsapp_service.receive_message({
+    result = await whatsapp_service.receive_message({
         "from": "5511999999999",
         "text": "Quero agendar com um convênio não aceito"
     })
@@ -63,13 +80,14 @@ def test_receive_message_with_invalid_insurance(whatsapp_service):
     assert "não trabalhamos" in result["response"].lower()
     assert "consulta particular" in result["response"].lower()
 
-def test_receive_message_with_particular(whatsapp_service):
+@pytest.mark.asyncio
+async def test_receive_message_with_particular(whatsapp_service):
     """Testa o processamento de mensagem com particular"""
     # Configura o mock do ChatGPT
-    whatsapp_service.chatgpt_service.generate_response.return_value = "PARTICULAR: sim"
+    whatsapp_service.chatgpt_service.extract_intent.return_value = IntentExtraction(intent=Intent.PRIVATE)
     
     # Processa a mensagem
-    result = whatsapp_service.receive_message({
+    result = await whatsapp_service.receive_message({
         "from": "5511999999999",
         "text": "Quero agendar particular"
     })
@@ -81,32 +99,110 @@ def test_receive_message_with_particular(whatsapp_service):
     assert "retorno" in result["response"].lower()
     assert "pacote" in result["response"].lower()
 
-def test_receive_message_with_date(whatsapp_service):
+@pytest.mark.asyncio
+async def test_receive_message_with_date(whatsapp_service):
     """Testa o processamento de mensagem com data"""
     # Configura o mock do ChatGPT
-    whatsapp_service.chatgpt_service.generate_response.return_value = "DATA_MENCIONADA: 2024-05-01"
+    whatsapp_service.chatgpt_service.extract_intent.return_value = IntentExtraction(
+        intent=Intent.DATE, date="2024-05-01", reply="Vou verificar os horários."
+    )
     
     # Processa a mensagem
-    result = whatsapp_service.receive_message({
+    result = await whatsapp_service.receive_message({
         "from": "5511999999999",
-        "text": "Quero agendar para dia 1 de maio"
+        "text": "Quero agendar no feriado do dia do trabalho"
     })
     
     # Verifica o resultado
     assert result["state"] == ConversationState.WAITING_FOR_TIME.value
     assert whatsapp_service.conversation_manager.get_data("5511999999999")["date"] == "2024-05-01"
 
-def test_receive_message_with_time(whatsapp_service):
+@pytest.mark.asyncio
+async def test_common_date_is_resolved_without_chatgpt(whatsapp_service):
+    """Testa que datas simples são interpretadas localmente, sem chamar o ChatGPT"""
+    result = await whatsapp_service.receive_message({
+        "from": "5511999999999",
+        "text": "Quero agendar para amanhã às 10h"
+    })
+    
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    assert result["state"] == ConversationState.WAITING_FOR_TIME.value
+    assert whatsapp_service.conversation_manager.get_data("5511999999999")["date"] == tomorrow
+    assert whatsapp_service.conversation_manager.get_data("5511999999999")["time"] == "10:00"
+    assert tomorrow in result["response"]
+    whatsapp_service.chatgpt_service.extract_intent.assert_not_awaited()
+    assert whatsapp_service.intent_extractor.stats()["resolved_locally"] == 1
+
+@pytest.mark.asyncio
+async def test_ambiguous_message_falls_back_to_chatgpt(whatsapp_service):
+    """Testa que mensagens sem padrão reconhecido seguem para o ChatGPT"""
+    whatsapp_service.chatgpt_service.extract_intent.return_value = IntentExtraction(reply="Olá! Como posso ajudar?")
+    
+    result = await whatsapp_service.receive_message({
+        "from": "5511999999999",
+        "text": "Vocês atendem crianças?"
+    })
+    
+    assert result["response"] == "Olá! Como posso ajudar?"
+    whatsapp_service.chatgpt_service.extract_intent.assert_awaited_once()
+    assert whatsapp_service.intent_extractor.stats()["llm_fallbacks"] == 1
+
+@pytest.mark.asyncio
+async def test_chatgpt_queue_priority_follows_conversation_step(whatsapp_service):
+    """Testa que confirmações vão à frente na fila da OpenAI e conversa casual por último"""
+    whatsapp_service.chatgpt_service.extract_intent.return_value = IntentExtraction(reply="Tudo certo?")
+    whatsapp_service.conversation_manager.set_state("5511999999999", ConversationState.WAITING_FOR_CONFIRMATION)
+    
+    await whatsapp_service.receive_message({
+        "from": "5511999999999",
+        "text": "Deixa eu ver com minha esposa primeiro"
+    })
+    
+    assert whatsapp_service.chatgpt_service.extract_intent.await_args.kwargs["priority"] == LLMPriority.CONFIRMATION
+    assert WhatsAppService._llm_priority("obrigado!", ConversationState.INITIAL) == LLMPriority.SMALL_TALK
+    assert WhatsAppService._llm_priority("Vocês atendem crianças?", ConversationState.INITIAL) == LLMPriority.NORMAL
+
+@pytest.mark.asyncio
+async def test_unavailable_chatgpt_gets_scripted_reply(whatsapp_service):
+    """Testa que, com o ChatGPT fora do ar, o paciente recebe a resposta do roteiro"""
+    whatsapp_service.chatgpt_service.extract_intent.side_effect = CircuitOpenError("Circuito aberto")
+    whatsapp_service.conversation_manager.set_state("5511999999999", ConversationState.WAITING_FOR_DATE)
+    
+    result = await whatsapp_service.receive_message({
+        "from": "5511999999999",
+        "text": "Vocês atendem crianças?"
+    })
+    
+    assert result["state"] == ConversationState.WAITING_FOR_DATE.value
+    assert result["response"] == WhatsAppService.FALLBACK_REPLIES[ConversationState.WAITING_FOR_DATE]
+    assert whatsapp_service.offline_replies == 1
+
+@pytest.mark.asyncio
+async def test_unavailable_chatgpt_falls_back_to_local_date(whatsapp_service):
+    """Testa que a data reconhecida localmente é aproveitada quando o ChatGPT não responde"""
+    whatsapp_service.chatgpt_service.extract_intent.side_effect = LLMTimeoutError("deadline")
+    
+    result = await whatsapp_service.receive_message({
+        "from": "5511999999999",
+        "text": "Queria saber se dá para ir amanhã, é que trabalho longe"
+    })
+    
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    assert result["state"] == ConversationState.WAITING_FOR_TIME.value
+    assert whatsapp_service.conversation_manager.get_data("5511999999999")["date"] == tomorrow
+
+@pytest.mark.asyncio
+async def test_receive_message_with_time(whatsapp_service):
     """Testa o processamento de mensagem com horário"""
     # Configura o estado inicial
     whatsapp_service.conversation_manager.set_state("5511999999999", ConversationState.WAITING_FOR_TIME)
     whatsapp_service.conversation_manager.update_data("5511999999999", {"date": "2024-05-01"})
     
     # Configura o mock do ChatGPT
-    whatsapp_service.chatgpt_service.generate_response.return_value = "HORARIO_MENCIONADO: 14:30"
+    whatsapp_service.chatgpt_service.extract_intent.return_value = IntentExtraction(intent=Intent.TIME, time="14:30")
     
     # Processa a mensagem
-    result = whatsapp_service.receive_message({
+    result = await whatsapp_service.receive_message({
         "from": "5511999999999",
         "text": "Quero agendar para as 14:30"
     })
@@ -115,7 +211,8 @@ def test_receive_message_with_time(whatsapp_service):
     assert result["state"] == ConversationState.WAITING_FOR_CONFIRMATION.value
     assert whatsapp_service.conversation_manager.get_data("5511999999999")["time"] == "14:30"
 
-def test_receive_message_with_confirmation(whatsapp_service):
+@pytest.mark.asyncio
+async def test_receive_message_with_confirmation(whatsapp_service):
     """Testa o processamento de mensagem com confirmação"""
     # Configura o estado inicial
     whatsapp_service.conversation_manager.set_state("5511999999999", ConversationState.WAITING_FOR_CONFIRMATION)
@@ -126,12 +223,12 @@ def test_receive_message_with_confirmation(whatsapp_service):
     })
     
     # Configura os mocks
-    whatsapp_service.chatgpt_service.generate_response.return_value = "CONFIRMACAO: sim"
+    whatsapp_service.chatgpt_service.extract_intent.return_value = IntentExtraction(intent=Intent.CONFIRMATION, confirmation=True)
     whatsapp_service.calendar_service.create_calendar_event.return_value = True
     whatsapp_service.send_message = Mock(return_value=True)
     
     # Processa a mensagem
-    result = whatsapp_service.receive_message({
+    result = await whatsapp_service.receive_message({
         "from": "5511999999999",
         "text": "Sim, quero confirmar"
     })
@@ -141,34 +238,90 @@ def test_receive_message_with_confirmation(whatsapp_service):
     whatsapp_service.calendar_service.create_calendar_event.assert_called_once()
     whatsapp_service.send_message.assert_called()
 
+def use_mock_transport(service, status_code, requests=None, headers=None):
+    """
+    Configura o serviço com credenciais e um cliente HTTP que responde localmente.
+    `status_code` pode ser uma lista, com um status por requisição.
+    """
+    statuses = list(status_code) if isinstance(status_code, list) else None
+
+    def handler(request):
+        if requests is not None:
+            requests.append(request)
+        code = statuses.pop(0) if statuses else status_code
+        return httpx.Response(code, json={"messages": [{"id": "wamid.123"}]}, headers=headers)
+
+    service.token = "test-token"
+    service.phone_number_id = "123456"
+    service.api_url = "https://graph.facebook.com/v20.0/123456/messages"
+    service._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
 def test_send_message_success(whatsapp_service):
     """Testa o envio de mensagem com sucesso"""
-    with patch('httpx.Client') as mock_client:
-        # Configura o mock
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"id": "123"}
-        mock_client.return_value.__enter__.return_value.post.return_value = mock_response
-        
-        # Envia a mensagem
-        result = whatsapp_service.send_message("5511999999999", "Teste")
-        
-        # Verifica o resultado
-        assert result == True
+    requests = []
+    use_mock_transport(whatsapp_service, 200, requests)
+
+    # Envia a mensagem
+    result = whatsapp_service.send_message("5511999999999", "Teste")
+
+    # Verifica o resultado
+    assert result == True
+    assert requests[0].headers["Authorization"] == "Bearer test-token"
+    assert json.loads(requests[0].content)["text"] == {"body": "Teste"}
 
 def test_send_message_failure(whatsapp_service):
     """Testa o envio de mensagem com falha"""
-    with patch('httpx.Client') as mock_client:
-        # Configura o mock
-        mock_response = Mock()
-        mock_response.status_code = 500
-        mock_client.return_value.__enter__.return_value.post.return_value = mock_response
-        
-        # Envia a mensagem
-        result = whatsapp_service.send_message("5511999999999", "Teste")
-        
-        # Verifica o resultado
-        assert result == False
+    use_mock_transport(whatsapp_service, 500)
+
+    # Envia a mensagem
+    result = whatsapp_service.send_message("5511999999999", "Teste")
+
+    # Verifica o resultado
+    assert result == False
+
+def test_sync_sends_close_their_client(whatsapp_service):
+    """Testa que cada envio síncrono fecha o cliente HTTP criado no seu event loop"""
+    use_mock_transport(whatsapp_service, 200)
+    whatsapp_service._http_client = None
+    clients = []
+    client_class = httpx.AsyncClient
+
+    def build_client(**kwargs):
+        clients.append(client_class(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={}))))
+        return clients[-1]
+
+    with patch("app.services.whatsapp_service.httpx.AsyncClient", side_effect=build_client):
+        assert whatsapp_service.send_message("5511999999999", "Teste")
+        assert whatsapp_service.send_message("5511999999999", "Teste de novo")
+
+    assert len(clients) == 2
+    assert all(client.is_closed for client in clients)
+    assert whatsapp_service._http_client is None
+
+@pytest.mark.asyncio
+async def test_async_sends_share_one_client(whatsapp_service):
+    """Testa que os envios assíncronos reutilizam o mesmo cliente HTTP"""
+    requests = []
+    use_mock_transport(whatsapp_service, 200, requests)
+    client = whatsapp_service._http_client
+
+    results = await asyncio.gather(
+        whatsapp_service.send_message_async("5511999999999", "Teste"),
+        whatsapp_service.send_template_message_async("5511999999999", "appointment_confirmation_v2", "pt_BR"),
+    )
+
+    assert results == [True, True]
+    assert whatsapp_service._get_http_client() is client
+    assert json.loads(requests[1].content)["template"]["name"] == "appointment_confirmation_v2"
+
+    await whatsapp_service.aclose()
+    assert client.is_closed
+
+@pytest.mark.asyncio
+async def test_sync_send_inside_event_loop_is_rejected(whatsapp_service):
+    """Testa que o wrapper síncrono não bloqueia o event loop"""
+    with pytest.raises(RuntimeError):
+        whatsapp_service.send_message("5511999999999", "Teste")
 
 def test_send_appointment_confirmation(whatsapp_service):
     """Testa o envio de confirmação de agendamento"""
@@ -186,4 +339,63 @@ def test_send_appointment_confirmation(whatsapp_service):
     
     # Verifica o resultado
     assert result == True
-    whatsapp_service.send_message.assert_called_once() 
\ No newline at end of file
+    whatsapp_service.send_message.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_rate_limited_send_is_retried_then_dead_lettered(whatsapp_service):
+    """Testa que um 429 suspende o agendador, o envio é repetido e por fim vai para o dead letter"""
+    use_mock_transport(whatsapp_service, 429, headers={"Retry-After": "0.01"})
+    store = DeadLetterStore(path=None)
+    whatsapp_service.outbound_scheduler = OutboundScheduler(max_attempts=2, dead_letter=store.add)
+    await whatsapp_service.outbound_scheduler.start()
+
+    result = await whatsapp_service.send_message_async("5511999999999", "Teste")
+    await whatsapp_service.outbound_scheduler.stop()
+
+    stats = whatsapp_service.outbound_scheduler.stats()
+    assert result == False
+    assert stats["backoffs"] == 2
+    assert stats["retried"] == 1
+    [dead_letter] = store.list()
+    assert dead_letter["attempts"] == 2
+    assert dead_letter["payload"]["text"] == {"body": "Teste"}
+
+@pytest.mark.asyncio
+async def test_transient_failure_is_retried_without_waiting(whatsapp_service):
+    """Testa que uma falha transitória é repetida em segundo plano quando wait=False"""
+    requests = []
+    use_mock_transport(whatsapp_service, [503, 200], requests)
+    whatsapp_service.outbound_scheduler = OutboundScheduler(retry_base=0.01)
+    await whatsapp_service.outbound_scheduler.start()
+
+    assert await whatsapp_service.send_message_async("5511999999999", "Teste", wait=False) == True
+    assert requests == []
+
+    await asyncio.sleep(0.05)
+    await whatsapp_service.outbound_scheduler.stop()
+
+    assert len(requests) == 2
+    assert whatsapp_service.outbound_scheduler.stats()["priorities"]["reply"]["sent"] == 1
+
+def test_receive_document_links_both_documents(whatsapp_service):
+    """Testa que a carteirinha e o documento pessoal são vinculados e a conversa segue para a data"""
+    phone = "5511999999999"
+    whatsapp_service.conversation_manager.set_state(phone, ConversationState.WAITING_FOR_INSURANCE_DOCS)
+
+    first = whatsapp_service.receive_document(phone, "data/media/ab/card.jpg")
+    assert first["field"] == "insurance_card_url"
+    assert first["state"] == ConversationState.WAITING_FOR_INSURANCE_DOCS.value
+    assert "rg" in first["response"].lower()
+
+    second = whatsapp_service.receive_document(phone, "data/media/cd/rg.jpg", caption="CNH")
+    data = whatsapp_service.conversation_manager.get_data(phone)
+    assert second["field"] == "id_document_url"
+    assert second["state"] == ConversationState.WAITING_FOR_DATE.value
+    assert (data["insurance_card_url"], data["id_document_url"]) == ("data/media/ab/card.jpg", "data/media/cd/rg.jpg")
+
+def test_receive_document_uses_caption(whatsapp_service):
+    """Testa que a legenda identifica o documento pessoal mesmo quando ele chega primeiro"""
+    result = whatsapp_service.receive_document("5511999999999", "data/media/ef/rg.jpg", caption="Meu RG")
+
+    assert result["field"] == "id_document_url"
+    assert "carteirinha" in result["response"].lower()
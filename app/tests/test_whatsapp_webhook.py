@@ -0,0 +1,280 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from app.api.whatsapp import (
+    BroadcastPayload,
+    DeadLetterReplayPayload,
+    create_broadcast,
+    extract_media_messages,
+    extract_text_messages,
+    process_whatsapp_message,
+    replay_dead_letters,
+)
+from app.models.webhook import WebhookPayload
+from app.services.admission_control import AdmissionController
+from app.services.broadcast_service import BroadcastService
+from app.services.conversation_scheduler import ConversationScheduler
+from app.services.conversation_state import ConversationManager, ConversationState
+from app.services.dead_letter_store import DeadLetterStore
+from app.services.media_service import StoredMedia
+from app.services.message_coalescer import MessageCoalescer
+from app.services.message_deduplicator import MessageDeduplicator
+from app.services.outbound_scheduler import MessagePriority
+from app.services.whatsapp_service import WhatsAppService
+
+def build_services(scheduler, deduplicator=None, window=0, admission_controller=None):
+    """Monta o contêiner mínimo usado pelo pipeline de mensagens"""
+    return SimpleNamespace(
+        conversation_scheduler=scheduler,
+        message_deduplicator=deduplicator or MessageDeduplicator(),
+        message_coalescer=MessageCoalescer(window=window),
+        admission_controller=admission_controller or AdmissionController(),
+        whatsapp_service=SimpleNamespace(conversation_manager=ConversationManager())
+    )
+
+def text_message(phone, text, message_id):
+    """Monta uma mensagem de texto no formato do webhook"""
+    return {"from": phone, "id": message_id, "type": "text", "text": {"body": text}}
+
+@pytest.fixture
+def batched_payload():
+    """Payload com várias entradas, mudanças, mensagens e status"""
+    return WebhookPayload.model_validate({
+        "object": "whatsapp_business_account",
+        "entry": [
+            {"changes": [
+                {"value": {"messages": [
+                    text_message("5511111111111", "oi", "wamid.1"),
+                    text_message("5522222222222", "olá", "wamid.2"),
+                ]}},
+                {"value": {"statuses": [{"id": "wamid.0", "status": "read"}]}},
+            ]},
+            {"changes": [
+                {"value": {"messages": [
+                    text_message("5511111111111", "queria marcar", "wamid.3"),
+                    {"from": "5533333333333", "id": "wamid.4", "type": "image", "image": {"id": "media"}},
+                ]}},
+            ]},
+        ]
+    })
+
+def test_extract_all_text_messages(batched_payload):
+    """Testa que todas as mensagens de texto de todas as entradas e mudanças são extraídas"""
+    messages = extract_text_messages(batched_payload)
+
+    assert [message.id for message in messages] == ["wamid.1", "wamid.2", "wamid.3"]
+    assert messages[2].from_ == "5511111111111"
+    assert messages[2].text.body == "queria marcar"
+
+def test_extract_ignores_other_notifications():
+    """Testa que notificações que não são do WhatsApp são ignoradas"""
+    assert extract_text_messages(WebhookPayload(object="page")) == []
+
+@pytest.mark.asyncio
+async def test_process_fans_out_by_phone(batched_payload):
+    """Testa que telefones diferentes rodam em paralelo e o mesmo telefone mantém a ordem"""
+    events = []
+
+    async def fake_handle(phone_number, message_text, services):
+        events.append(("start", phone_number, message_text))
+        await asyncio.sleep(0.01)
+        events.append(("end", phone_number, message_text))
+
+    scheduler = ConversationScheduler(workers=4)
+    await scheduler.start()
+    services = build_services(scheduler)
+
+    with patch('app.api.whatsapp.handle_text_message', side_effect=fake_handle):
+        await process_whatsapp_message(batched_payload, services)
+    await scheduler.stop()
+
+    first_phone = [event for event in events if event[1] == "5511111111111"]
+    assert first_phone == [
+        ("start", "5511111111111", "oi"),
+        ("end", "5511111111111", "oi"),
+        ("start", "5511111111111", "queria marcar"),
+        ("end", "5511111111111", "queria marcar"),
+    ]
+    # A segunda conversa começa antes de a primeira terminar
+    assert events.index(("start", "5522222222222", "olá")) < events.index(("end", "5511111111111", "oi"))
+
+@pytest.mark.asyncio
+async def test_redelivered_messages_are_skipped(batched_payload):
+    """Testa que reentregas do mesmo webhook não disparam novo processamento"""
+    handled = []
+
+    async def fake_handle(phone_number, message_text, services):
+        handled.append(message_text)
+
+    scheduler = ConversationScheduler(workers=2)
+    await scheduler.start()
+    deduplicator = MessageDeduplicator()
+    services = build_services(scheduler, deduplicator)
+
+    with patch('app.api.whatsapp.handle_text_message', side_effect=fake_handle):
+        await process_whatsapp_message(batched_payload, services)
+        await process_whatsapp_message(batched_payload, services)
+    await scheduler.stop()
+
+    assert sorted(handled) == ["oi", "olá", "queria marcar"]
+    assert deduplicator.stats()["hits"] == 3
+
+@pytest.mark.asyncio
+async def test_bursts_are_merged_into_one_turn(batched_payload):
+    """Testa que mensagens seguidas do mesmo paciente viram um único turno"""
+    handled = []
+
+    async def fake_handle(phone_number, message_text, services):
+        handled.append((phone_number, message_text))
+
+    scheduler = ConversationScheduler(workers=2)
+    await scheduler.start()
+    services = build_services(scheduler, window=0.01)
+
+    with patch('app.api.whatsapp.handle_text_message', side_effect=fake_handle):
+        await process_whatsapp_message(batched_payload, services)
+    await scheduler.stop()
+
+    assert sorted(handled) == [
+        ("5511111111111", "oi\nqueria marcar"),
+        ("5522222222222", "olá"),
+    ]
+
+@pytest.mark.asyncio
+async def test_small_talk_is_deferred_under_load(batched_payload):
+    """Testa que, sob carga, a conversa casual é adiada sem passar à frente do agendamento do mesmo paciente"""
+    handled = []
+
+    async def fake_handle(phone_number, message_text, services):
+        handled.append(message_text)
+
+    scheduler = ConversationScheduler(workers=2)
+    await scheduler.start()
+    admission = AdmissionController(soft_limit=1, hard_limit=100, drain_interval=0.01, load_probe=lambda: 1)
+    services = build_services(scheduler, admission_controller=admission)
+
+    with patch('app.api.whatsapp.handle_text_message', side_effect=fake_handle):
+        pending = await process_whatsapp_message(batched_payload, services)
+        # O "oi" adiado entra na lane antes do agendamento do mesmo telefone
+        assert handled == ["oi", "queria marcar"]
+        assert admission.stats()["deferred"] == 1
+        assert not pending.done()
+
+        # Quando a carga baixa, o trabalho adiado é retomado
+        admission.load_probe = lambda: 0
+        await admission.start()
+        await asyncio.wait_for(pending, 1)
+    await admission.stop()
+    await scheduler.stop()
+
+    assert handled == ["oi", "queria marcar", "olá"]
+
+@pytest.mark.asyncio
+async def test_shed_messages_release_their_claim_and_discarded_deferrals_are_held(batched_payload):
+    """Testa que mensagens descartadas liberam o id e que adiados descartados no encerramento cancelam o payload"""
+    scheduler = ConversationScheduler(workers=2)
+    await scheduler.start()
+    deduplicator = MessageDeduplicator()
+    admission = AdmissionController(soft_limit=1, hard_limit=2, max_deferred=0, load_probe=lambda: 5)
+    services = build_services(scheduler, deduplicator, admission_controller=admission)
+
+    with patch('app.api.whatsapp.handle_text_message', side_effect=AsyncMock()):
+        assert await process_whatsapp_message(batched_payload, services) is None
+        # Só a mensagem de agendamento foi admitida; a conversa casual foi descartada
+        assert deduplicator.claim("wamid.1") and deduplicator.claim("wamid.2")
+        assert not deduplicator.claim("wamid.3")
+
+        admission.hard_limit, admission.max_deferred = 100, 10
+        services.message_deduplicator = MessageDeduplicator()
+        pending = await process_whatsapp_message(batched_payload, services)
+        assert admission.stats()["deferred"] == 1
+        await admission.stop()
+        await asyncio.sleep(0)
+    await scheduler.stop()
+
+    # Cancelada: a fila de ingestão mantém o payload no spool para o próximo start
+    assert pending.cancelled()
+
+def test_extract_media_messages(batched_payload):
+    """Testa que imagens e documentos são extraídos separadamente das mensagens de texto"""
+    assert [message.id for message in extract_media_messages(batched_payload)] == ["wamid.4"]
+
+@pytest.mark.asyncio
+async def test_insurance_documents_are_downloaded_and_linked():
+    """Testa que os documentos do convênio são baixados e vinculados à conversa, em ordem"""
+    phone = "5533333333333"
+    payload = WebhookPayload.model_validate({
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [
+            {"from": phone, "id": "wamid.1", "type": "image", "image": {"id": "media.1", "mime_type": "image/jpeg"}},
+            {"from": phone, "id": "wamid.2", "type": "document",
+             "document": {"id": "media.2", "mime_type": "application/pdf", "caption": "meu RG"}},
+            {"from": "5544444444444", "id": "wamid.3", "type": "image", "image": {"id": "media.3"}},
+        ]}}]}]
+    })
+
+    async def fetch(media_id, sha256, mime_type):
+        # O segundo download termina antes do primeiro; o vínculo segue a ordem das mensagens
+        await asyncio.sleep(0.02 if media_id == "media.1" else 0)
+        return StoredMedia(media_id, f"data/media/{media_id}", mime_type, 10)
+
+    scheduler = ConversationScheduler(workers=2)
+    await scheduler.start()
+    services = build_services(scheduler)
+    services.media_service = SimpleNamespace(fetch=AsyncMock(side_effect=fetch))
+    whatsapp = services.whatsapp_service
+    whatsapp.receive_document = lambda *args: WhatsAppService.receive_document(whatsapp, *args)
+    whatsapp.send_message_async = AsyncMock(return_value=True)
+    whatsapp.conversation_manager.set_state(phone, ConversationState.WAITING_FOR_INSURANCE_DOCS)
+
+    await process_whatsapp_message(payload, services)
+    await scheduler.stop()
+
+    data = whatsapp.conversation_manager.get_data(phone)
+    assert data["insurance_card_url"] == "data/media/media.1"
+    assert data["id_document_url"] == "data/media/media.2"
+    assert whatsapp.conversation_manager.get_state(phone) == ConversationState.WAITING_FOR_DATE
+    # Mídias fora da etapa de documentos são ignoradas
+    assert [call.args[0] for call in services.media_service.fetch.await_args_list] == ["media.1", "media.2"]
+    assert "data" in whatsapp.send_message_async.await_args_list[-1].args[1]
+
+@pytest.mark.asyncio
+async def test_replay_dead_letters():
+    """Testa o reenvio em lote dos registros da fila de mensagens mortas"""
+    store = DeadLetterStore(path=None)
+    first = store.add("5511111111111", 1, {"type": "text", "text": {"body": "Olá"}}, "HTTP 503", 5)
+    store.add("5522222222222", 2, {"type": "template"}, "HTTP 503", 5)
+    services = SimpleNamespace(
+        dead_letter_store=store,
+        whatsapp_service=SimpleNamespace(send_payload_async=AsyncMock(return_value=True))
+    )
+
+    result = await replay_dead_letters(DeadLetterReplayPayload(ids=[first]), services)
+
+    assert result == {"replayed": 1, "ids": [first]}
+    services.whatsapp_service.send_payload_async.assert_awaited_once_with(
+        "5511111111111", {"type": "text", "text": {"body": "Olá"}}, MessagePriority.REPLY, wait=False
+    )
+    assert [entry["recipient"] for entry in store.list()] == ["5522222222222"]
+
+@pytest.mark.asyncio
+async def test_broadcast_endpoint_streams_ndjson():
+    """Testa que o endpoint de broadcast transmite uma linha por destinatário e o resumo"""
+    whatsapp_service = SimpleNamespace(
+        send_template_message_async=AsyncMock(return_value=True), outbound_scheduler=None
+    )
+    services = SimpleNamespace(broadcast_service=BroadcastService(whatsapp_service, path=None))
+    payload = BroadcastPayload(
+        template_name="appointment_reminder",
+        recipients=[{"phone": "5511111111111"}, {"phone": "5522222222222", "components": []}],
+    )
+
+    response = await create_broadcast(payload, services)
+    lines = [json.loads(line) async for line in response.body_iterator]
+
+    assert response.media_type == "application/x-ndjson"
+    assert len(lines) == 3
+    assert lines[-1]["summary"]["sent"] == 2
+    assert lines[-1]["summary"]["broadcast_id"] == response.headers["X-Broadcast-Id"]
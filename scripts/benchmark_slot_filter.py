@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""
+Benchmark do filtro de horários por preferência do paciente.
+
+Compara o filtro local (SlotPreferenceFilter) com o caminho pelo ChatGPT em
+listas de 1000 horários: tempo do filtro local por chamada e tamanho do prompt
+que o ChatGPT receberia, com a lista de horários no formato antigo (UUID +
+timestamp ISO) e no compacto (números por dia). Com --live, mede também a latência real da OpenAI
+(requer OPENAI_API_KEY).
+
+Uso:
+    python scripts/benchmark_slot_filter.py [--slots 1000] [--iterations 200] [--live]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path para poder importar os módulos da aplicação
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.chatgpt_service import ChatGPTService
+from app.services.slot_encoding import encode_slots
+from app.services.slot_preference_filter import SlotPreferenceFilter
+
+PREFERENCES = [
+    "terça de manhã",
+    "amanhã depois das 14h",
+    "antes das 10",
+    "dia 15",
+    "sexta ou segunda à tarde",
+]
+
+
+def build_slots(count: int) -> list:
+    """Monta `count` horários de 45 minutos, das 8h30 às 17h45, a partir de amanhã."""
+    slots = []
+    day = datetime.now().replace(hour=8, minute=30, second=0, microsecond=0) + timedelta(days=1)
+    start = day
+    while len(slots) < count:
+        slots.append({"slot_id": str(uuid.uuid4()), "start_time": start.isoformat()})
+        start += timedelta(minutes=45)
+        if start.hour >= 18:
+            day += timedelta(days=1)
+            start = day
+    return slots
+
+
+async def llm_prompt_size(service: ChatGPTService, preference: str, slots: list) -> int:
+    """Executa o caminho pelo ChatGPT sem rede e retorna o tamanho do prompt, em caracteres."""
+    captured = {}
+
+    async def complete(messages, timeout=None, **params):
+        captured["messages"] = messages
+        return '{"slot_ids": []}'
+
+    original = service._complete
+    service._complete = complete
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            await service.filter_slots_by_preference(preference, slots)
+    finally:
+        service._complete = original
+    return sum(len(message["content"]) for message in captured["messages"])
+
+
+async def main(slot_count: int, iterations: int, live: bool) -> None:
+    if not live:
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    slots = build_slots(slot_count)
+    local = SlotPreferenceFilter()
+
+    service = ChatGPTService()
+    # Força o caminho pelo ChatGPT para medir o que ele custaria
+    service.slot_filter.filter = lambda *args, **kwargs: None
+
+    legacy_list = "\n".join(f"- ID: {slot['slot_id']} Time: {slot['start_time']}" for slot in slots)
+    compact_list = encode_slots(slots)
+    print(f"{slot_count} horários, {iterations} iterações por preferência")
+    print(f"Lista no prompt: antiga {len(legacy_list)} chars (~{len(legacy_list) // 4} tokens), "
+          f"compacta {len(compact_list)} chars (~{len(compact_list) // 4} tokens)\n")
+    print(f"{'preferência':<28} {'local':>12} {'matches':>8} {'prompt LLM':>26} "
+          f"{'resposta antiga/compacta':>26} {'LLM real':>10}")
+    for preference in PREFERENCES:
+        matches = local.filter(preference, slots)
+        elapsed = timeit.timeit(lambda: local.filter(preference, slots), number=iterations) / iterations * 1e6
+        prompt_chars = await llm_prompt_size(service, preference, slots)
+
+        live_ms = "-"
+        if live:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                await service.filter_slots_by_preference(preference, slots)
+            live_ms = f"{(time.perf_counter() - started) * 1000:.0f} ms"
+
+        # Tamanho da resposta esperada: UUIDs ecoados (antiga) ou números (compacta)
+        positions = {id(slot): position for position, slot in enumerate(slots, start=1)}
+        legacy_answer = json.dumps([slot["slot_id"] for slot in matches])
+        compact_answer = json.dumps({"slots": [positions[id(slot)] for slot in matches]})
+
+        print(f"{preference:<28} {elapsed:9.1f} µs {len(matches):8d} "
+              f"{prompt_chars:7d} chars (~{prompt_chars // 4:5d} tokens) "
+              f"{len(legacy_answer):12d}/{len(compact_answer):<6d} chars {live_ms:>10}")
+
+    await service.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--slots", type=int, default=1000, help="Número de horários na lista")
+    parser.add_argument("--iterations", type=int, default=200, help="Iterações do filtro local por preferência")
+    parser.add_argument("--live", action="store_true", help="Mede também a latência real da OpenAI")
+    args = parser.parse_args()
+    asyncio.run(main(args.slots, args.iterations, args.live))
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Benchmark da latência do processamento de webhooks do WhatsApp.
+
+Compara a construção dos serviços a cada mensagem (comportamento antigo de
+process_whatsapp_message) com o contêiner de serviços criado uma única vez.
+As chamadas de rede (OpenAI e envio pelo WhatsApp) são substituídas por stubs,
+de modo que a diferença medida é apenas o custo de inicialização.
+
+Uso:
+    python scripts/benchmark_webhook.py [--messages 50]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+# Adiciona o diretório raiz ao path para poder importar os módulos da aplicação
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark-key")
+os.environ.setdefault("COALESCE_WINDOW_SECONDS", "0")
+
+from google.auth.credentials import AnonymousCredentials
+
+from app.api.whatsapp import process_whatsapp_message
+from app.models.intent import IntentExtraction
+from app.models.webhook import WebhookPayload
+from app.services.calendar_service import CalendarService
+from app.services.chatgpt_service import ChatGPTService
+from app.services.service_container import ServiceContainer
+from app.services.whatsapp_service import WhatsAppService
+
+
+def build_payload(index: int) -> WebhookPayload:
+    """Monta um payload de webhook com uma mensagem de texto."""
+    return WebhookPayload.model_validate({
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "benchmark",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "messages": [{
+                        "from": f"55119999{index:05d}",
+                        "id": f"wamid.benchmark.{index}",
+                        "type": "text",
+                        "text": {"body": "Olá, gostaria de agendar uma consulta"}
+                    }]
+                }
+            }]
+        }]
+    })
+
+
+class PerMessageContainer(ServiceContainer):
+    """Reproduz o comportamento antigo: serviços novos a cada mensagem."""
+
+    @property
+    def whatsapp_service(self):
+        # WhatsAppService() cria internamente o seu próprio par ChatGPT/Calendar
+        ChatGPTService()
+        return WhatsAppService()
+
+    @whatsapp_service.setter
+    def whatsapp_service(self, value):
+        pass
+
+    @property
+    def calendar_service(self):
+        return CalendarService()
+
+    @calendar_service.setter
+    def calendar_service(self, value):
+        pass
+
+
+async def measure(services: ServiceContainer, messages: int) -> list:
+    """Processa as mensagens e retorna as latências em milissegundos."""
+    latencies = []
+    for index in range(messages):
+        start = time.perf_counter()
+        await process_whatsapp_message(build_payload(index), services)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label: str, latencies: list) -> float:
+    p50 = statistics.median(latencies)
+    p99 = sorted(latencies)[int(len(latencies) * 0.99) - 1]
+    print(f"{label:<28} p50={p50:8.2f} ms  p99={p99:8.2f} ms")
+    return p50
+
+
+async def main(messages: int) -> None:
+    with patch.object(CalendarService, "_get_credentials", return_value=AnonymousCredentials()), \
+         patch.object(ChatGPTService, "extract_intent", AsyncMock(return_value=IntentExtraction(reply="Olá! Como posso ajudar?"))), \
+         patch.object(WhatsAppService, "send_message", return_value=True), \
+         patch("builtins.print"):
+        legacy_services = PerMessageContainer()
+        await legacy_services.startup()
+        legacy = await measure(legacy_services, messages)
+        await legacy_services.shutdown()
+
+        services = ServiceContainer()
+        await services.startup()
+        shared = await measure(services, messages)
+        await services.shutdown()
+
+    legacy_p50 = report("Serviços por mensagem", legacy)
+    shared_p50 = report("Contêiner compartilhado", shared)
+    print(f"Melhoria no p50: {legacy_p50 - shared_p50:.2f} ms ({legacy_p50 / shared_p50:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50, help="Número de mensagens processadas")
+    args = parser.parse_args()
+    asyncio.run(main(args.messages))
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Microbenchmark da decodificação de payloads do webhook do WhatsApp.
+
+Compara o caminho antigo (request.json() + json.dumps(indent=2) para log +
+percurso do dicionário com .get()) com a decodificação tipada direto dos bytes
+da requisição (WebhookPayload.decode).
+
+Uso:
+    python scripts/benchmark_webhook_decode.py [--iterations 20000]
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+# Adiciona o diretório raiz ao path para poder importar os módulos da aplicação
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.webhook import WebhookPayload
+
+
+def build_body(messages: int) -> bytes:
+    """Monta o corpo bruto de um webhook no formato enviado pela Meta."""
+    return json.dumps({
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "106540352242922",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550001111", "phone_number_id": "106540352242922"},
+                    "contacts": [{"profile": {"name": "Paciente Teste"}, "wa_id": "5511999999999"}],
+                    "messages": [{
+                        "context": {"from": "15550001111", "id": "wamid.context"},
+                        "from": "5511999999999",
+                        "id": f"wamid.HBgLNTUxMTk5OTk5OTk5FQIAEhgg{index:06d}",
+                        "timestamp": "1714000000",
+                        "text": {"body": "Olá, gostaria de agendar uma consulta para amanhã de manhã"},
+                        "type": "text"
+                    } for index in range(messages)]
+                }
+            }]
+        }]
+    }, separators=(",", ":")).encode()
+
+
+def dict_walk(body: bytes, pretty_print: bool) -> list:
+    """Caminho antigo: json.loads + (opcionalmente) json.dumps(indent=2) + .get() aninhados."""
+    payload = json.loads(body)
+    if pretty_print:
+        json.dumps(payload, indent=2)
+    messages = []
+    for entry in payload.get('entry') or []:
+        for change in entry.get('changes') or []:
+            for message in (change.get('value') or {}).get('messages') or []:
+                if message.get('type') == 'text':
+                    messages.append((message.get('id'), message.get('from'), (message.get('text') or {}).get('body')))
+    return messages
+
+
+def typed_decode(body: bytes) -> list:
+    """Caminho novo: decodificação tipada direto dos bytes."""
+    payload = WebhookPayload.decode(body)
+    return [
+        (message.id, message.from_, message.text.body)
+        for message in payload.iter_messages()
+        if message.type == 'text'
+    ]
+
+
+def main(iterations: int) -> None:
+    for size in (1, 50):
+        body = build_body(size)
+        assert dict_walk(body, False) == typed_decode(body)
+        runs = max(iterations // size, 100)
+
+        print(f"\nPayload com {size} mensagem(ns) ({len(body)} bytes), {runs} iterações:")
+        candidates = [
+            ("json.loads + indent=2 + .get()", lambda: dict_walk(body, True)),
+            ("json.loads + .get()", lambda: dict_walk(body, False)),
+            ("WebhookPayload.decode", lambda: typed_decode(body)),
+        ]
+        baseline = None
+        for label, func in candidates:
+            elapsed = timeit.timeit(func, number=runs) / runs * 1e6
+            baseline = baseline or elapsed
+            print(f"  {label:<34} {elapsed:9.2f} µs/payload  ({baseline / elapsed:5.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000, help="Número de iterações por candidato")
+    args = parser.parse_args()
+    main(args.iterations)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Benchmark dos envios para a WhatsApp Cloud API contra um servidor local.
+
+Compara o caminho antigo (um httpx.Client síncrono novo a cada envio, chamado
+de dentro do event loop) com o cliente assíncrono compartilhado do
+WhatsAppService (keep-alive e pool de conexões). O servidor local simula a
+latência da Graph API; o custo do handshake TLS real não entra na medição,
+então o ganho em produção tende a ser maior.
+
+Uso:
+    python scripts/benchmark_whatsapp_send.py [--messages 500] [--latency-ms 20]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import uvicorn
+
+# Adiciona o diretório raiz ao path para poder importar os módulos da aplicação
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("WHATSAPP_API_TOKEN", "benchmark-token")
+os.environ.setdefault("WHATSAPP_PHONE_NUMBER_ID", "123456")
+
+from app.services.conversation_state import ConversationManager
+from app.services.whatsapp_service import WhatsAppService
+
+
+def build_stand_in_app(latency: float):
+    """Aplicação ASGI mínima que responde como a Graph API após `latency` segundos."""
+    async def app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        while (await receive()).get("more_body"):
+            pass
+        await asyncio.sleep(latency)
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": b'{"messages":[{"id":"wamid.benchmark"}]}'})
+    return app
+
+
+def serve(sock: socket.socket, latency: float) -> None:
+    server = uvicorn.Server(uvicorn.Config(build_stand_in_app(latency), log_level="error", backlog=4096))
+    server.run(sockets=[sock])
+
+
+def start_stand_in_server(latency: float) -> str:
+    """
+    Sobe o servidor local em outro processo (para não disputar a CPU com o
+    cliente medido) e retorna a URL do endpoint de mensagens.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+
+    multiprocessing.Process(target=serve, args=(sock, latency), daemon=True).start()
+    for _ in range(500):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            break
+        except OSError:
+            time.sleep(0.01)
+    return f"http://127.0.0.1:{port}/v20.0/123456/messages"
+
+
+def old_send(api_url: str, phone: str, message: str) -> bool:
+    """Caminho antigo: um cliente síncrono (e uma conexão) novo por envio."""
+    payload = {"messaging_product": "whatsapp", "to": phone, "type": "text", "text": {"body": message}}
+    with httpx.Client() as client:
+        response = client.post(api_url, headers={"Authorization": "Bearer benchmark-token"}, json=payload)
+    return response.status_code == 200
+
+
+async def run(label: str, send, messages: int) -> None:
+    """Dispara todos os envios de uma vez; a latência conta desde o disparo."""
+    latencies = []
+    started = time.perf_counter()
+
+    async def timed(index: int):
+        assert await send(f"55119{index:08d}", "Seu horário foi confirmado.")
+        latencies.append(time.perf_counter() - started)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(timed(index) for index in range(messages)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"  {label:<38} {messages / elapsed:8.1f} msg/s  "
+          f"p50 {statistics.median(latencies) * 1000:8.1f} ms  p99 {p99 * 1000:8.1f} ms")
+
+
+async def main(messages: int, latency_ms: float) -> None:
+    api_url = start_stand_in_server(latency_ms / 1000)
+    print(f"\n{messages} envios concorrentes, latência simulada de {latency_ms} ms:")
+
+    async def blocking_send(phone, message):
+        return old_send(api_url, phone, message)
+
+    await run("httpx.Client novo por envio (antigo)", blocking_send, messages)
+
+    service = WhatsAppService(
+        chatgpt_service=object(), calendar_service=object(), conversation_manager=ConversationManager()
+    )
+    service.api_url = api_url
+    await run("AsyncClient compartilhado", service.send_message_async, messages)
+    await service.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=500, help="Número de envios por candidato")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latência simulada da Graph API")
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.latency_ms))